@@ -1,12 +1,26 @@
-from flask import Flask, render_template, request, jsonify, make_response, redirect, url_for, session, flash
-from utils.model_utils import load_models, predict_tabular, get_default_input
+from flask import Flask, render_template, request, jsonify, make_response, redirect, url_for, session, flash, g
+from utils.model_utils import predict_tabular_fast, predict_tabular_batch, get_default_input, FORM_TO_MODEL
+from utils.risk_utils import calculate_risk_adjustment, adjust_probability, get_risk_level, apply_risk_adjustment_batch
+from utils.model_registry import ModelRegistry
 from utils.db import create_user, create_verification_token, verify_user, verify_login
-from utils.email_utils import send_verification_email
-from utils.llm_utils import generate_health_advice  # Removed load_model
-from config import SECRET_KEY, DEBUG
+from utils.email_utils import send_verification_email, queue_verification_email, get_email_status
+from utils.llm_utils import generate_health_advice_with_reason, get_fallback_advice  # Removed load_model
+from utils.advice_jobs import AdviceJobQueue
+from utils.inference_batcher import InferenceBatcher
+from utils.prediction_cache import get_prediction_cache, predict_with_cache
+from utils.token_reaper import TokenReaper
+from utils.metrics import Stopwatch, get_metrics, histogram
+from utils.tracing import begin_trace, end_trace, span, current_span, current_trace_id
+from utils.profiling import get_profiler, should_profile
+from config import SECRET_KEY, DEBUG, ADMIN_TOKEN, BATCH_MAX_ROWS, ADVICE_ASYNC, EMAIL_ASYNC, TOKEN_REAPER_ENABLED, MODEL_PRELOAD
+from config import METRICS_ENABLED, METRICS_TOKEN, TRACE_HEADER, PROFILE_HEADER, INFERENCE_BATCHING, TOGETHER_API_KEY
 from datetime import datetime
+import csv
+import hmac
+import io
 import logging
 import os
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,18 +29,44 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 
+HTTP_REQUEST_SECONDS = histogram('ovarian_http_request_seconds', "Request handling time by route, method and status",
+                                 ['route', 'method', 'status'])
+PREDICT_STAGE_SECONDS = histogram('ovarian_predict_stage_seconds', "Time per /predict_lab stage", ['stage'])
+
 # Load models at startup
 try:
     # Verify static and template directories exist
     os.makedirs('static', exist_ok=True)
     os.makedirs('templates', exist_ok=True)
     
-    # Load models
-    logger.info("Loading models...")
-    model, columns = load_models()
-    if model is None or columns is None:
-        raise RuntimeError("Failed to load models")
-    logger.info("Models loaded successfully")
+    # Load models once; the registry swaps in a new version only when the artifact changes.
+    # By default the first prediction loads it, keeping cold start fast; MODEL_PRELOAD loads it here.
+    model_registry = ModelRegistry()
+    prediction_cache = get_prediction_cache()
+    if prediction_cache is not None:
+        # Results cached for the replaced model would only sit there until LRU pushed them out
+        model_registry.add_listener(lambda handle: prediction_cache.invalidate(handle.version))
+    if MODEL_PRELOAD:
+        logger.info("Loading models...")
+        if model_registry.refresh() is None:
+            raise RuntimeError("Failed to load models")
+        logger.info("Models loaded successfully")
+    else:
+        # Still fail the deploy on a missing or corrupt artifact, just without deserializing it
+        logger.info(f"Model artifact verified (sha256 {model_registry.verify()[:12]}); loading on first prediction")
+
+    if not TOGETHER_API_KEY:
+        logger.warning("TOGETHER_API_KEY is not set; results will carry the default advice")
+
+    # Background pool for LLM advice so prediction responses never wait on the remote API
+    advice_jobs = AdviceJobQueue()
+
+    # Concurrent single-row predictions share booster calls (worth it with threaded workers)
+    inference_batcher = InferenceBatcher() if INFERENCE_BATCHING else None
+
+    # Periodically delete used and expired verification codes
+    if TOKEN_REAPER_ENABLED:
+        TokenReaper().start()
 
     # Remove LLM model loading (no load_model call needed)
     # logger.info("Loading LLM model...")
@@ -37,6 +77,52 @@ except Exception as e:
     logger.error(f"Error during startup: {str(e)}")
     raise
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    start = g.get('request_start')
+    if start is not None:
+        # The route pattern, not the path, so ids in URLs do not multiply the series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - start)
+    return response
+
+@app.before_request
+def start_request_trace():
+    # Sampled, or forced by the trace header; the root span is named after the route pattern
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    forced = request.headers.get(TRACE_HEADER) == '1'
+    g.trace_root = begin_trace(f"{request.method} {route}", sampled=True if forced else None, path=request.path)
+
+@app.after_request
+def tag_request_trace(response):
+    root = g.get('trace_root')
+    if root is not None:
+        root.set('status', response.status_code)
+        response.headers["X-Trace-Id"] = root.trace_id
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    end_trace(g.pop('trace_root', None), error)
+
+@app.before_request
+def start_request_profile():
+    # Registered after the trace hook, so a profiled request's file carries its trace id
+    if should_profile(request.headers.get(PROFILE_HEADER)):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.profile = get_profiler().start(f"{request.method} {route}", current_trace_id())
+
+@app.teardown_request
+def end_request_profile(error=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        path = get_profiler().finish(profile)
+        current_span().set('profile', os.path.basename(path) if path else None)
+
 def safe_float(value, default=0.0):
     try:
         return float(value) if value else default
@@ -49,54 +135,6 @@ def safe_int(value, default=0):
     except (ValueError, TypeError):
         return default
 
-def calculate_risk_adjustment(family_history, smoking_status, alcohol_consumption):
-    """Calculate additional risk percentage based on lifestyle and history factors with scientific evidence"""
-    additional_risk = 0.0
-    risk_details = []
-    
-    # Family history risk (10-15% of ovarian cancers are hereditary)
-    if family_history == 1:  # First-degree relative
-        additional_risk += 0.10  # Reduced from 0.15 to 0.10 for more balanced assessment
-        risk_details.append({
-            'factor': 'Family History (First-degree relative)',
-            'increase': '10%',
-            'details': 'Having a first-degree relative with ovarian cancer increases risk.'
-        })
-    elif family_history == 2:  # Multiple relatives
-        additional_risk += 0.15  # Reduced from 0.25 to 0.15 for more balanced assessment
-        risk_details.append({
-            'factor': 'Family History (Multiple relatives)',
-            'increase': '15%',
-            'details': 'Multiple family members with ovarian cancer indicates increased risk.'
-        })
-    
-    # Smoking risk (1.2-1.8x higher for mucinous type)
-    if smoking_status == 2:  # Current smoker
-        additional_risk += 0.05  # Reduced from 0.08 to 0.05
-        risk_details.append({
-            'factor': 'Current Smoker',
-            'increase': '5%',
-            'details': 'Smoking may increase risk, particularly for mucinous ovarian cancer.'
-        })
-    elif smoking_status == 1:  # Former smoker
-        additional_risk += 0.02  # Reduced from 0.04 to 0.02
-        risk_details.append({
-            'factor': 'Former Smoker',
-            'increase': '2%',
-            'details': 'Former smoking status carries a slightly increased risk.'
-        })
-    
-    # Alcohol consumption (minimal evidence for increased risk)
-    if alcohol_consumption >= 3:  # Heavy drinking
-        additional_risk += 0.02  # Reduced from 0.03 to 0.02
-        risk_details.append({
-            'factor': 'Heavy Alcohol Consumption',
-            'increase': '2%',
-            'details': 'Heavy alcohol consumption may slightly increase risk.'
-        })
-    
-    return additional_risk, risk_details
-
 @app.route('/')
 def home():
     return render_template('home.html')
@@ -107,6 +145,7 @@ def prediction():
 
 @app.route('/predict_lab', methods=['POST'])
 def predict_lab():
+    stages = Stopwatch(PREDICT_STAGE_SECONDS)
     try:
         # Add cache control headers
         response = make_response()
@@ -114,14 +153,13 @@ def predict_lab():
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
 
-        # Reload model for fresh prediction
-        new_model, new_columns = load_models()
-        if new_model is None or new_columns is None:
+        # Pin the active model version for the whole request
+        with span('load_models') as load_span:
+            model_version = model_registry.current()
+            load_span.set('model_version', model_version.version if model_version else None)
+        if model_version is None:
             raise RuntimeError("Failed to load models for prediction")
-            
-        # Save globally in case we need them later
-        global model, columns
-        model, columns = new_model, new_columns
+        stages.lap('model')
 
         # Get lifestyle/history factors separately
         family_history = safe_int(request.form.get('family_history', '0'), 0)
@@ -131,24 +169,8 @@ def predict_lab():
         # Initialize input_data with only the fields we want to update from the form
         input_data = {}
         
-        # Map form fields to model features
-        form_to_model = {
-            'age': 'Age',
-            'menopause': 'Menopause',
-            'ggt': 'GGT',
-            'hgb': 'HGB',
-            'afp': 'AFP',
-            'ca72_4': 'CA72-4',
-            'alp': 'ALP',
-            'ca19_9': 'CA19-9',
-            'he4': 'HE4',
-            'cea': 'CEA',
-            'ca125': 'CA125',
-            'ca': 'Ca'
-        }
-        
         # Only update values that were actually provided in the form
-        for form_field, model_field in form_to_model.items():
+        for form_field, model_field in FORM_TO_MODEL.items():
             value = request.form.get(form_field, '')
             if value:  # Only include non-empty values
                 if form_field in ['age', 'menopause']:
@@ -157,9 +179,14 @@ def predict_lab():
                     input_data[model_field] = safe_float(value, get_default_input()[model_field])
         
         logger.info(f"Making prediction with {len(input_data)} features")
+        stages.lap('parse_form')
             
         # Get model prediction
-        result = predict_tabular(model, columns, input_data)
+        with span('predict_tabular', features=len(input_data), model_version=model_version.version):
+            # Resubmits and defaults-only panels score the same vector: memoized per model version
+            predict = inference_batcher.predict if inference_batcher is not None else predict_tabular_fast
+            result = predict_with_cache(model_version, input_data, predict)
+        stages.lap('predict')
         if result is None:
             return render_template('result.html', 
                                 error="Unable to generate prediction. Please try again.",
@@ -169,35 +196,48 @@ def predict_lab():
         
         # Scale the additional risk based on the base probability
         # This ensures lifestyle factors have proportional impact
-        scaled_additional_risk = additional_risk * result['probability']
-        
         # Adjust probability with scaled lifestyle factors (capped at 95%)
-        final_probability = min(0.95, result['probability'] + scaled_additional_risk)
+        final_probability = adjust_probability(result['probability'], additional_risk)
         result['probability'] = final_probability
         
         # Determine risk level and styling
-        risk_level = "high" if final_probability > 0.7 else "medium" if final_probability > 0.3 else "low"
+        risk_level = get_risk_level(final_probability)
         risk_color = {
             "high": "text-red-500",
             "medium": "text-yellow-500",
             "low": "text-green-500"
         }[risk_level]
+        stages.lap('risk')
 
         try:
-            # Generate health advice
-            advice = generate_health_advice(input_data, result)
+            # Generate health advice; in async mode the page polls for it instead of waiting on the LLM
+            advice, advice_job_id, advice_fallback = None, None, False
+            if ADVICE_ASYNC:
+                advice_job_id = advice_jobs.submit(input_data, result)
+                current_span().set('advice_job', advice_job_id)
+                if advice_job_id is None:
+                    advice, advice_fallback = get_fallback_advice(input_data, result), True
+            else:
+                advice, fallback_reason = generate_health_advice_with_reason(input_data, result)
+                advice_fallback = fallback_reason is not None
+            stages.lap('advice')
             
             # Render template with all results
-            return render_template(
-                'result.html',
-                risk_level=risk_level.upper(),
-                risk_color=risk_color,
-                probability=f"{final_probability:.1%}",
-                advice=advice,
-                risk_details=risk_details,
-                input_data=input_data,
-                now=datetime.now()
-            )
+            with span('render_template', template='result.html'):
+                html = render_template(
+                    'result.html',
+                    risk_level=risk_level.upper(),
+                    risk_color=risk_color,
+                    probability=f"{final_probability:.1%}",
+                    advice=advice,
+                    advice_job_id=advice_job_id,
+                    advice_fallback=advice_fallback,
+                    risk_details=risk_details,
+                    input_data=input_data,
+                    now=datetime.now()
+                )
+            stages.lap('render')
+            return html
             
         except Exception as llm_error:
             logger.error(f"Error generating health advice: {str(llm_error)}")
@@ -217,6 +257,118 @@ def predict_lab():
         logger.error("Form data:", str(dict(request.form)))
         return render_template('result.html', error=f"An error occurred: {str(e)}")
 
+LIFESTYLE_FIELDS = ('family_history', 'smoking_status', 'alcohol_consumption')
+
+def parse_batch_panels():
+    """Read lab panels from a JSON array or a CSV upload/body into model-keyed dicts"""
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('panels')
+        if not isinstance(payload, list):
+            raise ValueError("Expected a JSON array of panels or {\"panels\": [...]}")
+        rows = payload
+    else:
+        upload = request.files.get('file')
+        text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+        if not text.strip():
+            raise ValueError("Expected a JSON array or CSV of panels")
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    if len(rows) > BATCH_MAX_ROWS:
+        raise ValueError(f"Batch too large: {len(rows)} panels (limit {BATCH_MAX_ROWS})")
+
+    panels = []
+    for row in rows:
+        if not isinstance(row, dict):
+            raise ValueError("Each panel must be an object")
+        panel = {}
+        for key, value in row.items():
+            # Accept both form field names (ca19_9) and model feature names (CA19-9)
+            key = FORM_TO_MODEL.get(key, key)
+            if value is not None and value != '':
+                panel[key] = value
+        panels.append(panel)
+    return panels
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        panels = parse_batch_panels()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    model_version = model_registry.current()
+    if model_version is None:
+        return jsonify({'error': 'Model is not available'}), 503
+
+    result = predict_tabular_batch(model_version.model, model_version.columns, panels)
+    if result is None:
+        return jsonify({'error': 'Unable to generate predictions'}), 500
+
+    lifestyle = {field: [safe_int(panel.get(field, 0), 0) for panel in panels] for field in LIFESTYLE_FIELDS}
+    final_probability, risk_levels, risk_details = apply_risk_adjustment_batch(
+        result['probability'],
+        lifestyle['family_history'],
+        lifestyle['smoking_status'],
+        lifestyle['alcohol_consumption']
+    )
+
+    logger.info(f"Batch prediction for {len(panels)} panels")
+    return jsonify({
+        'model_version': model_version.version,
+        'count': len(panels),
+        'results': [
+            {
+                'prediction': prediction,
+                'base_probability': base,
+                'probability': final,
+                'risk_level': level.upper(),
+                'risk_details': details
+            }
+            for prediction, base, final, level, details in zip(
+                result['prediction'].tolist(),
+                result['probability'].tolist(),
+                final_probability.tolist(),
+                risk_levels,
+                risk_details
+            )
+        ]
+    })
+
+@app.route('/api/advice/<job_id>')
+def advice_status(job_id):
+    job = advice_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown advice job'}), 404
+    response = jsonify(job)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+@app.route('/admin/reload-model', methods=['POST'])
+def admin_reload_model():
+    supplied = request.headers.get('X-Admin-Token', '').encode()
+    if not ADMIN_TOKEN or not hmac.compare_digest(supplied, ADMIN_TOKEN.encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    force = request.args.get('force', '') in ('1', 'true')
+    if model_registry.refresh(force=force) is None:
+        return jsonify({'error': 'Failed to load model'}), 500
+    return jsonify(model_registry.describe())
+
+@app.route('/metrics')
+def metrics():
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    supplied = request.headers.get('Authorization', '').encode()
+    if METRICS_TOKEN and not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}".encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    response = make_response(get_metrics().render())
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
 @app.route('/login')
 def login():
     return render_template('login.html')
@@ -246,8 +398,13 @@ def auth_signup():
         if not token:
             raise ValueError("Failed to create verification token")
             
-        # Send email
-        if not send_verification_email(email, name, token):
+        # Send email; the dispatcher delivers in the background and the OTP page polls its status
+        if EMAIL_ASYNC:
+            message_id = queue_verification_email(email, name, token)
+            if not message_id:
+                raise ValueError("Failed to queue verification email")
+            session['email_message_id'] = message_id
+        elif not send_verification_email(email, name, token):
             raise ValueError("Failed to send verification email")
             
         # Store user_id in session for OTP verification
@@ -258,6 +415,16 @@ def auth_signup():
         logger.error(f"Signup error: {str(e)}")
         return redirect(url_for('signup'))
 
+@app.route('/auth/email-status')
+def auth_email_status():
+    message_id = session.get('email_message_id')
+    status = get_email_status(message_id) if message_id else None
+    if status is None:
+        return jsonify({'state': 'unknown'}), 404
+    response = jsonify({'state': status['state'], 'attempts': status['attempts']})
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
 @app.route('/auth/verify-otp', methods=['POST'])
 def auth_verify_otp():
     try:
@@ -282,6 +449,7 @@ def auth_verify_otp():
         if verify_user(user_id, token):
             # Clear session and redirect to login
             session.pop('temp_user_id', None)
+            session.pop('email_message_id', None)
             flash('Email verified successfully! Please login.')
             return redirect(url_for('login'))
         else:
@@ -321,4 +489,4 @@ def auth_login():
 
 if __name__ == '__main__':
     app.run(debug=True)
-    
\ No newline at end of file
+    
\ No newline at end of file
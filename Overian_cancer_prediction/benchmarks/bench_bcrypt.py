@@ -0,0 +1,88 @@
+"""bcrypt throughput per work factor, to choose BCRYPT_ROUNDS for this hardware.
+
+Run from the application directory:
+    python -m benchmarks.bench_bcrypt [--rounds 10-14] [--workers 4] [--executor thread]
+
+For each cost it reports the latency of one hash, single-thread throughput,
+and throughput through PasswordHasher with the given pool, normalised per
+core. It then suggests the highest cost whose single hash stays within
+--target-ms, which bounds login latency when the pool is idle.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import bcrypt
+
+from utils.password_utils import PasswordHasher
+
+def parse_rounds(text):
+    if '-' in text:
+        low, high = text.split('-', 1)
+        return list(range(int(low), int(high) + 1))
+    return [int(r) for r in text.split(',')]
+
+def single_thread_rate(rounds, duration):
+    """Hashes per second on the calling thread, plus the mean latency of one hash"""
+    salt = bcrypt.gensalt(rounds)
+    count, start = 0, time.perf_counter()
+    while True:
+        bcrypt.hashpw(b'benchmark-password', salt)
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return count / elapsed, elapsed / count
+
+def pool_rate(rounds, workers, executor, duration):
+    """Hashes per second through a PasswordHasher kept saturated by `workers` callers"""
+    hasher = PasswordHasher(rounds=rounds, workers=workers, executor=executor, max_pending=workers)
+    hasher.hash('warm-up')  # Start the pool (and worker processes) before timing
+    counts = [0] * workers
+    deadline = time.perf_counter() + duration
+
+    def caller(index):
+        while time.perf_counter() < deadline:
+            hasher.hash('benchmark-password')
+            counts[index] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    hasher.shutdown(wait=True)
+    return sum(counts) / elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', default='10-14', help="Costs to measure, e.g. 10-14 or 10,12")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Pool size to measure")
+    parser.add_argument('--executor', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--duration', type=float, default=2.0, help="Seconds per measurement")
+    parser.add_argument('--target-ms', type=float, default=250.0, help="Acceptable latency of one hash")
+    args = parser.parse_args(argv)
+
+    cores = min(args.workers, os.cpu_count() or 1)
+    print(f"{os.cpu_count()} CPUs, pool of {args.workers} {args.executor} workers")
+    print(f"{'rounds':>6} {'ms/hash':>9} {'1 thread/s':>11} {'pool/s':>9} {'per core/s':>11}")
+
+    suggested = None
+    for rounds in parse_rounds(args.rounds):
+        single, latency = single_thread_rate(rounds, args.duration)
+        pooled = pool_rate(rounds, args.workers, args.executor, args.duration)
+        print(f"{rounds:>6} {latency * 1000:>9.1f} {single:>11.2f} {pooled:>9.2f} {pooled / cores:>11.2f}")
+        if latency * 1000 <= args.target_ms:
+            suggested = rounds
+
+    if suggested is None:
+        print(f"No measured cost hashes within {args.target_ms:.0f}ms; try lower --rounds")
+        return 1
+    print(f"Suggested BCRYPT_ROUNDS={suggested} (highest cost within {args.target_ms:.0f}ms per hash)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
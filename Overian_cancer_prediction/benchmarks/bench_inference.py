@@ -0,0 +1,92 @@
+"""Single-row inference benchmark: predict_tabular vs predict_tabular_fast.
+
+Run from the application directory:
+    python -m benchmarks.bench_inference [--iterations 2000]
+
+Scores every panel in database/merged_ovarian_data.csv with both functions,
+fails if any probability differs, then reports per-call latency percentiles.
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+
+from utils.model_utils import (REQUIRED_FEATURES, find_model_path, load_model_file,
+                               predict_tabular, predict_tabular_fast)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, 'database', 'merged_ovarian_data.csv')
+
+def load_panels(path=DATA_PATH):
+    """Read lab panels as the form would submit them: numeric fields only, blanks omitted"""
+    panels = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            panel = {}
+            for feature in REQUIRED_FEATURES:
+                try:
+                    panel[feature] = float(row.get(feature, ''))
+                except ValueError:
+                    continue  # Blank or non-numeric: predict functions fill the default
+            panels.append(panel)
+    return panels
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def time_calls(fn, model, panels, iterations):
+    timings = []
+    for i in range(iterations):
+        panel = panels[i % len(panels)]
+        start = time.perf_counter_ns()
+        fn(model, REQUIRED_FEATURES, panel)
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return {
+        'p50_us': percentile(timings, 50) / 1000.0,
+        'p99_us': percentile(timings, 99) / 1000.0,
+        'mean_us': sum(timings) / len(timings) / 1000.0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    # The reference path logs on every call; keep that out of the measurement
+    logging.disable(logging.CRITICAL)
+
+    model = load_model_file(find_model_path())
+    panels = load_panels()
+
+    mismatches = 0
+    for panel in panels:
+        reference = predict_tabular(model, REQUIRED_FEATURES, panel)
+        fast = predict_tabular_fast(model, REQUIRED_FEATURES, panel)
+        if reference != fast:
+            mismatches += 1
+    print(f"checked {len(panels)} panels, {mismatches} mismatches")
+    if mismatches:
+        return 1
+
+    # Warm up both paths before timing
+    time_calls(predict_tabular, model, panels, 50)
+    time_calls(predict_tabular_fast, model, panels, 50)
+
+    results = {
+        'predict_tabular': time_calls(predict_tabular, model, panels, args.iterations),
+        'predict_tabular_fast': time_calls(predict_tabular_fast, model, panels, args.iterations)
+    }
+    print(f"{'function':<24}{'p50 (us)':>12}{'p99 (us)':>12}{'mean (us)':>12}")
+    for name, stats in results.items():
+        print(f"{name:<24}{stats['p50_us']:>12.1f}{stats['p99_us']:>12.1f}{stats['mean_us']:>12.1f}")
+
+    base, fast = results['predict_tabular'], results['predict_tabular_fast']
+    print(f"speedup: p50 x{base['p50_us'] / fast['p50_us']:.1f}, p99 x{base['p99_us'] / fast['p99_us']:.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
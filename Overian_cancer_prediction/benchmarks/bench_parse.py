@@ -0,0 +1,112 @@
+"""Regression check and microbenchmark for parse_response.
+
+Run from the application directory:
+    python -m benchmarks.bench_parse [--fuzz 5000] [--repeat 20]
+
+Compares the single-pass parse_response against the original per-section
+parser (extract_section / format_section / extract_wellness_tips) on the
+recorded responses in benchmarks/data/llm_responses, on random mutations
+of them, and then times both on long completions. tests/test_llm_parsing.py
+runs the same comparison under pytest.
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+from utils.llm_utils import (ADVICE_SECTIONS, extract_section, extract_wellness_tips,
+                             format_section, parse_response)
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_responses')
+
+def reference_parse_response(text):
+    """The original parser: five independent extract_section scans, then per-section formatting"""
+    sections = {key: extract_section(text, start, end) for key, start, end in ADVICE_SECTIONS}
+    sections['wellness_tips'] = extract_wellness_tips(sections['wellness_tips'])
+    return {k: format_section(v) for k, v in sections.items()}
+
+def load_corpus(path=CORPUS_DIR):
+    corpus = []
+    for filename in sorted(glob.glob(os.path.join(path, '*.txt'))):
+        with open(filename, encoding='utf-8', newline='') as f:
+            corpus.append((os.path.basename(filename), f.read()))
+    return corpus
+
+# Fragments the fuzzer splices in: headings, bullets, markdown and awkward whitespace
+FUZZ_FRAGMENTS = [marker for _, start, end in ADVICE_SECTIONS for marker in (start, end) if marker] + [
+    '\n', '\r\n', '\n\n', '- ', '* ', '• ', '**', '***', '1. ', '<li>', '</li>', '<p>', '   ',
+    'RISK FACTORS:', 'daily wellness tips:', 'Important signs', 'x' * 12, 'short', '\t'
+]
+
+def mutate(text, rng):
+    """Apply a few random splices, deletions, case flips and line shuffles"""
+    for _ in range(rng.randint(1, 6)):
+        op = rng.random()
+        pos = rng.randint(0, len(text))
+        if op < 0.4:
+            text = text[:pos] + rng.choice(FUZZ_FRAGMENTS) + text[pos:]
+        elif op < 0.6:
+            text = text[:pos] + text[pos + rng.randint(1, 40):]
+        elif op < 0.75:
+            end = pos + rng.randint(1, 60)
+            text = text[:pos] + text[pos:end].swapcase() + text[end:]
+        elif op < 0.9:
+            lines = text.split('\n')
+            rng.shuffle(lines)
+            text = '\n'.join(lines)
+        else:
+            text = text[:pos]
+    return text
+
+def check(corpus, fuzz_cases, seed):
+    failures = []
+    for name, text in corpus:
+        if parse_response(text) != reference_parse_response(text):
+            failures.append(name)
+
+    rng = random.Random(seed)
+    for i in range(fuzz_cases):
+        text = mutate(rng.choice(corpus)[1], rng)
+        if parse_response(text) != reference_parse_response(text):
+            failures.append(f"fuzz case {i}: {text!r}")
+    return failures
+
+def time_parser(fn, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (rounds * len(texts)) * 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fuzz', type=int, default=5000, help="Number of mutated responses to compare")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help="Times each section body is repeated to build long completions")
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus()
+    failures = check(corpus, args.fuzz, args.seed)
+    print(f"compared {len(corpus)} recorded + {args.fuzz} fuzzed responses, {len(failures)} mismatches")
+    for failure in failures[:10]:
+        print(f"  mismatch: {failure[:200]}")
+    if failures:
+        return 1
+
+    # Long completions: every line of each recorded response repeated in place
+    long_texts = ['\n'.join(line for line in text.split('\n') for _ in range(args.repeat))
+                  for _, text in corpus]
+    for label, texts in (('recorded', [text for _, text in corpus]), ('long', long_texts)):
+        avg_chars = sum(map(len, texts)) // len(texts)
+        reference = time_parser(reference_parse_response, texts, args.rounds)
+        single_pass = time_parser(parse_response, texts, args.rounds)
+        print(f"{label:<9} ({avg_chars:>6} chars avg): reference {reference:8.1f}us  "
+              f"single-pass {single_pass:8.1f}us  x{reference / single_pass:.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
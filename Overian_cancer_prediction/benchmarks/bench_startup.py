@@ -0,0 +1,86 @@
+"""Cold-start time of the app, with an import-time profile and a budget check.
+
+Run from the application directory (with the app's environment set):
+    python -m benchmarks.bench_startup [--runs 5] [--budget-ms 800]
+    MODEL_PRELOAD=true python -m benchmarks.bench_startup --budget-ms 2500
+
+Each run imports app in a fresh interpreter, so nothing is warm but the OS
+page cache. The reported time is `import app` alone; interpreter startup
+(site hooks, .pth files) is measured separately and not counted. Exits
+with status 1 if the median exceeds --budget-ms; tests/test_startup.py
+runs it against the default config (lazy model load, about 300ms here).
+Preloading the XGBoost model (MODEL_PRELOAD=true) adds about 1.8s.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMED_IMPORT = ("import time; t = time.perf_counter(); import app; "
+                "print('STARTUP', time.perf_counter() - t)")
+
+def run(code, importtime=False):
+    """Run code in a fresh interpreter; returns (stdout, stderr)"""
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(cmd, cwd=APP_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing app failed:\n{result.stderr[-2000:]}")
+    return result.stdout, result.stderr
+
+def measure(runs):
+    times = []
+    for _ in range(runs):
+        stdout, _ = run(TIMED_IMPORT)
+        line = next(l for l in stdout.splitlines() if l.startswith('STARTUP'))
+        times.append(float(line.split()[1]) * 1000)
+    return times
+
+def parse_importtime(stderr):
+    """Parse -X importtime lines into (module, depth, self_us, cumulative_us)"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+def import_profile(top):
+    """Slowest modules imported (directly or not) by app, excluding interpreter startup"""
+    _, baseline = run('pass', importtime=True)
+    already_loaded = {name for name, *_ in parse_importtime(baseline)}
+    _, stderr = run('import app', importtime=True)
+    entries = [e for e in parse_importtime(stderr) if e[0] not in already_loaded]
+    # Top-level packages and app's own modules tell you where to act; deeper entries are detail
+    candidates = [e for e in entries if e[1] <= 2 or e[0].startswith(('utils', 'config'))]
+    return sorted(candidates, key=lambda e: e[3], reverse=True)[:top]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=800.0, help="Maximum median `import app` time")
+    parser.add_argument('--top', type=int, default=20, help="Modules to list in the import profile")
+    args = parser.parse_args(argv)
+
+    print(f"MODEL_PRELOAD={os.getenv('MODEL_PRELOAD', 'False')} MODEL_BACKEND={os.getenv('MODEL_BACKEND', 'xgboost')}")
+    print(f"\nimport profile (cumulative, modules not loaded by a bare interpreter):")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, depth, self_us, cumulative_us in import_profile(args.top):
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {'  ' * depth}{name}")
+
+    times = measure(args.runs)
+    median = statistics.median(times)
+    print(f"\nimport app over {args.runs} runs: median {median:.0f}ms, "
+          f"min {min(times):.0f}ms, max {max(times):.0f}ms (budget {args.budget_ms:.0f}ms)")
+    if median > args.budget_ms:
+        print("FAIL: cold start is over budget")
+        return 1
+    print("OK: cold start is within budget")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Verification-code lookup and pruning on a seeded table of a million codes.
+
+Run from the application directory:
+    python -m benchmarks.bench_tokens [--tokens 1000000] [--users 200000]
+
+Seeds a SQLite database through SQLiteStorage, most codes used or expired
+as they are after months without pruning. It then compares:
+  legacy   single-column indexes on token and user_id, select by
+           (user_id, token, used) and expiry checked in Python afterwards;
+  current  the schema's partial composite index, expiry in the query.
+Finally it runs TokenReaper over the backlog and reports batch latencies.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytz
+
+from utils.sqlite_storage import SQLiteStorage, SCHEMA_PATH, to_timestamp
+from utils.token_reaper import TokenReaper
+
+# Seed into a bare table; each phase then builds its own indexes
+DROP_INDEXES = """
+DROP INDEX IF EXISTS idx_verification_lookup;
+DROP INDEX IF EXISTS idx_verification_expires;
+DROP INDEX IF EXISTS idx_verification_used;
+DROP INDEX IF EXISTS idx_verification_token;
+DROP INDEX IF EXISTS idx_verification_user;
+"""
+
+LEGACY_INDEXES = """
+DROP INDEX IF EXISTS idx_verification_lookup;
+DROP INDEX IF EXISTS idx_verification_expires;
+DROP INDEX IF EXISTS idx_verification_used;
+CREATE INDEX IF NOT EXISTS idx_verification_token ON email_verification(token);
+CREATE INDEX IF NOT EXISTS idx_verification_user ON email_verification(user_id);
+"""
+
+LEGACY_LOOKUP = 'SELECT * FROM email_verification WHERE user_id = ? AND token = ? AND used = 0'
+CURRENT_LOOKUP = '''SELECT id FROM email_verification
+                    WHERE user_id = ? AND token = ? AND used = 0 AND expires_at > ? LIMIT 1'''
+
+def seed(storage, tokens, users, live_fraction, rng):
+    """Insert users and codes; returns (user_id, token) pairs of the live codes"""
+    now = datetime.now(pytz.UTC)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    live = []
+
+    def rows():
+        for i in range(tokens):
+            user_id = user_ids[i % users]
+            token = f"{rng.randint(100000, 999999)}"
+            if rng.random() < live_fraction:
+                live.append((user_id, token))
+                yield str(uuid.uuid4()), user_id, token, to_timestamp(now + timedelta(minutes=10)), 0
+            else:
+                # Dead codes: used within their window, or left to expire
+                expires = now - timedelta(minutes=rng.randint(1, 60 * 24 * 90))
+                yield str(uuid.uuid4()), user_id, token, to_timestamp(expires), rng.random() < 0.6
+
+    with storage._transaction() as conn:
+        conn.executemany('INSERT INTO users (id, email, password_hash, full_name) VALUES (?, ?, ?, ?)',
+                         ((uid, f'{uid}@example.org', 'x', 'Seed') for uid in user_ids))
+        conn.executemany('INSERT INTO email_verification (id, user_id, token, expires_at, used) '
+                         'VALUES (?, ?, ?, ?, ?)', rows())
+    return user_ids, live
+
+def apply_indexes(storage, script):
+    with storage._connection() as conn:
+        conn.executescript(script)
+        conn.execute('ANALYZE')
+
+def query_plan(storage, sql, params):
+    with storage._connection() as conn:
+        return '; '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+def time_lookups(storage, probes, current):
+    now = datetime.now(pytz.UTC)
+    timings = []
+    hits = 0
+    with storage._connection() as conn:
+        for user_id, token in probes:
+            start = time.perf_counter()
+            if current:
+                found = conn.execute(CURRENT_LOOKUP, (user_id, token, to_timestamp(now))).fetchone() is not None
+            else:
+                rows = conn.execute(LEGACY_LOOKUP, (user_id, token)).fetchall()
+                found = any(datetime.fromisoformat(row['expires_at']).replace(tzinfo=pytz.UTC) > now
+                            for row in rows)
+            timings.append(time.perf_counter() - start)
+            hits += found
+    timings.sort()
+    return hits, timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+def count_tokens(storage):
+    with storage._connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM email_verification').fetchone()[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--live-fraction', type=float, default=0.02, help="Share of codes still usable")
+    parser.add_argument('--lookups', type=int, default=20_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--path', help="Database file (default: a temporary file, removed afterwards)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'bench_tokens.sqlite3')
+    storage = SQLiteStorage(path=path, pool_size=1)
+
+    with storage._connection() as conn:
+        conn.executescript(DROP_INDEXES)
+    start = time.perf_counter()
+    user_ids, live = seed(storage, args.tokens, args.users, args.live_fraction, rng)
+    print(f"seeded {args.tokens} codes for {args.users} users ({len(live)} live) "
+          f"in {time.perf_counter() - start:.1f}s -> {path}")
+
+    # Half the probes are live codes, half are wrong guesses for real users
+    probes = [rng.choice(live) for _ in range(args.lookups // 2)]
+    probes += [(rng.choice(user_ids), f"{rng.randint(100000, 999999)}") for _ in range(args.lookups - len(probes))]
+    rng.shuffle(probes)
+    now = to_timestamp(datetime.now(pytz.UTC))
+
+    with open(SCHEMA_PATH, encoding='utf-8') as f:
+        current_schema = f.read()
+    for label, script, sql, params, current in (
+            ('legacy', LEGACY_INDEXES, LEGACY_LOOKUP, ('u', 't'), False),
+            ('current', current_schema, CURRENT_LOOKUP, ('u', 't', now), True)):
+        apply_indexes(storage, script)
+        hits, p50, p99 = time_lookups(storage, probes, current)
+        print(f"{label:<8} lookup p50 {p50:7.1f}us  p99 {p99:7.1f}us  hits {hits}/{len(probes)}")
+        print(f"         plan: {query_plan(storage, sql, params)}")
+
+    batch_times = []
+    prune = storage.prune_verification_tokens
+
+    def timed_prune(now, batch_size):
+        start = time.perf_counter()
+        try:
+            return prune(now, batch_size)
+        finally:
+            batch_times.append(time.perf_counter() - start)
+
+    storage.prune_verification_tokens = timed_prune
+    start = time.perf_counter()
+    deleted = TokenReaper(storage=storage, batch_size=args.batch_size, pause=0).run_once()
+    elapsed = time.perf_counter() - start
+    print(f"reaper   deleted {deleted} codes in {len(batch_times)} batches, {elapsed:.1f}s "
+          f"({deleted / elapsed:,.0f} rows/s); batch median {statistics.median(batch_times) * 1000:.1f}ms, "
+          f"max {max(batch_times) * 1000:.1f}ms; {count_tokens(storage)} codes left")
+
+    hits, p50, p99 = time_lookups(storage, probes, True)
+    print(f"pruned   lookup p50 {p50:7.1f}us  p99 {p99:7.1f}us  hits {hits}/{len(probes)}")
+
+    storage.close()
+    if not args.path:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,388 @@
+"""Load test: realistic patient panels and auth flows against a local app.
+
+Run from the application directory:
+    python -m benchmarks.loadtest --rate 20 --concurrency 16 --duration 60
+    python -m benchmarks.loadtest --rate 0 --concurrency 8      closed loop, as fast as it goes
+    python -m benchmarks.loadtest --app-cmd "gunicorn -w 4 -b 127.0.0.1:{port} app:app"
+
+Starts the LLM and SMTP stand-ins in-process and the app as a subprocess
+(Flask's threaded server unless --app-cmd is given) on a throwaway SQLite
+database, so nothing leaves the machine. With --url it drives an app that is
+already running; start that app pointed at --llm-port and --smtp-port.
+
+Each scenario is one user action, picked by --mix weights:
+  predict  POST /predict_lab with a panel sampled from the merged CSV, blanks
+           kept blank, then (async advice) poll /api/advice/<job> like the page
+  login    POST /auth/login as one of the accounts created during warm-up
+  signup   POST /auth/signup, read the code from the SMTP stand-in, POST /auth/verify-otp
+With --rate > 0 scenarios start on a fixed schedule (open loop) whether or
+not earlier ones finished; the report shows how far starts lagged behind it,
+which grows when the app or --concurrency cannot keep up.
+"""
+import argparse
+import csv
+import email
+import json
+import os
+import queue
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+from utils.model_utils import FORM_TO_MODEL
+from .bench_inference import DATA_PATH, percentile
+from .standins import FakeLLMServer, FakeSMTPServer
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_APP_CMD = (f"{sys.executable} -c \"import app; "
+                   "app.app.run(host='127.0.0.1', port={port}, threaded=True)\"")
+ROUTES = ['predict_lab', 'advice_poll', 'advice_ready', 'signup', 'verify_otp', 'login']
+PASSWORD = 'LoadTest-Passw0rd'
+CODE_PATTERN = re.compile(r'verification code is:\s*(\d{6})')
+MENOPAUSE_FORM_VALUES = {'0': '0', '1': '1', 'No': '0', 'Yes': '1'}  # 'Unknown' is sent blank
+JOB_PATTERN = re.compile(rb'data-advice-job="([^"]+)"')
+
+def load_forms(path=DATA_PATH):
+    """Every CSV row as the prediction form would post it; missing values stay empty strings"""
+    forms = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            form = {}
+            for field, feature in FORM_TO_MODEL.items():
+                value = (row.get(feature) or '').strip()
+                if feature == 'Menopause':
+                    value = MENOPAUSE_FORM_VALUES.get(value, '')
+                form[field] = value
+            forms.append(form)
+    return forms
+
+class Recorder:
+    """Thread-safe per-route latencies and error reasons"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.lag = []
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, error=None):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if error:
+                self.errors[route][error] += 1
+
+    def record_lag(self, seconds):
+        with self._lock:
+            self.lag.append(seconds)
+
+    def summary(self, elapsed):
+        routes = {}
+        for route in ROUTES + sorted(set(self.latencies) - set(ROUTES)):
+            timings = sorted(self.latencies.get(route, []))
+            if not timings:
+                continue
+            failed = sum(self.errors[route].values())
+            routes[route] = {
+                'requests': len(timings),
+                'throughput_rps': round(len(timings) / elapsed, 2),
+                'p50_ms': round(percentile(timings, 50) * 1000, 1),
+                'p95_ms': round(percentile(timings, 95) * 1000, 1),
+                'p99_ms': round(percentile(timings, 99) * 1000, 1),
+                'max_ms': round(timings[-1] * 1000, 1),
+                'error_rate': round(failed / len(timings), 4),
+                'errors': dict(self.errors[route].most_common(5)),
+            }
+        lag = sorted(self.lag)
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'routes': routes,
+            'start_lag_ms': {'p50': round(percentile(lag, 50) * 1000, 1),
+                             'p99': round(percentile(lag, 99) * 1000, 1)} if lag else None,
+        }
+
+class LoadTest:
+    def __init__(self, base_url, smtp, forms, recorder, rng, follow_advice=True,
+                 poll_interval=1.0, advice_timeout=90.0, email_timeout=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.smtp = smtp
+        self.forms = forms
+        self.recorder = recorder
+        self.follow_advice = follow_advice
+        self.poll_interval = poll_interval
+        self.advice_timeout = advice_timeout
+        self.email_timeout = email_timeout
+        self.accounts = []
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counter = 0
+
+    def _session(self):
+        # One keep-alive session per worker thread, as one browser per virtual user
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _choice(self, items):
+        with self._lock:
+            return self._rng.choice(items)
+
+    def _request(self, session, route, method, path, expect=None, **kwargs):
+        """Send one request and record it; returns the response or None on failure"""
+        start = time.perf_counter()
+        error = None
+        response = None
+        try:
+            response = session.request(method, self.base_url + path, allow_redirects=False, timeout=120, **kwargs)
+            if response.status_code >= 400:
+                error = f"HTTP {response.status_code}"
+            elif expect and not expect(response):
+                error = f"unexpected response ({response.status_code} {response.headers.get('Location', '')})"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        self.recorder.record(route, time.perf_counter() - start, error)
+        return None if error else response
+
+    def predict(self):
+        session = self._session()
+        form = dict(self._choice(self.forms))
+        for field in ('family_history', 'smoking_status', 'alcohol_consumption'):
+            form[field] = self._choice(['0', '0', '0', '1'])
+        response = self._request(session, 'predict_lab', 'POST', '/predict_lab', data=form,
+                                 expect=lambda r: b'An error occurred' not in r.content)
+        job = JOB_PATTERN.search(response.content) if response is not None and self.follow_advice else None
+        if job:
+            self._follow_advice(session, job.group(1).decode())
+
+    def _follow_advice(self, session, job_id):
+        """Poll the advice job the way static/advice.js does; records the time until it is done"""
+        start = time.perf_counter()
+        while time.perf_counter() - start < self.advice_timeout:
+            time.sleep(self.poll_interval)
+            response = self._request(session, 'advice_poll', 'GET', f'/api/advice/{job_id}')
+            if response is None:
+                break
+            if response.json().get('status') == 'done':
+                self.recorder.record('advice_ready', time.perf_counter() - start)
+                return
+        self.recorder.record('advice_ready', time.perf_counter() - start, 'not done')
+
+    def signup(self):
+        session = requests.Session()  # Fresh cookies: the pending user id lives in the session
+        with self._lock:
+            self._counter += 1
+            address = f"load-{os.getpid()}-{self._counter}-{self._rng.randrange(1 << 30)}@example.org"
+        response = self._request(session, 'signup', 'POST', '/auth/signup',
+                                 data={'email': address, 'password': PASSWORD, 'name': 'Load Test'},
+                                 expect=lambda r: r.headers.get('Location', '').endswith('/verify-otp'))
+        if response is None:
+            return None
+        code = self._wait_for_code(address)
+        if code is None:
+            self.recorder.record('verify_otp', 0.0, 'no email')
+            return None
+        response = self._request(session, 'verify_otp', 'POST', '/auth/verify-otp', data={'otp': code},
+                                 expect=lambda r: r.headers.get('Location', '').endswith('/login'))
+        if response is None:
+            return None
+        with self._lock:
+            self.accounts.append(address)
+        return address
+
+    def _wait_for_code(self, address):
+        deadline = time.perf_counter() + self.email_timeout
+        while time.perf_counter() < deadline:
+            for _, recipients, data in reversed(self.smtp.messages):
+                if address in recipients:
+                    message = email.message_from_string(data)
+                    for part in message.walk():
+                        payload = part.get_payload(decode=True)
+                        match = CODE_PATTERN.search(payload.decode('utf-8', 'replace')) if payload else None
+                        if match:
+                            return match.group(1)
+            time.sleep(0.05)
+        return None
+
+    def login(self):
+        if not self.accounts:
+            return self.recorder.record('login', 0.0, 'no accounts')
+        self._request(self._session(), 'login', 'POST', '/auth/login',
+                      data={'email': self._choice(self.accounts), 'password': PASSWORD},
+                      expect=lambda r: r.headers.get('Location', '').endswith('/prediction'))
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('predict', 'login', 'signup'):
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_app(command, port, env, log_path, timeout=90.0):
+    """Launch the app and wait until it answers; returns the Popen"""
+    log = open(log_path, 'w')
+    process = subprocess.Popen(command.format(port=port), shell=True, cwd=APP_DIR, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with status {process.returncode}; see {log_path}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/login", timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"App did not answer within {timeout:.0f}s; see {log_path}")
+
+def run(test, mix, rate, concurrency, duration, recorder):
+    """Drive scenarios for duration seconds; returns the measured wall time"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    rng = random.Random(test._rng.random())
+    scenarios = {'predict': test.predict, 'login': test.login, 'signup': test.signup}
+    tickets = queue.Queue()
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        while True:
+            if rate > 0:
+                ticket = tickets.get()
+                if ticket is None:
+                    return
+                due, name = ticket
+                recorder.record_lag(time.perf_counter() - due)
+            elif time.perf_counter() >= stop_at:
+                return
+            else:
+                with test._lock:
+                    name = rng.choices(names, weights)[0]
+            try:
+                scenarios[name]()
+            except Exception as e:  # A harness bug must not silently shrink the load
+                recorder.record(name, 0.0, f"harness: {type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    if rate > 0:
+        # Open loop: tickets are issued on schedule even if workers fall behind
+        i = 0
+        while True:
+            due = start + i / rate
+            if due >= stop_at:
+                break
+            time.sleep(max(0.0, due - time.perf_counter()))
+            tickets.put((due, rng.choices(names, weights)[0]))
+            i += 1
+        for _ in threads:
+            tickets.put(None)
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def print_report(summary):
+    print(f"\n{'route':<14}{'requests':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}")
+    for route, stats in summary['routes'].items():
+        print(f"{route:<14}{stats['requests']:>9}{stats['throughput_rps']:>8.1f}{stats['p50_ms']:>9.1f}"
+              f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}{stats['error_rate']:>8.1%}")
+    for route, stats in summary['routes'].items():
+        for reason, count in stats['errors'].items():
+            print(f"  {route}: {count} x {reason}")
+    lag = summary['start_lag_ms']
+    if lag:
+        print(f"scenario start lag behind schedule: p50 {lag['p50']:.1f}ms, p99 {lag['p99']:.1f}ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help="Drive an already running app instead of starting one")
+    parser.add_argument('--app-cmd', default=DEFAULT_APP_CMD, help="Command that serves the app on {port}")
+    parser.add_argument('--rate', type=float, default=10.0, help="Scenarios started per second; 0 for closed loop")
+    parser.add_argument('--concurrency', type=int, default=8, help="Simultaneous virtual users")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of load")
+    parser.add_argument('--mix', type=parse_mix, default='predict=80,login=15,signup=5',
+                        help="Scenario weights, e.g. predict=80,login=15,signup=5")
+    parser.add_argument('--accounts', type=int, default=10, help="Verified accounts created before the run")
+    parser.add_argument('--no-advice', action='store_true', help="Do not poll for async advice")
+    parser.add_argument('--llm-latency', type=float, default=2.0, help="Seconds the LLM stand-in takes to answer")
+    parser.add_argument('--smtp-latency', type=float, default=0.2, help="Seconds the SMTP stand-in takes per message")
+    parser.add_argument('--llm-port', type=int, default=0)
+    parser.add_argument('--smtp-port', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Write the summary to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    llm = FakeLLMServer(port=args.llm_port, latency=args.llm_latency).start()
+    smtp = FakeSMTPServer(port=args.smtp_port, latency=args.smtp_latency).start()
+    smtp_host, smtp_port = smtp.address
+    print(f"LLM stand-in {llm.url}, SMTP stand-in {smtp_host}:{smtp_port}")
+
+    app_process = None
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    try:
+        if args.url:
+            base_url = args.url
+        else:
+            port = free_port()
+            env = dict(os.environ, TOGETHER_API_URL=llm.url, TOGETHER_API_KEY='standin', SMTP_HOST=smtp_host, SMTP_PORT=str(smtp_port),
+                       SMTP_STARTTLS='false', EMAIL_ADDRESS='noreply@example.org', EMAIL_PASSWORD='')
+            # Local storage and a shared session key unless the caller chose otherwise
+            env.setdefault('STORAGE_BACKEND', 'sqlite')
+            env.setdefault('SQLITE_PATH', os.path.join(workdir, 'loadtest.sqlite3'))
+            env.setdefault('SECRET_KEY', 'loadtest')
+            log_path = os.path.join(workdir, 'app.log')
+            app_process = start_app(args.app_cmd, port, env, log_path)
+            base_url = f"http://127.0.0.1:{port}"
+            print(f"app on {base_url} (log: {log_path})")
+
+        test = LoadTest(base_url, smtp, load_forms(), Recorder(), random.Random(args.seed),
+                        follow_advice=not args.no_advice)
+        if args.mix.get('login'):
+            for _ in range(args.accounts):
+                test.signup()
+            print(f"warm-up: {len(test.accounts)}/{args.accounts} accounts verified")
+        # Warm-up requests are not part of the measurement
+        test.recorder = recorder = Recorder()
+
+        mode = f"{args.rate:g} scenarios/s" if args.rate > 0 else "closed loop"
+        print(f"running {args.duration:g}s, {mode}, {args.concurrency} virtual users, mix {args.mix}")
+        elapsed = run(test, args.mix, args.rate, args.concurrency, args.duration, recorder)
+        summary = recorder.summary(elapsed)
+        summary['config'] = {'rate': args.rate, 'concurrency': args.concurrency, 'duration': args.duration,
+                             'mix': args.mix, 'llm_latency': args.llm_latency, 'url': base_url,
+                             'app_cmd': None if args.url else args.app_cmd}
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(10)
+        llm.stop()
+        smtp.stop()
+
+    print_report(summary)
+    if args.json == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""Local stand-ins for the external services the app talks to.
+
+Run one from the application directory, then point the app at it:
+    python -m benchmarks.standins llm --port 8089
+    TOGETHER_API_URL=http://127.0.0.1:8089/v1/chat/completions TOGETHER_API_KEY=standin python app.py
+
+    python -m benchmarks.standins smtp --port 8025
+    SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false python app.py
+
+The classes can also be started in-process from benchmarks and load tests.
+"""
+import argparse
+import json
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A completion shaped like the real model's answers to the advice prompt
+SAMPLE_COMPLETION = """Here are personalized recommendations based on the assessment.
+
+1. **Risk Factors:**
+- **Age:** At this age, ovarian cancer risk is higher than in younger women.
+- **Menopausal status:** Post-menopausal status is associated with increased risk.
+- **Biomarkers:** An elevated CA125 warrants follow-up with your gynecologist.
+- **Lifestyle:** Weight management and not smoking help reduce overall risk.
+
+2. **Dietary Recommendations:**
+- Include cruciferous vegetables such as broccoli and cabbage several times a week.
+- Choose whole grains, legumes and fiber-rich foods.
+- Limit red and processed meats and sugary drinks.
+- Try a Mediterranean-style plate: vegetables, olive oil, fish and beans.
+
+3. **Exercise Guidelines:**
+- Aim for 150 minutes of moderate activity such as brisk walking each week.
+- Add two sessions of light strength training.
+- Stop and rest if you feel pain or unusual shortness of breath.
+- Regular activity helps energy levels, mood and weight control.
+
+4. **Important Signs to Monitor:**
+- Persistent bloating, pelvic or abdominal pain lasting more than two weeks.
+- Feeling full quickly or changes in bowel or bladder habits.
+- Contact your provider promptly if symptoms persist.
+- Repeat CA125 and HE4 testing as advised by your doctor.
+
+5. **Daily Wellness Tips:**
+- Take a 20-minute walk after a meal every day.
+- Practice ten minutes of deep breathing or meditation to manage stress.
+- Keep a regular sleep schedule with 7-8 hours of rest each night.
+- Connect with a support group or trusted friends regularly."""
+
+def completion_to_sse(completion, chunk_chars=24):
+    """Encode a completion as the chat-completions SSE stream a real backend sends"""
+    events = []
+    for i in range(0, len(completion), chunk_chars):
+        chunk = {
+            'object': 'chat.completion.chunk',
+            'choices': [{'index': 0, 'delta': {'content': completion[i:i + chunk_chars]}, 'finish_reason': None}]
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return ''.join(events).encode('utf-8')
+
+class FakeLLMServer:
+    """Minimal OpenAI-compatible /v1/chat/completions server.
+
+    latency: seconds to wait before answering.
+    fail_statuses: statuses returned, in order, for the first requests (e.g. [503, 429]).
+    Requests with "stream": true get an SSE body (sse_replay bytes if given, else
+    the completion re-encoded), written in chunk_bytes pieces chunk_delay apart.
+    Chunk boundaries deliberately fall mid-event, as they do over real networks.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, completion=SAMPLE_COMPLETION,
+                 latency=0.0, fail_statuses=(), sse_replay=None, chunk_bytes=64, chunk_delay=0.0):
+        self.completion = completion
+        self.latency = latency
+        self.fail_statuses = list(fail_statuses)
+        self.sse_replay = sse_replay
+        self.chunk_bytes = chunk_bytes
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _next_status(self, client_address):
+        with self._lock:
+            self.requests += 1
+            self.connections.add(client_address)
+            return self.fail_statuses.pop(0) if self.fail_statuses else 200
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled clients can reuse connections
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                status = server._next_status(self.client_address)
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if status == 200 and payload.get('stream'):
+                    self._send_stream()
+                    return
+
+                if status != 200:
+                    body = json.dumps({'error': {'message': f'stand-in error {status}'}}).encode()
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header('Retry-After', '0')
+                else:
+                    body = json.dumps({
+                        'id': f'standin-{server.requests}',
+                        'object': 'chat.completion',
+                        'model': payload.get('model'),
+                        'choices': [{
+                            'index': 0,
+                            'message': {'role': 'assistant', 'content': server.completion},
+                            'finish_reason': 'stop'
+                        }]
+                    }).encode()
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self):
+                body = server.sse_replay or completion_to_sse(server.completion)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for i in range(0, len(body), server.chunk_bytes):
+                    piece = body[i:i + server.chunk_bytes]
+                    self.wfile.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n")
+                    self.wfile.flush()
+                    if server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+class FakeSMTPServer:
+    """Minimal SMTP server that accepts and records messages.
+
+    Speaks enough of RFC 5321 for smtplib (EHLO/HELO, AUTH, MAIL, RCPT, DATA,
+    RSET, NOOP, QUIT); no STARTTLS, so clients must run with SMTP_STARTTLS=false.
+    latency: seconds to wait before accepting each message.
+    fail_codes: replies given, in order, to the first MAIL commands (e.g. [451, 421]);
+    421 also closes the connection, as real servers do.
+    drop_after: close the connection after this many messages on it, to
+    exercise client reconnects.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_codes=(), drop_after=None):
+        self.latency = latency
+        self.fail_codes = list(fail_codes)
+        self.drop_after = drop_after
+        self.messages = []  # (mail_from, recipients, data)
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b"\r\n")
+
+            def handle(self):
+                with server._lock:
+                    server.connections += 1
+                self.reply("220 standin ESMTP ready")
+                mail_from, recipients, delivered = None, [], 0
+                for raw in self.rfile:
+                    command = raw.decode('utf-8', 'replace').rstrip('\r\n')
+                    verb = command[:4].upper()
+                    if verb == 'EHLO':
+                        self.wfile.write(b"250-standin\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                    elif verb == 'HELO':
+                        self.reply("250 standin")
+                    elif verb == 'AUTH':
+                        self.reply("235 Authentication successful")
+                    elif verb == 'MAIL':
+                        with server._lock:
+                            code = server.fail_codes.pop(0) if server.fail_codes else 250
+                        if code == 421:
+                            self.reply("421 Service not available, closing channel")
+                            return
+                        if code != 250:
+                            self.reply(f"{code} Stand-in failure")
+                            continue
+                        mail_from, recipients = command.partition('<')[2].partition('>')[0], []
+                        self.reply("250 OK")
+                    elif verb == 'RCPT':
+                        recipients.append(command.partition('<')[2].partition('>')[0])
+                        self.reply("250 OK")
+                    elif verb == 'DATA':
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        for data_line in self.rfile:
+                            if data_line in (b".\r\n", b".\n"):
+                                break
+                            lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                        if server.latency:
+                            time.sleep(server.latency)
+                        with server._lock:
+                            server.messages.append((mail_from, recipients, b''.join(lines).decode('utf-8', 'replace')))
+                        self.reply("250 OK: queued")
+                        delivered += 1
+                        if server.drop_after and delivered >= server.drop_after:
+                            return  # Close without QUIT, like a server ending a long session
+                    elif verb == 'RSET':
+                        mail_from, recipients = None, []
+                        self.reply("250 OK")
+                    elif verb == 'NOOP':
+                        self.reply("250 OK")
+                    elif verb == 'QUIT':
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in service")
+    sub = parser.add_subparsers(dest='service', required=True)
+    llm = sub.add_parser('llm', help="OpenAI-compatible chat-completions endpoint")
+    llm.add_argument('--port', type=int, default=8089)
+    llm.add_argument('--latency', type=float, default=0.0, help="Seconds before each response")
+    llm.add_argument('--chunk-delay', type=float, default=0.0, help="Seconds between streamed chunks")
+    llm.add_argument('--replay', metavar='FILE', help="Raw SSE body to replay for stream requests")
+    smtp = sub.add_parser('smtp', help="SMTP server that records messages")
+    smtp.add_argument('--port', type=int, default=8025)
+    smtp.add_argument('--latency', type=float, default=0.0, help="Seconds before accepting each message")
+    args = parser.parse_args(argv)
+
+    if args.service == 'llm':
+        replay = None
+        if args.replay:
+            with open(args.replay, 'rb') as f:
+                replay = f.read()
+        server = FakeLLMServer(port=args.port, latency=args.latency,
+                               sse_replay=replay, chunk_delay=args.chunk_delay)
+        print(f"LLM stand-in listening on {server.url}")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args.service == 'smtp':
+        server = FakeSMTPServer(port=args.port, latency=args.latency)
+        host, port = server.address
+        print(f"SMTP stand-in listening on {host}:{port}")
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print(f"Received {len(server.messages)} messages over {server.connections} connections")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
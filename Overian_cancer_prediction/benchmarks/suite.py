@@ -0,0 +1,329 @@
+"""Benchmark suite for the prediction and advice hot paths, with stored baselines.
+
+Run from the application directory:
+    python -m benchmarks.suite                      compare against benchmarks/baselines.json
+    python -m benchmarks.suite --json out.json      also write machine-readable results
+    python -m benchmarks.suite --update-baseline    record this run as the new baseline
+    python -m benchmarks.suite --case predict       only cases whose name contains 'predict'
+
+Cases are timed in --rounds interleaved rounds (every case once per round),
+so a slow stretch on the machine hits one round of every case rather than
+every round of one case. The gated p50 is the fastest round's; p95, p99 and
+the mean pool all rounds. Each case then runs under tracemalloc, and the
+smallest per-call allocation peak is kept, since the larger ones come from
+allocator and cache state rather than the code. A case regresses when its
+p50 exceeds the baseline by more than the time threshold, or its allocation
+peak grows by more than the allocation threshold and by at least
+--alloc-floor-kb; the run then exits with status 1. Baselines are only
+comparable on the machine that recorded them.
+
+/predict_lab runs through the Flask test client with synchronous advice, the
+advice cache off, the LLM answered by the in-process stand-in and storage on
+a throwaway SQLite file, so nothing leaves the machine.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from .standins import FakeLLMServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baselines.json')
+DEFAULT_TIME_THRESHOLD = 0.30  # p50 may be up to 30% slower than the baseline
+DEFAULT_ALLOC_THRESHOLD = 0.10  # Peak allocation may grow by up to 10%
+DEFAULT_ALLOC_FLOOR_KB = 4.0  # ... and smaller absolute growth never counts
+DEFAULT_ROUNDS = 5
+BATCH_ROWS = 64
+
+class Context:
+    """Shared fixtures, built once: model, panels, recorded completions, Flask app"""
+
+    def __init__(self, llm):
+        # The app and config read their settings at import, so the environment comes first
+        os.environ.update({
+            'TOGETHER_API_URL': llm.url,
+            'TOGETHER_API_KEY': 'standin',
+            'STORAGE_BACKEND': 'sqlite',
+            'SQLITE_PATH': os.path.join(tempfile.mkdtemp(), 'bench_suite.sqlite3'),
+            'ADVICE_ASYNC': 'false',
+            'ADVICE_CACHE_ENABLED': 'false',
+            'PREDICTION_CACHE_ENABLED': 'false',
+            'TOKEN_REAPER_ENABLED': 'false',
+            'WRITE_BEHIND_ENABLED': 'false',
+            'LLM_MAX_RETRIES': '0',
+        })
+        from utils.model_utils import FORM_TO_MODEL, find_model_path, get_default_input, load_model_file
+        from .bench_inference import load_panels
+        from .bench_parse import load_corpus
+
+        self.llm = llm
+        self.model = load_model_file(find_model_path())
+        self.panels = load_panels()
+        self.corpus = [text for _, text in load_corpus()]
+        # The form submits every field, so blanks in the CSV are sent as the form's defaults
+        model_to_form = {model: form for form, model in FORM_TO_MODEL.items()}
+        self.forms = [{model_to_form[k]: str(int(v) if k in ('Age', 'Menopause') else v)
+                       for k, v in dict(get_default_input(), **panel).items()} for panel in self.panels]
+
+        import app as app_module
+        self.app = app_module.app
+        self.client = self.app.test_client()
+
+def cycle(items):
+    """Endless round-robin over items, so every call sees the next input"""
+    state = {'i': 0}
+
+    def next_item():
+        item = items[state['i'] % len(items)]
+        state['i'] += 1
+        return item
+    return next_item
+
+def case_predict_tabular(ctx):
+    from utils.model_utils import REQUIRED_FEATURES, predict_tabular
+    panel = cycle(ctx.panels)
+    return lambda: predict_tabular(ctx.model, REQUIRED_FEATURES, panel())
+
+def case_predict_tabular_fast(ctx):
+    from utils.model_utils import REQUIRED_FEATURES, predict_tabular_fast
+    panel = cycle(ctx.panels)
+    return lambda: predict_tabular_fast(ctx.model, REQUIRED_FEATURES, panel())
+
+def case_predict_tabular_batch(ctx):
+    from utils.model_utils import REQUIRED_FEATURES, predict_tabular_batch
+    batches = [ctx.panels[i:i + BATCH_ROWS] for i in range(0, len(ctx.panels) - BATCH_ROWS + 1, BATCH_ROWS)]
+    batch = cycle(batches)
+    return lambda: predict_tabular_batch(ctx.model, REQUIRED_FEATURES, batch())
+
+def case_predict_lab(ctx):
+    form = cycle(ctx.forms)
+
+    def request():
+        response = ctx.client.post('/predict_lab', data=form())
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict_lab returned {response.status_code}")
+
+    # Fallback advice would hide a broken LLM path and time the wrong thing
+    answered = ctx.llm.requests
+    request()
+    if ctx.llm.requests == answered:
+        raise RuntimeError("/predict_lab did not call the LLM stand-in")
+    return request
+
+def case_parse_response(ctx):
+    from utils.llm_utils import parse_response
+    text = cycle(ctx.corpus)
+    return lambda: parse_response(text())
+
+def case_default_advice(ctx):
+    from utils.llm_utils import get_personalized_default_advice
+    # Every risk level, both sides of each age threshold and menopause status
+    inputs = cycle([(risk, age, post) for risk in ('low', 'medium', 'high')
+                    for age in (35, 55, 68) for post in (False, True)])
+    markers = {'CA125': 35.0, 'HE4': 40.0, 'CA19_9': 15.0}
+    return lambda: get_personalized_default_advice(*inputs(), markers)
+
+def case_render_result(ctx):
+    from flask import render_template
+    from utils.llm_utils import get_personalized_default_advice
+
+    advice = get_personalized_default_advice('high', 62, True, {})
+    context = ctx.app.test_request_context('/predict_lab', method='POST')
+    context.push()
+    return lambda: render_template(
+        'result.html', risk_level='HIGH', risk_color='text-red-500', probability='72.4%',
+        advice=advice, advice_job_id=None, risk_details=['Family history: +10%'],
+        input_data=ctx.panels[0], now=datetime.now())
+
+# (name, factory(ctx) -> zero-argument callable); the order is the report order
+CASES = [
+    ('predict_tabular', case_predict_tabular),
+    ('predict_tabular_fast', case_predict_tabular_fast),
+    (f'predict_tabular_batch_{BATCH_ROWS}', case_predict_tabular_batch),
+    ('predict_lab', case_predict_lab),
+    ('parse_response', case_parse_response),
+    ('get_personalized_default_advice', case_default_advice),
+    ('render_result_html', case_render_result),
+]
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def time_round(fn, min_time, min_iterations, max_iterations):
+    """Call fn in a loop for at least min_time seconds; returns the sorted timings in ns"""
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_iterations and (len(timings) < min_iterations or time.perf_counter() < deadline):
+        start = time.perf_counter_ns()
+        fn()
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return timings
+
+def min_alloc_peak(fn, iterations):
+    """Smallest per-call tracemalloc peak over iterations calls, in bytes"""
+    # Separate pass: tracemalloc slows every allocation, so it never overlaps the timing rounds
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return min(peaks)
+
+def measure(fns, rounds, min_time, min_iterations, max_iterations, alloc_iterations):
+    """Time each fn over interleaved rounds, then trace its allocations; returns {name: stats}"""
+    for fn in fns.values():
+        for _ in range(min(20, min_iterations)):
+            fn()  # Warm caches and lazy imports
+    gc.collect()
+
+    timings = {name: [] for name in fns}
+    for _ in range(rounds):
+        for name, fn in fns.items():
+            timings[name].append(time_round(fn, min_time / rounds, min_iterations, max_iterations))
+
+    results = {}
+    for name, fn in fns.items():
+        pooled = sorted(t for round_timings in timings[name] for t in round_timings)
+        results[name] = {
+            'iterations': len(pooled),
+            'p50_us': round(min(percentile(t, 50) for t in timings[name]) / 1000.0, 2),
+            'p95_us': round(percentile(pooled, 95) / 1000.0, 2),
+            'p99_us': round(percentile(pooled, 99) / 1000.0, 2),
+            'mean_us': round(sum(pooled) / len(pooled) / 1000.0, 2),
+            'alloc_peak_kb': round(min_alloc_peak(fn, alloc_iterations) / 1024.0, 2),
+        }
+    return results
+
+def compare(results, baseline, time_threshold, alloc_threshold, alloc_floor_kb):
+    """Annotate results with their change against the baseline; returns the regressions"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get('cases', {}).get(name)
+        if not base:
+            continue
+        stats['p50_change'] = round(stats['p50_us'] / base['p50_us'] - 1, 4)
+        stats['alloc_change'] = round(stats['alloc_peak_kb'] / base['alloc_peak_kb'] - 1, 4) if base['alloc_peak_kb'] else 0.0
+        if stats['p50_change'] > time_threshold:
+            regressions.append(f"{name}: p50 {stats['p50_us']:.1f}us vs {base['p50_us']:.1f}us "
+                               f"(+{stats['p50_change']:.0%}, threshold +{time_threshold:.0%})")
+        if stats['alloc_change'] > alloc_threshold and stats['alloc_peak_kb'] - base['alloc_peak_kb'] >= alloc_floor_kb:
+            regressions.append(f"{name}: alloc peak {stats['alloc_peak_kb']:.1f}KB vs {base['alloc_peak_kb']:.1f}KB "
+                               f"(+{stats['alloc_change']:.0%}, threshold +{alloc_threshold:.0%} and {alloc_floor_kb:g}KB)")
+    return regressions
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--case', action='append', help="Run only cases whose name contains this (repeatable)")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help="Interleaved timing rounds; p50 is the fastest round's")
+    parser.add_argument('--min-time', type=float, default=1.0, help="Seconds to time each case for, split across the rounds")
+    parser.add_argument('--min-iterations', type=int, default=20, help="Calls per case per round")
+    parser.add_argument('--max-iterations', type=int, default=4000, help="Calls per case per round")
+    parser.add_argument('--alloc-iterations', type=int, default=20, help="Calls traced for allocations")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--time-threshold', type=float, help="Allowed p50 slowdown as a fraction (default: baseline's, else 0.30)")
+    parser.add_argument('--alloc-threshold', type=float, help="Allowed allocation growth as a fraction (default: baseline's, else 0.10)")
+    parser.add_argument('--alloc-floor-kb', type=float, help="Allocation growth below this is noise (default: baseline's, else 4)")
+    parser.add_argument('--json', help="Write results to this file ('-' for stdout)")
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the baseline instead of comparing")
+    args = parser.parse_args(argv)
+
+    # Request and model logging would dominate the short cases
+    logging.disable(logging.CRITICAL)
+    selected = [(name, factory) for name, factory in CASES
+                if not args.case or any(pattern in name for pattern in args.case)]
+    if not selected:
+        parser.error(f"no case matches {args.case}; cases: {', '.join(name for name, _ in CASES)}")
+
+    llm = FakeLLMServer().start()
+    try:
+        ctx = Context(llm)
+        fns = {name: factory(ctx) for name, factory in selected}
+        results = measure(fns, args.rounds, args.min_time, args.min_iterations,
+                          args.max_iterations, args.alloc_iterations)
+    finally:
+        llm.stop()
+
+    baseline = load_baseline(args.baseline)
+    thresholds = baseline.get('thresholds', {})
+    time_threshold = args.time_threshold if args.time_threshold is not None else thresholds.get('p50', DEFAULT_TIME_THRESHOLD)
+    alloc_threshold = args.alloc_threshold if args.alloc_threshold is not None else thresholds.get('alloc_peak', DEFAULT_ALLOC_THRESHOLD)
+    alloc_floor_kb = args.alloc_floor_kb if args.alloc_floor_kb is not None else thresholds.get('alloc_floor_kb', DEFAULT_ALLOC_FLOOR_KB)
+    regressions = [] if args.update_baseline else compare(results, baseline, time_threshold, alloc_threshold, alloc_floor_kb)
+
+    print(f"{'case':<34}{'iters':>7}{'p50 us':>11}{'p95 us':>11}{'p99 us':>11}{'alloc KB':>10}{'vs base':>9}")
+    for name, stats in results.items():
+        change = f"{stats['p50_change']:+.0%}" if 'p50_change' in stats else '-'
+        print(f"{name:<34}{stats['iterations']:>7}{stats['p50_us']:>11.1f}{stats['p95_us']:>11.1f}"
+              f"{stats['p99_us']:>11.1f}{stats['alloc_peak_kb']:>10.1f}{change:>9}")
+
+    report = {
+        'environment': environment(),
+        'thresholds': {'p50': time_threshold, 'alloc_peak': alloc_threshold, 'alloc_floor_kb': alloc_floor_kb},
+        'cases': results,
+        'regressions': regressions,
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        # Merge, so re-baselining a subset of cases keeps the others
+        cases = dict(baseline.get('cases', {}), **{name: {k: v for k, v in stats.items() if not k.endswith('_change')}
+                                                       for name, stats in results.items()})
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': report['environment'], 'thresholds': report['thresholds'],
+                       'cases': cases}, f, indent=2)
+            f.write('\n')
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print("FAIL" if regressions else "OK: no regressions")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,9 +8,31 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
+# Storage backend for users and verification codes
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase')  # 'supabase' or 'sqlite' (local, offline)
+SQLITE_PATH = os.getenv('SQLITE_PATH')  # Defaults to database/local.sqlite3
+STORAGE_POOL_SIZE = int(os.getenv('STORAGE_POOL_SIZE', '8'))  # Pooled SQLite connections
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'True').lower() == 'true'  # Buffer last_login and similar writes
+WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', '5'))  # Seconds between bulk flushes
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '500'))  # Buffered rows that trigger an early flush
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv('WRITE_BEHIND_MAX_ATTEMPTS', '3'))  # Failed writes of one row before it is dropped
+TOKEN_REAPER_ENABLED = os.getenv('TOKEN_REAPER_ENABLED', 'True').lower() == 'true'  # Prune used/expired codes in-process
+TOKEN_REAPER_INTERVAL = float(os.getenv('TOKEN_REAPER_INTERVAL', '600'))  # Seconds between pruning runs
+TOKEN_REAPER_BATCH_SIZE = int(os.getenv('TOKEN_REAPER_BATCH_SIZE', '1000'))  # Rows deleted per transaction
+TOKEN_REAPER_PAUSE = float(os.getenv('TOKEN_REAPER_PAUSE', '0.05'))  # Seconds between batches
+
 # Email configuration
 EMAIL_ADDRESS = os.getenv('EMAIL_ADDRESS')
 EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'True').lower() == 'true'  # Disable for local stand-ins
+EMAIL_ASYNC = os.getenv('EMAIL_ASYNC', 'True').lower() == 'true'  # Send from a background dispatcher
+EMAIL_QUEUE_SIZE = int(os.getenv('EMAIL_QUEUE_SIZE', '256'))  # Messages waiting before signups are refused
+EMAIL_MAX_RETRIES = int(os.getenv('EMAIL_MAX_RETRIES', '3'))  # Retries per message on SMTP failures
+EMAIL_BACKOFF_BASE = float(os.getenv('EMAIL_BACKOFF_BASE', '1'))  # Seconds, doubled per retry, fully jittered
+EMAIL_IDLE_TIMEOUT = float(os.getenv('EMAIL_IDLE_TIMEOUT', '60'))  # Seconds before an idle SMTP session is closed
+EMAIL_STATUS_TTL = float(os.getenv('EMAIL_STATUS_TTL', '3600'))  # Seconds delivery status stays queryable
 
 # Email templates
 EMAIL_TEMPLATES = {
@@ -33,6 +55,83 @@ EMAIL_TEMPLATES = {
 HUGGINGFACE_API_KEY = os.getenv('HUGGINGFACE_API_KEY')  # Your provided token
 MODEL_ID = os.getenv('MODEL_ID')  # Updated model
 
+# Model serving configuration
+MODEL_DIR = os.getenv('MODEL_DIR')  # Defaults to the bundled models/ directory
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'xgboost')  # 'xgboost' (.pkl) or 'numpy' (compiled .npz)
+MODEL_PRELOAD = os.getenv('MODEL_PRELOAD', 'False').lower() == 'true'  # Load at startup instead of on the first prediction
+MODEL_CHECK_INTERVAL = float(os.getenv('MODEL_CHECK_INTERVAL', '5'))  # Seconds between artifact change checks
+MODEL_SHA256 = os.getenv('MODEL_SHA256')  # Expected artifact digest; defaults to the one its metadata records
+BATCH_MAX_ROWS = int(os.getenv('BATCH_MAX_ROWS', '5000'))  # Upper bound on panels per batch request
+INFERENCE_BATCHING = os.getenv('INFERENCE_BATCHING', 'False').lower() == 'true'  # Coalesce concurrent /predict_lab rows
+INFERENCE_BATCH_MAX_ROWS = int(os.getenv('INFERENCE_BATCH_MAX_ROWS', '64'))  # Rows that flush a batch early
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv('INFERENCE_BATCH_WINDOW_MS', '2'))  # Longest a row waits for others
+INFERENCE_BATCH_TIMEOUT = float(os.getenv('INFERENCE_BATCH_TIMEOUT', '5'))  # Seconds before a row is scored inline instead
+PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'True').lower() == 'true'  # Memoize /predict_lab model outputs
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '10000'))  # Distinct feature vectors kept
+PREDICTION_CACHE_MAX_BYTES = int(os.getenv('PREDICTION_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))  # Approximate memory bound
+DATASET_CACHE_DIR = os.getenv('DATASET_CACHE_DIR')  # Columnar CSV cache; defaults to database/.cache
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # Required by admin endpoints; unset disables them
+
+# LLM backend (Together chat-completions API or any OpenAI-compatible stand-in)
+TOGETHER_API_URL = os.getenv('TOGETHER_API_URL', 'https://api.together.xyz/v1/chat/completions')
+TOGETHER_API_KEY = os.getenv('TOGETHER_API_KEY')  # Required for LLM advice; unset serves the default advice
+TOGETHER_MODEL = os.getenv('TOGETHER_MODEL', 'meta-llama/Llama-3.3-70B-Instruct-Turbo')
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))  # Seconds to establish a connection
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '45'))  # Seconds to wait between response bytes
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))  # Retries on connection errors, 429 and 5xx
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))  # Seconds, doubled per retry, fully jittered
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+LLM_STREAM = os.getenv('LLM_STREAM', 'True').lower() == 'true'  # Stream completions and emit sections as they finish
+
+# Health advice configuration
+ADVICE_ASYNC = os.getenv('ADVICE_ASYNC', 'True').lower() == 'true'  # Render results first, poll for advice
+ADVICE_WORKERS = int(os.getenv('ADVICE_WORKERS', '4'))  # Concurrent LLM calls per process
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', str(ADVICE_WORKERS)))  # Keep-alive connections to the LLM host
+ADVICE_MAX_PENDING = int(os.getenv('ADVICE_MAX_PENDING', '64'))  # Queued + running jobs before inline fallback
+ADVICE_TIMEOUT = float(os.getenv('ADVICE_TIMEOUT', '60'))  # Seconds before a job resolves to fallback advice
+ADVICE_RESULT_TTL = float(os.getenv('ADVICE_RESULT_TTL', '600'))  # Seconds finished jobs stay pollable
+
+# LLM advice cache (keyed on risk level, age band, menopause and marker bands)
+ADVICE_CACHE_ENABLED = os.getenv('ADVICE_CACHE_ENABLED', 'True').lower() == 'true'
+ADVICE_CACHE_MAX_ENTRIES = int(os.getenv('ADVICE_CACHE_MAX_ENTRIES', '2048'))
+ADVICE_CACHE_MAX_BYTES = int(os.getenv('ADVICE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+ADVICE_CACHE_TTL = float(os.getenv('ADVICE_CACHE_TTL', str(24 * 3600)))  # Seconds
+ADVICE_CACHE_PATH = os.getenv('ADVICE_CACHE_PATH')  # Optional JSON file persisted across restarts
+ADVICE_CACHE_WAIT_TIMEOUT = float(os.getenv('ADVICE_CACHE_WAIT_TIMEOUT', '60'))  # Seconds to wait on a coalesced call
+
+# Password hashing (bcrypt runs on a bounded pool, off the request threads)
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))  # Work factor; stored hashes at another cost are upgraded on login
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))  # Cores bcrypt may occupy
+BCRYPT_EXECUTOR = os.getenv('BCRYPT_EXECUTOR', 'thread')  # 'thread' (bcrypt releases the GIL) or 'process'
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', '32'))  # Queued + running hashes before requests are refused
+BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', '10'))  # Seconds a request waits for a hash before giving up
+
+# Metrics (Prometheus text format on /metrics)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'  # Record timings and serve /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # If set, /metrics requires 'Authorization: Bearer <token>'
+
+# Request tracing (span trees appended to a rotating JSONL file)
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'True').lower() == 'true'
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))  # Share of requests traced
+TRACE_HEADER = os.getenv('TRACE_HEADER', 'X-Trace')  # A request with this header set to 1 is always traced
+TRACE_PATH = os.getenv('TRACE_PATH')  # Defaults to logs/traces.jsonl
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', str(10 * 1024 * 1024)))  # Rotate the file beyond this size
+TRACE_BACKUPS = int(os.getenv('TRACE_BACKUPS', '5'))  # Rotated files kept
+TRACE_QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', '1024'))  # Traces waiting for the writer before drops
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '256'))  # Spans kept per trace
+
+# Request profiling (sampled stacks written as collapsed-stack files)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True').lower() == 'true'  # Allow the header or sample rate to profile
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))  # Share of requests profiled without the header
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')  # A request carrying the profile token here is profiled
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')  # Defaults to ADMIN_TOKEN
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))  # Time between stack samples
+PROFILE_MAX_OVERHEAD = float(os.getenv('PROFILE_MAX_OVERHEAD', '0.05'))  # Sampler CPU as a share of wall time
+PROFILE_MAX_CONCURRENT = int(os.getenv('PROFILE_MAX_CONCURRENT', '2'))  # Requests profiled at once
+PROFILE_MAX_SAMPLES = int(os.getenv('PROFILE_MAX_SAMPLES', '2000'))  # Samples kept per request
+PROFILE_DIR = os.getenv('PROFILE_DIR')  # Defaults to logs/profiles
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))  # Newest profile files retained
+
 # App configuration
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 SECRET_KEY = os.getenv('SECRET_KEY', os.urandom(24))
@@ -27,9 +27,18 @@ CREATE TABLE email_verification (
 
 -- Add indexes for better query performance
 CREATE INDEX idx_users_email ON users(email);
-CREATE INDEX idx_verification_token ON email_verification(token);
 CREATE INDEX idx_verification_user ON email_verification(user_id);
 
+-- verify_user looks up an unused code by (user_id, token) and checks expiry in the same
+-- query; only unused rows are ever searched, so the index leaves used ones out.
+-- Replaces idx_verification_token: on existing databases, DROP INDEX IF EXISTS idx_verification_token;
+CREATE INDEX idx_verification_lookup ON email_verification(user_id, token, expires_at)
+    WHERE used = FALSE;
+
+-- The token reaper deletes expired rows and used rows in batches
+CREATE INDEX idx_verification_expires ON email_verification(expires_at);
+CREATE INDEX idx_verification_used ON email_verification(id) WHERE used = TRUE;
+
 -- Enable Row Level Security
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE email_verification ENABLE ROW LEVEL SECURITY;
@@ -54,3 +63,41 @@ CREATE TRIGGER update_users_updated_at
     BEFORE UPDATE ON users
     FOR EACH ROW
     EXECUTE PROCEDURE update_updated_at_column();
+
+-- Delete up to batch_size used or expired verification codes; returns the number deleted.
+-- Called by the token reaper (utils/token_reaper.py) until it returns less than batch_size.
+-- Every app worker runs a reaper; the advisory lock lets one of them prune at a time and the
+-- others return 0 and skip the round. It is released when the call's transaction ends.
+CREATE OR REPLACE FUNCTION prune_email_verification(batch_size INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    deleted INTEGER;
+    deleted_used INTEGER;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('prune_email_verification')) THEN
+        RETURN 0;
+    END IF;
+
+    -- Two deletes, each driven by its own index (idx_verification_expires, idx_verification_used);
+    -- one OR over both columns would usually be answered with a sequential scan
+    DELETE FROM email_verification
+    WHERE id IN (
+        SELECT id FROM email_verification
+        WHERE expires_at <= TIMEZONE('utc', NOW())
+        LIMIT batch_size
+    );
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+
+    IF deleted < batch_size THEN
+        DELETE FROM email_verification
+        WHERE id IN (
+            SELECT id FROM email_verification
+            WHERE used = TRUE
+            LIMIT batch_size - deleted
+        );
+        GET DIAGNOSTICS deleted_used = ROW_COUNT;
+        deleted := deleted + deleted_used;
+    END IF;
+    RETURN deleted;
+END;
+$$ language 'plpgsql';
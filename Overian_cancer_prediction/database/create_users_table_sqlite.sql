@@ -0,0 +1,52 @@
+-- SQLite version of create_users_table.sql for the local storage backend.
+-- UUIDs are generated by the application; timestamps are ISO-8601 UTC text;
+-- booleans are 0/1. Row Level Security has no SQLite equivalent.
+
+PRAGMA foreign_keys = ON;
+
+-- Create users table
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    full_name VARCHAR(255) NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    email_verified BOOLEAN DEFAULT 0,
+    terms_accepted BOOLEAN DEFAULT 0,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    last_login TEXT,
+    active BOOLEAN DEFAULT 1
+);
+
+-- Create email verification tokens table
+CREATE TABLE IF NOT EXISTS email_verification (
+    id TEXT PRIMARY KEY,
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    token VARCHAR(6) NOT NULL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    expires_at TEXT NOT NULL,
+    used BOOLEAN DEFAULT 0
+);
+
+-- Add indexes for better query performance
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_verification_user ON email_verification(user_id);
+
+-- verify_user looks up an unused code by (user_id, token) and checks expiry in the same
+-- query; only unused rows are ever searched, so the index leaves used ones out
+CREATE INDEX IF NOT EXISTS idx_verification_lookup ON email_verification(user_id, token, expires_at)
+    WHERE used = 0;
+
+-- The token reaper deletes expired rows and used rows in batches
+CREATE INDEX IF NOT EXISTS idx_verification_expires ON email_verification(expires_at);
+CREATE INDEX IF NOT EXISTS idx_verification_used ON email_verification(id) WHERE used = 1;
+DROP INDEX IF EXISTS idx_verification_token;
+
+-- Trigger for updating updated_at timestamp
+CREATE TRIGGER IF NOT EXISTS update_users_updated_at
+    AFTER UPDATE ON users
+    FOR EACH ROW
+    WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE users SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE id = NEW.id;
+END;
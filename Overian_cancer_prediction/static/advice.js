@@ -0,0 +1,55 @@
+// Fill in the advice sections that result.html renders as placeholders
+// while the LLM advice job is still running.
+function pollAdvice(root) {
+    const container = (root || document).querySelector('[data-advice-job]');
+    if (!container) {
+        return;
+    }
+
+    const jobId = container.dataset.adviceJob;
+    const interval = 1000;
+    const maxAttempts = 120;
+    let attempts = 0;
+
+    function fill(advice) {
+        container.querySelectorAll('[data-advice-section]').forEach(section => {
+            const html = advice[section.dataset.adviceSection];
+            if (html) {
+                section.innerHTML = html;
+            }
+        });
+    }
+
+    function poll() {
+        fetch(`/api/advice/${jobId}`, { cache: 'no-store' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(job => {
+                if (job.advice) {
+                    fill(job.advice);
+                }
+                if (job.fallback) {
+                    const note = container.querySelector('[data-advice-fallback]');
+                    if (note) {
+                        note.classList.remove('hidden');
+                    }
+                }
+                if (job.status !== 'done' && ++attempts < maxAttempts) {
+                    setTimeout(poll, interval);
+                }
+            })
+            .catch(() => {
+                if (++attempts < maxAttempts) {
+                    setTimeout(poll, interval * 2);
+                }
+            });
+    }
+
+    poll();
+}
+
+document.addEventListener('DOMContentLoaded', () => pollAdvice(document));
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# config reads the environment once at import, so this runs before any app module loads.
+# Local storage, no background reaper, an LLM endpoint that refuses connections and a known admin token.
+os.environ.update({
+    'ADMIN_TOKEN': 'test-admin-token',
+    'STORAGE_BACKEND': 'sqlite',
+    'SQLITE_PATH': os.path.join(tempfile.mkdtemp(prefix='ovarian-tests-'), 'tests.sqlite3'),
+    'TOKEN_REAPER_ENABLED': 'false',
+    'TOGETHER_API_URL': 'http://127.0.0.1:9/v1/chat/completions',
+    'TOGETHER_API_KEY': 'test',
+    'LLM_MAX_RETRIES': '0',
+    'ADVICE_CACHE_ENABLED': 'false',
+})
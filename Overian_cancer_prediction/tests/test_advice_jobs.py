@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from utils import advice_jobs, llm_utils
+from utils.advice_jobs import ADVICE_JOB_SECONDS, AdviceJobQueue
+from utils.llm_utils import ADVICE_FALLBACKS
+from utils.model_utils import get_default_input
+
+PREDICTION = {'prediction': 1, 'probability': 0.7}
+
+def wait_for(queue, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] == 'done':
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Advice job {job_id} did not finish")
+
+def counts(reason):
+    return ADVICE_JOB_SECONDS.labels(reason).count, ADVICE_FALLBACKS.labels(reason).value
+
+@pytest.fixture
+def queue():
+    queue = AdviceJobQueue(max_workers=1)
+    yield queue
+    queue.shutdown()
+
+def test_unreachable_llm_is_reported_as_fallback(queue):
+    jobs_before, fallbacks_before = counts('llm_error')
+    job = wait_for(queue, queue.submit(get_default_input(), PREDICTION))
+
+    assert job['fallback'] is True
+    assert job['fallback_reason'] == 'llm_error'
+    assert job['advice']
+    assert counts('llm_error') == (jobs_before + 1, fallbacks_before + 1)
+
+def test_missing_api_key_is_reported_as_fallback(queue, monkeypatch):
+    monkeypatch.setattr(llm_utils, 'TOGETHER_API_KEY', None)
+    job = wait_for(queue, queue.submit(get_default_input(), PREDICTION))
+
+    assert job['fallback_reason'] == 'unconfigured'
+
+def test_failed_job_is_counted_once(queue, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(advice_jobs, 'generate_health_advice_with_reason', fail)
+    jobs_before = ADVICE_JOB_SECONDS.labels('error').count
+    fallbacks_before = ADVICE_FALLBACKS.labels('job_error').value
+    job = wait_for(queue, queue.submit(get_default_input(), PREDICTION))
+
+    assert job['fallback_reason'] == 'error'
+    assert ADVICE_JOB_SECONDS.labels('error').count == jobs_before + 1
+    assert ADVICE_FALLBACKS.labels('job_error').value == fallbacks_before + 1
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from utils.dataset_cache import build_cache, load_columns
+
+def write_csv(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def test_columns_round_trip(tmp_path):
+    source = write_csv(tmp_path / 'panel.csv', "Age,CA125,Smoker\n45,12.5,No\n61,,Yes\n")
+    arrays, manifest = load_columns(source, cache_root=str(tmp_path / 'cache'))
+
+    assert manifest['rows'] == 2
+    assert arrays['Age'].tolist() == [45, 61]
+    assert np.isnan(arrays['CA125'][1])
+    assert arrays['Smoker'].tolist() == [False, True]
+
+@pytest.mark.parametrize('bad_row', ['61,40.0', '61,40.0,Yes,extra'])
+def test_rows_with_the_wrong_field_count_are_rejected(tmp_path, bad_row):
+    source = write_csv(tmp_path / 'panel.csv', f"Age,CA125,Smoker\n45,12.5,No\n{bad_row}\n52,8.0,No\n")
+    with pytest.raises(ValueError, match='line 3: expected 3 fields'):
+        build_cache(source, str(tmp_path / 'cache'))
+    assert list((tmp_path / 'cache').iterdir()) == []  # Nothing half-built left behind
@@ -0,0 +1,52 @@
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+from benchmarks.standins import FakeSMTPServer
+from utils.email_queue import EmailDispatcher
+
+def wait_for(dispatcher, message_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = dispatcher.status(message_id)
+        if status['state'] in ('sent', 'failed'):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"Email {message_id} was not delivered or failed")
+
+@pytest.fixture
+def send():
+    servers, dispatchers = [], []
+
+    def send(fail_codes):
+        server = FakeSMTPServer(fail_codes=fail_codes).start()
+        host, port = server.address
+        dispatcher = EmailDispatcher(host=host, port=port, starttls=False, username='noreply@example.org',
+                                     password='', max_retries=2, backoff_base=0.01)
+        servers.append(server)
+        dispatchers.append(dispatcher)
+        message = MIMEText('Your code is 123456')
+        message['From'] = 'noreply@example.org'
+        message['To'] = 'patient@example.org'
+        return server, wait_for(dispatcher, dispatcher.enqueue('patient@example.org', message))
+
+    yield send
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+    for server in servers:
+        server.stop()
+
+def test_transient_reply_is_retried(send):
+    server, status = send([451])
+    assert status['state'] == 'sent'
+    assert status['attempts'] == 2
+    assert len(server.messages) == 1
+
+@pytest.mark.parametrize('code', [550, 553])
+def test_permanent_reply_fails_without_retrying(send, code):
+    server, status = send([code, code, code])
+    assert status['state'] == 'failed'
+    assert status['attempts'] == 1
+    assert str(code) in status['error']
+    assert server.messages == []
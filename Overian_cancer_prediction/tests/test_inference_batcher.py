@@ -0,0 +1,99 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.inference_batcher import InferenceBatcher
+from utils.model_utils import REQUIRED_FEATURES
+
+AGE = REQUIRED_FEATURES.index('Age')
+
+class AgeModel:
+    """Scores each row as Age / 1000 (plus an offset), so every caller can tell its own answer"""
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.batches = []
+
+    def predict_proba(self, matrix):
+        self.batches.append(len(matrix))
+        positive = matrix[:, AGE].astype(np.float64) / 1000 + self.offset
+        return np.column_stack((1 - positive, positive))
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(**kwargs):
+        batcher = InferenceBatcher(**kwargs)
+        batchers.append(batcher)
+        return batcher
+    yield make
+    for batcher in batchers:
+        batcher.stop()
+
+def predict_concurrently(batcher, calls):
+    """Run (model, input) calls from one thread each, released together; returns results in call order"""
+    results = [None] * len(calls)
+    barrier = threading.Barrier(len(calls))
+
+    def call(i, model, input_data):
+        barrier.wait()
+        results[i] = batcher.predict(model, REQUIRED_FEATURES, input_data)
+    threads = [threading.Thread(target=call, args=(i, model, input_data)) for i, (model, input_data) in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+def test_each_caller_gets_its_own_row(make_batcher):
+    model = AgeModel()
+    batcher = make_batcher(max_rows=64, window=0.05, timeout=10)
+    results = predict_concurrently(batcher, [(model, {'Age': 20 + i}) for i in range(40)])
+
+    assert [r['probability'] for r in results] == pytest.approx([(20 + i) / 1000 for i in range(40)])
+    assert all(r['prediction'] == 0 for r in results)
+    assert sum(model.batches) == 40
+    assert max(model.batches) > 1  # Concurrent rows were actually coalesced
+
+def test_full_batch_flushes_before_the_window(make_batcher):
+    model = AgeModel()
+    batcher = make_batcher(max_rows=4, window=30, timeout=10)
+    start = time.perf_counter()
+    results = predict_concurrently(batcher, [(model, {'Age': 50}) for _ in range(4)])
+
+    assert time.perf_counter() - start < 5
+    assert model.batches == [4]
+    assert all(r['probability'] == pytest.approx(0.05) for r in results)
+
+def test_lone_row_waits_out_the_window(make_batcher):
+    model = AgeModel()
+    batcher = make_batcher(max_rows=64, window=0.2, timeout=10)
+    start = time.perf_counter()
+    result = batcher.predict(model, REQUIRED_FEATURES, {'Age': 60})
+
+    assert 0.2 <= time.perf_counter() - start < 5
+    assert model.batches == [1]
+    assert result['probability'] == pytest.approx(0.06)
+
+def test_rows_for_different_models_are_scored_separately(make_batcher):
+    old, new = AgeModel(), AgeModel(offset=0.5)
+    batcher = make_batcher(max_rows=64, window=0.1, timeout=10)
+    calls = [(old if i % 2 else new, {'Age': 30 + i}) for i in range(10)]
+    results = predict_concurrently(batcher, calls)
+
+    for (model, input_data), result in zip(calls, results):
+        assert result['probability'] == pytest.approx(input_data['Age'] / 1000 + model.offset)
+    assert sum(old.batches) == sum(new.batches) == 5
+
+def test_invalid_input_and_stopped_batcher(make_batcher):
+    model = AgeModel()
+    batcher = make_batcher(max_rows=64, window=0.01, timeout=10)
+    assert batcher.predict(None, REQUIRED_FEATURES, {}) is None
+    assert batcher.predict(model, REQUIRED_FEATURES, 'not a dict') is None
+
+    batcher.stop()
+    # After stop() rows are scored inline instead of queued forever
+    assert batcher.predict(model, REQUIRED_FEATURES, {'Age': 70})['probability'] == pytest.approx(0.07)
@@ -0,0 +1,75 @@
+import pytest
+
+from benchmarks.standins import SAMPLE_COMPLETION
+from utils import llm_utils
+from utils.advice_cache import PROMPT_VERSION, AdviceCache, advice_bucket, advice_cache_key
+from utils.llm_utils import build_advice_prompt, get_cached_llm_advice
+
+class RecordingClient:
+    """Answers every completion with SAMPLE_COMPLETION and keeps the prompts it was sent"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def chat_completion(self, messages, **params):
+        self.prompts.append(messages[-1]['content'])
+        return {'choices': [{'message': {'content': SAMPLE_COMPLETION}}]}
+
+    def stream_chat_completion(self, messages, **params):
+        self.prompts.append(messages[-1]['content'])
+        for i in range(0, len(SAMPLE_COMPLETION), 40):
+            yield SAMPLE_COMPLETION[i:i + 40]
+
+# Same bucket (high risk, 50s, post-menopausal, same marker bands), different exact values
+FIRST = {'Age': 53, 'Menopause': 1, 'CA125': 97.3, 'HE4': 512.6, 'CA19-9': 41.8, 'CEA': 2.17, 'AFP': 3.91}
+SECOND = {'Age': 58, 'Menopause': 1, 'CA125': 121.4, 'HE4': 655.2, 'CA19-9': 52.3, 'CEA': 4.42, 'AFP': 7.18}
+EXACT_VALUES = ['53', '58', '97.3', '121.4', '512.6', '655.2', '41.8', '52.3', '2.17', '4.42', '3.91', '7.18',
+                '81.2', '93.4']  # The last two are the risk scores below, as percentages
+
+@pytest.fixture
+def client(monkeypatch):
+    client = RecordingClient()
+    monkeypatch.setattr(llm_utils, 'get_llm_client', lambda: client)
+    return client
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = AdviceCache()
+    monkeypatch.setattr(llm_utils, 'get_advice_cache', lambda: cache)
+    return cache
+
+def test_patients_in_one_bucket_share_a_value_free_prompt():
+    first, second = advice_bucket(FIRST, 'high'), advice_bucket(SECOND, 'high')
+    assert first == second
+
+    prompt = build_advice_prompt(first)
+    assert prompt == build_advice_prompt(second)
+    assert '50-59 years' in prompt
+    assert 'CA125: 2-5x the upper limit of normal' in prompt
+    for value in EXACT_VALUES:
+        assert value not in prompt
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_second_patient_gets_the_cached_advice_of_the_first(monkeypatch, client, cache, stream):
+    monkeypatch.setattr(llm_utils, 'LLM_STREAM', stream)
+    first = get_cached_llm_advice(FIRST, {'prediction': 1, 'probability': 0.812}, 'high')
+    second = get_cached_llm_advice(SECOND, {'prediction': 1, 'probability': 0.934}, 'high')
+
+    assert second == first
+    assert cache.stats()['hits'] == 1
+    assert len(client.prompts) == 1
+    for value in EXACT_VALUES:
+        assert value not in client.prompts[0]
+
+def test_other_buckets_are_not_shared(client, cache):
+    get_cached_llm_advice(FIRST, {'prediction': 1, 'probability': 0.812}, 'high')
+    get_cached_llm_advice(dict(FIRST, Age=61), {'prediction': 1, 'probability': 0.812}, 'high')
+    get_cached_llm_advice(dict(FIRST, CA125=20.0), {'prediction': 1, 'probability': 0.812}, 'high')
+
+    assert len(client.prompts) == 3
+    assert len(set(client.prompts)) == 3
+
+def test_keys_carry_the_prompt_version():
+    # Entries persisted from the exact-value prompt had no version and must never match
+    key = advice_cache_key(advice_bucket(FIRST, 'high'))
+    assert key[0] == PROMPT_VERSION >= 2
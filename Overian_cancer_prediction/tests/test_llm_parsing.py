@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from benchmarks.bench_parse import load_corpus, mutate, reference_parse_response
+from utils.llm_utils import ADVICE_SECTIONS, SectionStreamParser, parse_response
+
+CORPUS = load_corpus()
+FUZZ_CASES = 300
+
+def fuzzed(count, seed=1234):
+    rng = random.Random(seed)
+    return [mutate(rng.choice(CORPUS)[1], rng) for _ in range(count)]
+
+@pytest.mark.parametrize('name, text', CORPUS, ids=[name for name, _ in CORPUS])
+def test_single_pass_parser_matches_the_per_section_parser(name, text):
+    assert parse_response(text) == reference_parse_response(text)
+
+def test_single_pass_parser_matches_on_fuzzed_completions():
+    for text in fuzzed(2000, seed=99):
+        assert parse_response(text) == reference_parse_response(text), text
+
+def test_missing_sections_are_reported_as_unavailable():
+    advice = parse_response(dict(CORPUS)['04_missing_sections.txt'])
+    assert advice['diet'] == advice['warning_signs'] == "Information not available"
+    assert 'Gentle walking' in advice['exercise']
+    assert len(advice['wellness_tips'].split('<li>')) == 4  # Padded to three default tips
+
+def test_out_of_order_headings_are_found():
+    advice = parse_response(dict(CORPUS)['09_out_of_order_headings.txt'])
+    assert 'symptom diary' in advice['wellness_tips']
+    assert 'whole grains' in advice['diet']
+    assert advice['risk_factors'].startswith("<p>Your age group")
+
+def stream(text, chunk_size):
+    parser = SectionStreamParser()
+    sections = []
+    for i in range(0, len(text), chunk_size):
+        sections.extend(parser.feed(text[i:i + chunk_size]))
+    assert parser.text == text
+    assert parser.length == len(text)
+    return sections
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 23, 64, 4096])
+def test_streamed_sections_match_parse_response(chunk_size):
+    keys = [key for key, _, _ in ADVICE_SECTIONS]
+    for text in [text for _, text in CORPUS] + fuzzed(FUZZ_CASES):
+        expected = parse_response(text)
+        sections = stream(text, chunk_size)
+        # Sections arrive in order, each formatted as the full-text parse formats it
+        assert [key for key, _ in sections] == keys[:len(sections)]
+        for key, html in sections:
+            assert html == expected[key], (key, text)
+
+def test_every_section_but_the_last_streams_before_the_end():
+    name, text = CORPUS[0]
+    assert [key for key, _ in stream(text, 16)] == [key for key, _, end in ADVICE_SECTIONS if end], name
+
+def test_heading_split_across_deltas():
+    parser = SectionStreamParser()
+    assert parser.feed("Risk Factors:\n- Age over 50.\nDietary Rec") == []
+    assert parser.feed("ommendations:\n- Fiber.\n") == [('risk_factors', "<p>Age over 50.</p>")]
@@ -0,0 +1,111 @@
+import re
+
+import pytest
+
+from utils.metrics import Counter, Histogram, MetricsRegistry, get_metrics
+
+# One sample line of the text exposition format: name, optional labels, value
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+                         r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"'
+                         r'(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*")*\})?'
+                         r' (-?[0-9.e+-]+|\+Inf|-Inf|NaN)$')
+
+def assert_valid_exposition(text):
+    assert text.endswith('\n')
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue  # HELP, TYPE and plain comments
+        assert SAMPLE_LINE.match(line), line
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+def test_counter_lines_and_label_escaping(registry):
+    requests = registry.register(Counter('test_requests_total', "Requests by route", ['route']))
+    requests.labels('/predict').inc()
+    requests.labels('/predict').inc(2)
+    requests.labels('say "hi"\\\nbye').inc()
+
+    text = registry.render()
+    assert '# HELP test_requests_total Requests by route\n# TYPE test_requests_total counter\n' in text
+    assert 'test_requests_total{route="/predict"} 3\n' in text
+    assert 'test_requests_total{route="say \\"hi\\"\\\\\\nbye"} 1\n' in text
+    assert_valid_exposition(text)
+
+def test_histogram_buckets_sum_and_count(registry):
+    latency = registry.register(Histogram('test_seconds', "Latency", ['stage'], buckets=(0.1, 1.0)))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels('predict').observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'test_seconds_bucket{stage="predict",le="0.1"} 2',  # A value on a bound falls in that bucket
+        'test_seconds_bucket{stage="predict",le="1.0"} 3',
+        'test_seconds_bucket{stage="predict",le="+Inf"} 4',
+        'test_seconds_sum{stage="predict"} 3.65',
+        'test_seconds_count{stage="predict"} 4',
+    ]
+
+def test_unlabelled_histogram(registry):
+    registry.register(Histogram('test_load_seconds', "Loads", buckets=(1.0,))).observe(0.5)
+    text = registry.render()
+    assert 'test_load_seconds_bucket{le="1.0"} 1\n' in text
+    assert 'test_load_seconds_sum 0.5\ntest_load_seconds_count 1\n' in text
+
+def test_collectors_and_caches(registry):
+    registry.add_collector(lambda: [('test_queue_depth', 'gauge', "Waiting rows", [({'queue': 'a"b'}, 7)])])
+    registry.register_cache('advice', lambda: {'hits': 3, 'misses': 1, 'entries': 2, 'hit_ratio': 0.75})
+    registry.register_cache('disabled', lambda: None)
+
+    text = registry.render()
+    assert '# TYPE test_queue_depth gauge\ntest_queue_depth{queue="a\\"b"} 7\n' in text
+    assert 'ovarian_cache_hits_total{cache="advice"} 3\n' in text
+    assert 'ovarian_cache_hit_ratio{cache="advice"} 0.75\n' in text
+    assert 'disabled' not in text
+    assert_valid_exposition(text)
+
+def test_broken_collector_becomes_a_comment(registry):
+    def broken():
+        raise RuntimeError('boom\nagain')
+    registry.add_collector(broken)
+    text = registry.render()
+    assert '# collector ' in text and 'boom\\nagain' in text
+    assert_valid_exposition(text)
+
+def test_conflicting_registration(registry):
+    registry.register(Counter('test_total', "x", ['a']))
+    assert registry.register(Counter('test_total', "x", ['a'])) is not None
+    with pytest.raises(ValueError):
+        registry.register(Counter('test_total', "x", ['b']))
+    with pytest.raises(ValueError):
+        registry.register(Counter('test_total', "x", ['a'])).labels('one', 'two')
+
+@pytest.fixture
+def client(monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 'scrape-token')
+    return app_module.app.test_client()
+
+@pytest.mark.parametrize('headers', [
+    {},
+    {'Authorization': 'Bearer wrong'},
+    {'Authorization': 'scrape-token'},
+    {'Authorization': 'Bearer scrape-token '},
+    {'Authorization': 'Bearer scrapé-token'},
+])
+def test_metrics_route_rejects_bad_tokens(client, headers):
+    assert client.get('/metrics', headers=headers).status_code == 403
+
+def test_metrics_route_serves_the_exposition(client):
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    assert 'ovarian_process_start_time_seconds' in response.get_data(as_text=True)
+    # Everything the app registers renders as valid exposition lines
+    assert_valid_exposition(get_metrics().render())
+
+def test_metrics_route_is_open_without_a_token(client, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', None)
+    assert client.get('/metrics').status_code == 200
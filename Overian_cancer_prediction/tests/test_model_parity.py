@@ -0,0 +1,78 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from conftest import APP_DIR
+from utils.model_utils import (REQUIRED_FEATURES, build_feature_matrix, find_model_path, get_default_input,
+                               load_model_file, predict_tabular, predict_tabular_batch, predict_tabular_fast)
+
+DATA_PATH = os.path.join(APP_DIR, 'database', 'merged_ovarian_data.csv')
+TOLERANCE = 1e-6
+
+@pytest.fixture(scope='module')
+def model():
+    return load_model_file(find_model_path(backend='xgboost'))
+
+def numeric_or_blank(value):
+    try:
+        float(value)
+        return value
+    except ValueError:
+        return ''
+
+@pytest.fixture(scope='module')
+def records():
+    """CSV rows restricted to the model features; blank and non-numeric cells become ''"""
+    with open(DATA_PATH, newline='') as f:
+        return [{feature: numeric_or_blank(row[feature]) for feature in REQUIRED_FEATURES}
+                for row in csv.DictReader(f)]
+
+def without_blanks(record):
+    """The panel as the form posts it: blank fields left out, the rest numeric"""
+    return {k: float(v) for k, v in record.items() if v != ''}
+
+def sample_panels(records):
+    # Every third CSV row (blanks included), plus the edge cases the form can send
+    panels = [without_blanks(record) for record in records[::3]]
+    assert any(len(panel) < len(REQUIRED_FEATURES) for panel in panels)
+    return panels + [{}, {'CA125': 812.0}, {'Age': 67, 'Menopause': 1, 'HE4': 420.0}]
+
+def test_compiled_artifact_matches_xgboost(model, records):
+    compiled = load_model_file(find_model_path(backend='numpy'))
+    # Blanks as NaN exercise the missing-value branches; the served matrix fills defaults
+    with_nan = np.array([[float(r[c]) if r[c] != '' else np.nan for c in REQUIRED_FEATURES] for r in records],
+                        dtype=np.float32)
+    served = build_feature_matrix(REQUIRED_FEATURES, records)
+    for X in (with_nan, served):
+        expected = model.predict_proba(X)[:, 1]
+        actual = compiled.predict_proba(X)[:, 1]
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+        assert (compiled.predict(X) == model.predict(X)).all()
+
+def test_fast_path_matches_predict_tabular(model, records):
+    for panel in sample_panels(records):
+        expected = predict_tabular(model, REQUIRED_FEATURES, panel)
+        actual = predict_tabular_fast(model, REQUIRED_FEATURES, panel)
+        assert actual['prediction'] == expected['prediction']
+        assert actual['probability'] == pytest.approx(expected['probability'], abs=TOLERANCE)
+
+def test_batch_matches_predict_tabular(model, records):
+    panels = sample_panels(records)
+    # Blank strings are filled with defaults just like omitted fields
+    blanked = [dict({k: '' for k in REQUIRED_FEATURES}, **panel) for panel in panels]
+    expected = [predict_tabular(model, REQUIRED_FEATURES, panel) for panel in panels]
+    for batch_input in (panels, blanked):
+        result = predict_tabular_batch(model, REQUIRED_FEATURES, batch_input)
+        np.testing.assert_allclose(result['probability'], [e['probability'] for e in expected],
+                                   rtol=0, atol=TOLERANCE)
+        assert result['prediction'].tolist() == [e['prediction'] for e in expected]
+
+def test_batch_of_nothing(model):
+    result = predict_tabular_batch(model, REQUIRED_FEATURES, [])
+    assert result['probability'].shape == (0,)
+
+def test_defaults_only_panel_is_the_default_input(model):
+    assert predict_tabular_fast(model, REQUIRED_FEATURES, {}) == \
+        predict_tabular_fast(model, REQUIRED_FEATURES, get_default_input())
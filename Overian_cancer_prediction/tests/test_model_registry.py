@@ -0,0 +1,150 @@
+import json
+import os
+
+import pytest
+
+from utils import model_registry
+from utils.model_registry import ModelRegistry, file_sha256
+from utils.model_utils import REQUIRED_FEATURES
+
+class Loads:
+    """Stands in for load_model_file: returns a token per load, or raises once told to"""
+
+    def __init__(self):
+        self.paths = []
+        self.error = None
+
+    def __call__(self, path):
+        if self.error:
+            raise self.error
+        self.paths.append(path)
+        return ('model', len(self.paths))
+
+@pytest.fixture
+def loads(monkeypatch):
+    loads = Loads()
+    monkeypatch.setattr(model_registry, 'load_model_file', loads)
+    return loads
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / 'xgboost_model.pkl'
+    path.write_bytes(b'first artifact')
+    return path
+
+@pytest.fixture
+def registry(tmp_path, artifact):
+    return ModelRegistry(models_dir=str(tmp_path), check_interval=0)
+
+def rewrite(path, content):
+    """Replace the artifact with a new mtime, as a deploy would"""
+    stat = os.stat(path)
+    path.write_bytes(content)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+def test_first_load(registry, artifact, loads):
+    handle = registry.current()
+
+    assert handle.model == ('model', 1)
+    assert handle.sha256 == file_sha256(str(artifact))
+    assert handle.version == handle.sha256[:12]
+    assert handle.columns == list(REQUIRED_FEATURES)
+    assert handle.loaded_at.tzinfo is not None
+    assert registry.describe()['version'] == handle.version
+
+def test_unchanged_file_is_not_rehashed(registry, loads, monkeypatch):
+    first = registry.current()
+    hashes = []
+    monkeypatch.setattr(model_registry, 'file_sha256', lambda path: hashes.append(path) or first.sha256)
+
+    assert registry.current() is first
+    assert registry.refresh() is first
+    assert hashes == []
+    assert len(loads.paths) == 1
+
+def test_touched_file_with_the_same_content_is_kept(registry, artifact, loads):
+    first = registry.current()
+    rewrite(artifact, b'first artifact')
+
+    assert registry.current() is first
+    assert len(loads.paths) == 1
+
+def test_changed_content_swaps_the_version(registry, artifact, loads):
+    first = registry.current()
+    rewrite(artifact, b'second artifact')
+
+    second = registry.current()
+    assert second.sha256 == file_sha256(str(artifact)) != first.sha256
+    assert second.model == ('model', 2)
+    # A request that pinned the first handle keeps its model
+    assert first.model == ('model', 1)
+
+def test_forced_refresh_reloads_unchanged_file(registry, loads):
+    first = registry.current()
+    assert registry.refresh(force=True).model == ('model', 2)
+    assert first.model == ('model', 1)
+
+def test_failed_reload_keeps_the_active_version(registry, artifact, loads):
+    first = registry.current()
+    rewrite(artifact, b'corrupt artifact')
+    loads.error = ValueError("truncated pickle")
+
+    assert registry.current() is first
+    assert registry.describe()['sha256'] == first.sha256
+
+def test_missing_artifact_on_first_load(tmp_path, loads):
+    assert ModelRegistry(models_dir=str(tmp_path / 'missing')).current() is None
+
+@pytest.fixture
+def client(monkeypatch, registry, loads):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'model_registry', registry)
+    return app_module.app.test_client()
+
+@pytest.mark.parametrize('headers', [{}, {'X-Admin-Token': 'wrong'}, {'X-Admin-Token': 'tëst'}])
+def test_reload_route_rejects_bad_tokens(client, loads, headers):
+    response = client.post('/admin/reload-model', headers=headers)
+    assert response.status_code == 403
+    assert loads.paths == []
+
+def test_reload_route_reloads_with_the_admin_token(client, loads):
+    headers = {'X-Admin-Token': 'test-admin-token'}
+    first = client.post('/admin/reload-model', headers=headers).get_json()
+    assert first['loaded'] is True
+    assert client.post('/admin/reload-model', headers=headers).get_json()['version'] == first['version']
+    assert len(loads.paths) == 1
+
+    client.post('/admin/reload-model?force=1', headers=headers)
+    assert len(loads.paths) == 2
+
+def test_verify_returns_the_digest_without_loading(registry, artifact, loads):
+    assert registry.verify() == file_sha256(str(artifact))
+    assert loads.paths == []
+
+def test_verify_rejects_a_missing_or_empty_artifact(tmp_path, artifact):
+    artifact.write_bytes(b'')
+    with pytest.raises(ValueError, match='is empty'):
+        ModelRegistry(models_dir=str(tmp_path)).verify()
+    with pytest.raises(FileNotFoundError):
+        ModelRegistry(models_dir=str(tmp_path / 'missing')).verify()
+
+def test_verify_checks_the_pinned_digest(registry, artifact, monkeypatch):
+    monkeypatch.setattr(model_registry, 'MODEL_SHA256', '0' * 64)
+    with pytest.raises(ValueError, match='expected 0000'):
+        registry.verify()
+    monkeypatch.setattr(model_registry, 'MODEL_SHA256', file_sha256(str(artifact)).upper())
+    registry.verify()
+
+def test_digest_recorded_in_metadata_is_enforced(registry, tmp_path, artifact, loads):
+    metadata = tmp_path / 'xgboost_model.json'
+    metadata.write_text(json.dumps({'features': list(REQUIRED_FEATURES),
+                                    'artifacts': {artifact.name: file_sha256(str(artifact))}}))
+    first = registry.current()
+    assert registry.verify() == first.sha256
+
+    # The file changes but the metadata still describes the old one: keep serving the old version
+    rewrite(artifact, b'truncated')
+    with pytest.raises(ValueError, match='expected'):
+        registry.verify()
+    assert registry.current() is first
+    assert len(loads.paths) == 1
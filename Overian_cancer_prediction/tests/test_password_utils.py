@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+from utils.password_utils import PasswordHasher, PasswordHasherBusy
+
+def test_hash_and_check_round_trip():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    try:
+        password_hash = hasher.hash('correct horse')
+        assert hasher.check('correct horse', password_hash)
+        assert not hasher.check('wrong', password_hash)
+        assert not hasher.needs_rehash(password_hash)
+    finally:
+        hasher.shutdown(wait=True)
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=0, timeout=0.05)
+    release = threading.Event()
+    try:
+        with pytest.raises(FutureTimeout):
+            hasher._run('hash', release.wait, 5)
+        # The stalled hash is still running, so the only slot is still taken
+        with pytest.raises(PasswordHasherBusy):
+            hasher._run('hash', release.wait, 5)
+
+        release.set()
+        hasher._executor.submit(lambda: None).result(timeout=5)  # Runs after the stalled job
+        assert hasher.check('pw', hasher.hash('pw'))
+    finally:
+        release.set()
+        hasher.shutdown(wait=True)
+
+def test_queued_hash_is_cancelled_when_its_caller_gives_up():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+    ran = []
+    try:
+        with pytest.raises(FutureTimeout):
+            hasher._run('hash', release.wait, 5)
+        with pytest.raises(FutureTimeout):
+            hasher._run('hash', ran.append, 'queued')
+        # Cancelling the queued job gave its slot back while the first still runs
+        with pytest.raises(FutureTimeout):
+            hasher._run('hash', ran.append, 'queued again')
+        release.set()
+        hasher.shutdown(wait=True)
+        assert ran == []
+    finally:
+        release.set()
+        hasher.shutdown(wait=True)
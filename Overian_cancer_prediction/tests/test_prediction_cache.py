@@ -0,0 +1,114 @@
+import math
+import os
+
+import pytest
+
+from utils import model_registry, prediction_cache
+from utils.model_registry import ModelRegistry
+from utils.model_utils import REQUIRED_FEATURES
+from utils.prediction_cache import PredictionCache, predict_with_cache, prediction_cache_key
+
+COLUMNS = list(REQUIRED_FEATURES)
+
+def key(version, **input_data):
+    return prediction_cache_key(COLUMNS, input_data, version)
+
+def result(probability):
+    return {'prediction': int(probability >= 0.5), 'probability': probability}
+
+@pytest.fixture
+def cache():
+    return PredictionCache(max_entries=100, max_bytes=1 << 20)
+
+def test_hit_miss_and_equivalent_rows(cache):
+    assert cache.get(key('v1', Age=50)) is None
+    cache.set(key('v1', Age=50), result(0.2))
+
+    assert cache.get(key('v1', Age=50.0)) == result(0.2)
+    assert key('v1', CA125=-0.0) == key('v1', CA125=0.0)
+    assert key('v1', CA125=math.nan) == key('v1', CA125=float('nan'))
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_lru_eviction(cache):
+    cache.max_entries = 2
+    for age in (40, 50, 60):
+        cache.set(key('v1', Age=age), result(age / 100))
+    assert cache.get(key('v1', Age=40)) is None
+    assert cache.stats()['evictions'] == 1
+
+def test_version_change_empties_the_cache(cache):
+    cache.set(key('v1', Age=50), result(0.2))
+    cache.invalidate('v2')
+
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['invalidations'] == 1
+    assert cache.get(key('v1', Age=50)) is None
+
+def test_straggling_old_version_write_is_ignored(cache):
+    cache.invalidate('v1')
+    cache.invalidate('v2')
+    cache.set(key('v2', Age=50), result(0.7))
+    # A request that pinned v1 before the swap finishes afterwards
+    cache.set(key('v1', Age=50), result(0.2))
+
+    assert cache.get(key('v2', Age=50)) == result(0.7)
+    assert cache.get(key('v1', Age=50)) is None
+    assert cache.stats()['entries'] == 1
+
+def test_rollback_to_an_earlier_version_caches_again(cache):
+    cache.invalidate('v1')
+    cache.invalidate('v2')
+    cache.invalidate('v1')
+    cache.set(key('v1', Age=50), result(0.2))
+    assert cache.get(key('v1', Age=50)) == result(0.2)
+
+def test_same_version_keeps_entries(cache):
+    cache.set(key('v1', Age=50), result(0.2))
+    cache.invalidate('v1')  # A forced reload of an unchanged artifact
+    assert cache.get(key('v1', Age=50)) == result(0.2)
+
+def test_registry_swap_clears_the_cache(tmp_path, cache, monkeypatch):
+    monkeypatch.setattr(model_registry, 'load_model_file', lambda path: object())
+    artifact = tmp_path / 'xgboost_model.pkl'
+    artifact.write_bytes(b'first artifact')
+    registry = ModelRegistry(models_dir=str(tmp_path), check_interval=0)
+    registry.add_listener(lambda handle: cache.invalidate(handle.version))
+    registry.add_listener(lambda handle: 1 / 0)  # A failing listener neither blocks others nor the swap
+
+    first = registry.current()
+    cache.set(key(first.version, Age=50), result(0.2))
+
+    stat = os.stat(artifact)
+    artifact.write_bytes(b'second artifact')
+    os.utime(artifact, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = registry.current()
+
+    assert second.version != first.version
+    assert cache.stats()['entries'] == 0
+    cache.set(key(first.version, Age=50), result(0.2))
+    assert cache.stats()['entries'] == 0
+
+class Handle:
+    """ModelVersion stand-in carrying just what predict_with_cache reads"""
+
+    def __init__(self, version):
+        self.version = version
+        self.model = object()
+        self.columns = COLUMNS
+
+def test_predict_with_cache_calls_the_model_once_per_row(cache, monkeypatch):
+    monkeypatch.setattr(prediction_cache, 'get_prediction_cache', lambda: cache)
+    calls = []
+
+    def predict(model, columns, input_data):
+        calls.append(input_data)
+        return result(input_data['Age'] / 100)
+
+    v1, v2 = Handle('v1'), Handle('v2')
+    assert predict_with_cache(v1, {'Age': 30}, predict) == result(0.3)
+    assert predict_with_cache(v1, {'Age': 30}, predict) == result(0.3)
+    assert len(calls) == 1
+
+    cache.invalidate('v2')
+    assert predict_with_cache(v2, {'Age': 30}, predict) == result(0.3)
+    assert len(calls) == 2
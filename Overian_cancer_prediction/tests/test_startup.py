@@ -0,0 +1,12 @@
+import os
+import subprocess
+import sys
+
+from conftest import APP_DIR
+
+def test_default_config_starts_within_budget():
+    # The shipped model settings, not whatever the calling shell exported
+    env = {key: value for key, value in os.environ.items() if key not in ('MODEL_PRELOAD', 'MODEL_BACKEND')}
+    result = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--runs', '3', '--top', '5'],
+                            cwd=APP_DIR, env=env, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
@@ -0,0 +1,72 @@
+import logging
+from datetime import datetime, timezone
+
+import pytest
+from postgrest.exceptions import APIError
+
+from utils.supabase_storage import SupabaseStorage
+
+class _Query:
+    def __init__(self, client, call):
+        self.client = client
+        self.call = call
+
+    def __getattr__(self, name):
+        def chain(*args):
+            self.call.append((name,) + args)
+            return self
+        return chain
+
+    def execute(self):
+        self.client.calls.append(tuple(self.call))
+        return self.client.respond(self.call)
+
+class FakeClient:
+    """Records PostgREST calls; the prune function answers with rpc_error when set"""
+
+    def __init__(self, rpc_error=None):
+        self.rpc_error = rpc_error
+        self.calls = []
+
+    def rpc(self, name, params):
+        return _Query(self, [('rpc', name, params)])
+
+    def table(self, name):
+        return _Query(self, [('table', name)])
+
+    def respond(self, call):
+        if call[0][0] == 'rpc':
+            if self.rpc_error:
+                raise APIError(self.rpc_error)
+            return type('Result', (), {'data': 3})
+        return type('Result', (), {'data': [{'id': 1}, {'id': 2}]})
+
+def storage_with(client):
+    storage = SupabaseStorage.__new__(SupabaseStorage)
+    storage.client = client
+    storage._has_prune_rpc = True
+    return storage
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def test_prunes_through_the_function_when_installed():
+    client = FakeClient()
+    assert storage_with(client).prune_verification_tokens(NOW, 500) == 3
+    assert client.calls == [(('rpc', 'prune_email_verification', {'batch_size': 500}),)]
+
+def test_missing_function_warns_once_and_falls_back_to_deletes(caplog):
+    client = FakeClient({'code': 'PGRST202', 'message': 'Could not find the function'})
+    storage = storage_with(client)
+    with caplog.at_level(logging.WARNING, logger='utils.supabase_storage'):
+        assert storage.prune_verification_tokens(NOW, 500) == 4
+        assert storage.prune_verification_tokens(NOW, 500) == 4
+
+    assert len([r for r in caplog.records if 'prune_email_verification' in r.getMessage()]) == 1
+    rpc_calls = [c for c in client.calls if c[0][0] == 'rpc']
+    assert len(rpc_calls) == 1  # Not retried after the first miss
+    assert (('table', 'email_verification'), ('delete',), ('eq', 'used', True)) in client.calls
+
+def test_other_errors_still_raise():
+    client = FakeClient({'code': '42501', 'message': 'permission denied'})
+    with pytest.raises(APIError):
+        storage_with(client).prune_verification_tokens(NOW, 500)
@@ -0,0 +1,87 @@
+import pytest
+
+from utils.write_behind import WriteBehindBuffer
+
+class Backend:
+    """flush_fn stand-in: records written rows and rejects any batch holding a rejected key"""
+
+    def __init__(self, rejected=()):
+        self.rejected = set(rejected)
+        self.calls = 0
+        self.written = []
+
+    def __call__(self, updates):
+        self.calls += 1
+        bad = self.rejected.intersection(updates)
+        if bad:
+            raise ValueError(f"no such user: {sorted(bad)}")
+        self.written.extend(updates.items())
+
+@pytest.fixture
+def make_buffer():
+    buffers = []
+
+    def make(backend, **kwargs):
+        # A long interval keeps the background thread out of the way; the tests flush by hand
+        buffer = WriteBehindBuffer(backend, interval=3600, max_attempts=3, **kwargs)
+        buffers.append(buffer)
+        return buffer
+    yield make
+    for buffer in buffers:
+        buffer.stop()
+
+def test_rejected_row_does_not_hold_back_the_batch(make_buffer):
+    backend = Backend(rejected={'deleted-user'})
+    buffer = make_buffer(backend)
+    for key in ('a', 'deleted-user', 'b'):
+        buffer.update(key, {'last_login': 1})
+
+    assert buffer.flush() == 2
+    assert sorted(key for key, _ in backend.written) == ['a', 'b']
+    assert buffer.pending() == 1
+
+    # Rows already written are not written again on the next flush
+    assert buffer.flush() == 0
+    assert sorted(key for key, _ in backend.written) == ['a', 'b']
+
+def test_row_is_dropped_after_max_attempts(make_buffer):
+    backend = Backend(rejected={'deleted-user'})
+    buffer = make_buffer(backend)
+    buffer.update('deleted-user', {'last_login': 1})
+
+    for _ in range(3):
+        buffer.flush()
+    assert buffer.pending() == 0
+    assert buffer.dropped == 1
+
+    calls = backend.calls
+    assert buffer.flush() == 0
+    assert backend.calls == calls
+
+def test_attempts_reset_after_a_successful_write(make_buffer):
+    backend = Backend(rejected={'flaky'})
+    buffer = make_buffer(backend)
+    buffer.update('flaky', {'last_login': 1})
+    buffer.flush()
+    buffer.flush()
+
+    backend.rejected.clear()
+    assert buffer.flush() == 1
+
+    backend.rejected.add('flaky')
+    buffer.update('flaky', {'last_login': 2})
+    buffer.flush()
+    buffer.flush()
+    assert buffer.pending() == 1  # Two failures since the last success, one short of the cap
+    assert buffer.dropped == 0
+
+def test_newer_update_wins_over_a_requeued_row(make_buffer):
+    backend = Backend(rejected={'u'})
+    buffer = make_buffer(backend)
+    buffer.update('u', {'last_login': 1, 'login_count': 5})
+    buffer.flush()
+    buffer.update('u', {'last_login': 2})
+
+    backend.rejected.clear()
+    buffer.flush()
+    assert backend.written == [('u', {'last_login': 2, 'login_count': 5})]
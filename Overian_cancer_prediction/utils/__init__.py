@@ -1,13 +1,29 @@
-from .model_utils import load_models, predict_tabular
-from .db import create_user, create_verification_token, verify_user, verify_login
-from .email_utils import send_verification_email
-
-__all__ = [
-    'load_models',
-    'predict_tabular',
-    'create_user',
-    'create_verification_token',
-    'verify_user',
-    'verify_login',
-    'send_verification_email'
-]
+import importlib
+
+# Public names and the submodule that defines each. Submodules are imported on
+# first attribute access, so `import utils.x` does not pay for every dependency.
+_EXPORTS = {
+    'load_models': 'model_utils',
+    'predict_tabular': 'model_utils',
+    'predict_tabular_fast': 'model_utils',
+    'predict_tabular_batch': 'model_utils',
+    'create_user': 'db',
+    'create_verification_token': 'db',
+    'verify_user': 'db',
+    'verify_login': 'db',
+    'send_verification_email': 'email_utils',
+    'queue_verification_email': 'email_utils'
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,251 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from config import (ADVICE_CACHE_ENABLED, ADVICE_CACHE_MAX_ENTRIES, ADVICE_CACHE_MAX_BYTES,
+                    ADVICE_CACHE_TTL, ADVICE_CACHE_PATH, ADVICE_CACHE_WAIT_TIMEOUT)
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper limits of normal used to band each marker, with the units the prompt quotes.
+# CEA and AFP use common clinical cut-offs.
+MARKER_UPPER_LIMITS = {
+    'CA125': 35.0,
+    'HE4': 140.0,
+    'CA19-9': 37.0,
+    'CEA': 5.0,
+    'AFP': 10.0
+}
+MARKER_UNITS = {'CA125': 'U/mL', 'HE4': 'pmol/L', 'CA19-9': 'U/mL', 'CEA': 'ng/mL', 'AFP': 'ng/mL'}
+
+# Multiples of the upper limit that separate normal / elevated / high / very high
+MARKER_BAND_EDGES = (1.0, 2.0, 5.0)
+
+AGE_BAND_WIDTH = 10
+
+# Part of every key; bump it whenever the prompt changes so entries persisted
+# from an older prompt are never served
+PROMPT_VERSION = 2
+
+# Everything the advice prompt is built from. Patients in one bucket get the
+# same prompt, so advice cached for one holds for all of them.
+AdviceBucket = namedtuple('AdviceBucket', ['risk_level', 'age_band', 'postmenopausal', 'marker_bands'])
+
+def marker_band(value, upper_limit):
+    """Quantize a marker value into a band index relative to its normal range"""
+    ratio = float(value) / upper_limit
+    for band, edge in enumerate(MARKER_BAND_EDGES):
+        if ratio <= edge:
+            return band
+    return len(MARKER_BAND_EDGES)
+
+def describe_marker_band(band):
+    if band == 0:
+        return "within the normal range"
+    if band == len(MARKER_BAND_EDGES):
+        return f"over {MARKER_BAND_EDGES[-1]:g}x the upper limit of normal"
+    return f"{MARKER_BAND_EDGES[band - 1]:g}-{MARKER_BAND_EDGES[band]:g}x the upper limit of normal"
+
+def advice_bucket(input_data, risk_level):
+    """The patient's AdviceBucket; raises KeyError/ValueError for an incomplete panel"""
+    age = int(float(input_data['Age']))
+    return AdviceBucket(
+        risk_level=risk_level,
+        age_band=age - age % AGE_BAND_WIDTH,
+        postmenopausal=bool(input_data['Menopause']),
+        marker_bands=tuple(marker_band(input_data[name], limit) for name, limit in MARKER_UPPER_LIMITS.items())
+    )
+
+def advice_cache_key(bucket):
+    """Flat, JSON-round-trippable cache key for an AdviceBucket"""
+    return (PROMPT_VERSION, bucket.risk_level, bucket.age_band, bucket.postmenopausal) + bucket.marker_bands
+
+class _Flight:
+    """An upstream call that concurrent identical requests wait on"""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class AdviceCache:
+    """LRU + TTL cache for generated advice with single-flight request coalescing"""
+
+    def __init__(self, max_entries=ADVICE_CACHE_MAX_ENTRIES, max_bytes=ADVICE_CACHE_MAX_BYTES,
+                 ttl=ADVICE_CACHE_TTL, path=None, wait_timeout=ADVICE_CACHE_WAIT_TIMEOUT):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if path:
+            self.load()
+
+    def get(self, key):
+        with self._lock:
+            value = self._get_locked(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._set_locked(key, value, size, time.time() + self.ttl)
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """Return the cached value or run compute once for all concurrent callers of key.
+
+        cacheable(value) decides whether a computed value is stored; errors from
+        compute propagate to every caller that waited on it.
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._flights.get(key)
+            if flight is None:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                raise TimeoutError("Timed out waiting for in-flight advice request")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = compute()
+            flight.value = value
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+    def save(self):
+        """Persist unexpired entries to the configured JSON file"""
+        if not self.path:
+            return
+        try:
+            now = time.time()
+            with self._lock:
+                records = [[list(key), expires_at, value]
+                           for key, (expires_at, _, value) in self._entries.items() if expires_at > now]
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(records, f)
+            os.replace(tmp_path, self.path)  # Never leave a half-written cache behind
+            logger.info(f"Saved {len(records)} advice cache entries to {self.path}")
+        except Exception as e:
+            logger.error(f"Error saving advice cache: {str(e)}")
+
+    def load(self):
+        """Load entries saved by a previous process, skipping expired ones"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                records = json.load(f)
+            now = time.time()
+            with self._lock:
+                for key, expires_at, value in records:
+                    if expires_at > now:
+                        self._set_locked(tuple(key), value, len(json.dumps(value)), expires_at)
+            logger.info(f"Loaded {len(self._entries)} advice cache entries from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading advice cache: {str(e)}")
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._remove_locked(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def _set_locked(self, key, value, size, expires_at):
+        if key in self._entries:
+            self._remove_locked(key)
+        self._entries[key] = (expires_at, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove_locked(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove_locked(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+_advice_cache = None
+_advice_cache_lock = threading.Lock()
+
+def get_advice_cache():
+    """Process-wide advice cache, or None when caching is disabled"""
+    global _advice_cache
+    if not ADVICE_CACHE_ENABLED:
+        return None
+    if _advice_cache is None:
+        with _advice_cache_lock:
+            if _advice_cache is None:
+                cache = AdviceCache(path=ADVICE_CACHE_PATH)
+                if ADVICE_CACHE_PATH:
+                    atexit.register(cache.save)
+                _advice_cache = cache
+    return _advice_cache
+
+# Scraped only once the cache exists; a disabled cache reports nothing
+get_metrics().register_cache('advice', lambda: _advice_cache.stats() if _advice_cache is not None else None)
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ADVICE_WORKERS, ADVICE_MAX_PENDING, ADVICE_TIMEOUT, ADVICE_RESULT_TTL
+from .llm_utils import ADVICE_FALLBACKS, generate_health_advice_with_reason, get_fallback_advice
+from .metrics import histogram
+from .tracing import current_trace_id, trace
+
+logger = logging.getLogger(__name__)
+
+ADVICE_JOB_SECONDS = histogram('ovarian_advice_job_seconds',
+                               "Submit-to-done time of async advice jobs; outcome is 'llm' or the fallback reason",
+                               ['outcome'])
+
+class AdviceJob:
+    """State of one background advice request"""
+    __slots__ = ('id', 'input_data', 'prediction_result', 'status', 'advice', 'partial',
+                 'fallback_reason', 'created_at', 'finished_at', 'trace_link')
+
+    def __init__(self, input_data, prediction_result):
+        self.id = uuid.uuid4().hex
+        self.input_data = input_data
+        self.prediction_result = prediction_result
+        self.status = 'pending'  # pending -> running -> done
+        self.advice = None
+        self.partial = {}  # Sections already streamed in while the job is running
+        self.fallback_reason = None
+        self.created_at = time.monotonic()
+        self.trace_link = current_trace_id()  # The submitting request's trace, if it was sampled
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'advice': self.advice if self.status == 'done' else (dict(self.partial) or None),
+            'fallback': self.fallback_reason is not None,
+            'fallback_reason': self.fallback_reason
+        }
+
+class AdviceJobQueue:
+    """Runs generate_health_advice on a bounded thread pool and keeps results for polling.
+
+    Jobs live in this process only, so a deployment with several worker
+    processes needs sticky sessions for the polling endpoint.
+    """
+
+    def __init__(self, max_workers=ADVICE_WORKERS, max_pending=ADVICE_MAX_PENDING,
+                 timeout=ADVICE_TIMEOUT, result_ttl=ADVICE_RESULT_TTL):
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='advice')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, input_data, prediction_result):
+        """Queue an advice job and return its id, or None when the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Advice queue is full, serving fallback advice inline")
+            ADVICE_FALLBACKS.labels('queue_full').inc()
+            return None
+
+        job = AdviceJob(dict(input_data), dict(prediction_result))
+        with self._lock:
+            self._prune_locked()
+            self._jobs[job.id] = job
+        try:
+            self._executor.submit(self._run, job)
+        except RuntimeError:
+            # Executor already shut down
+            self._slots.release()
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            return None
+        return job.id
+
+    def get(self, job_id):
+        """Return the job's state, resolving it to fallback advice if it has timed out"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status != 'done' and time.monotonic() - job.created_at > self.timeout:
+            if self._finish(job, get_fallback_advice(job.input_data, job.prediction_result), 'timeout'):
+                ADVICE_FALLBACKS.labels('job_timeout').inc()
+        return job.to_dict()
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job):
+        try:
+            with self._lock:
+                if job.status == 'done':
+                    return  # Timed out while waiting in the queue
+                job.status = 'running'
+            with trace('advice.job', sampled=job.trace_link is not None, link=job.trace_link, job_id=job.id):
+                # A fallback is already counted in ADVICE_FALLBACKS under its own reason
+                advice, fallback_reason = generate_health_advice_with_reason(
+                    job.input_data, job.prediction_result, on_section=job.partial.__setitem__)
+            self._finish(job, advice, fallback_reason)
+        except Exception as e:
+            logger.error(f"Advice job {job.id} failed: {str(e)}")
+            if self._finish(job, get_fallback_advice(job.input_data, job.prediction_result), 'error'):
+                ADVICE_FALLBACKS.labels('job_error').inc()
+        finally:
+            self._slots.release()
+
+    def _finish(self, job, advice, fallback_reason):
+        """Resolve the job; returns False if it was already resolved"""
+        with self._lock:
+            if job.status == 'done':
+                return False  # First result wins; a late LLM answer never replaces a served fallback
+            job.advice = advice
+            job.fallback_reason = fallback_reason
+            job.status = 'done'
+            job.finished_at = time.monotonic()
+        ADVICE_JOB_SECONDS.labels(fallback_reason or 'llm').observe(job.finished_at - job.created_at)
+        return True
+
+    def _prune_locked(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,249 @@
+"""Typed, memory-mappable column cache for the clinical CSV files.
+
+Usage (from the application directory):
+    python -m utils.dataset_cache [CSV ...]      build (if stale) and describe
+
+Each source CSV is parsed once into DATASET_CACHE_DIR/<name>-<sha256[:16]>/:
+    manifest.json   source hash, row count and per-column schema
+    c000.npy ...    one array per column
+Column types are inferred from the text: integers go to the smallest int
+type that fits, other numbers to float32 with NaN for blanks, complete
+Yes/No columns to bool, and anything else (e.g. Menopause mixing 0/1 with
+No/Yes/Unknown) to int8 category codes, -1 for blanks, with the labels in
+the manifest. A changed source gets a new directory; old ones are removed.
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from config import DATASET_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCES = [
+    os.path.join(APP_DIR, 'database', 'merged_ovarian_data.csv'),
+    os.path.join(APP_DIR, 'database', 'original data.csv'),
+    os.path.join(APP_DIR, 'new.csv'),
+]
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1  # Bump when the on-disk layout or inference rules change
+BOOL_LABELS = {'No': False, 'Yes': True}
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+def get_cache_root():
+    return os.path.abspath(DATASET_CACHE_DIR) if DATASET_CACHE_DIR else os.path.join(APP_DIR, 'database', '.cache')
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_stem(source_path):
+    return os.path.splitext(os.path.basename(source_path))[0].replace(' ', '_')
+
+def _parse_ints(values):
+    try:
+        return [int(v) for v in values]
+    except ValueError:
+        return None
+
+def _parse_floats(values):
+    try:
+        return [float(v) if v else np.nan for v in values]
+    except ValueError:
+        return None
+
+def encode_column(values):
+    """Infer a compact type for one column of stripped strings; returns (array, schema)"""
+    present = [v for v in values if v]
+    has_blanks = len(present) != len(values)
+
+    ints = None if has_blanks else _parse_ints(values)
+    if ints is not None and ints:
+        low, high = min(ints), max(ints)
+        dtype = next(t for t in INT_TYPES if np.iinfo(t).min <= low and high <= np.iinfo(t).max)
+        return np.array(ints, dtype=dtype), {'kind': 'int'}
+
+    floats = _parse_floats(values)
+    if floats is not None:
+        return np.array(floats, dtype=np.float32), {'kind': 'float'}
+
+    if not has_blanks and set(present) <= set(BOOL_LABELS):
+        return np.array([BOOL_LABELS[v] for v in values], dtype=bool), {'kind': 'bool'}
+
+    categories = sorted(set(present))
+    dtype = np.int8 if len(categories) < 127 else np.int16
+    index = {label: code for code, label in enumerate(categories)}
+    codes = np.array([index[v] if v else -1 for v in values], dtype=dtype)
+    return codes, {'kind': 'category', 'categories': categories}
+
+def build_cache(source_path, cache_root=None, sha256=None):
+    """Parse a CSV into a fresh cache directory and return its path"""
+    cache_root = cache_root or get_cache_root()
+    sha256 = sha256 or file_sha256(source_path)
+    os.makedirs(cache_root, exist_ok=True)
+
+    with open(source_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(header):
+                # zip() below would silently cut every column down to the shortest row
+                raise ValueError(f"{source_path} line {reader.line_num}: expected {len(header)} fields, got {len(row)}")
+            rows.append(row)
+    columns = list(zip(*rows)) if rows else [()] * len(header)
+
+    # Build in a scratch directory and rename it into place, so readers never see a partial cache
+    scratch = tempfile.mkdtemp(prefix='.build-', dir=cache_root)
+    try:
+        schema = []
+        for i, (name, raw) in enumerate(zip(header, columns)):
+            array, column_schema = encode_column([v.strip() for v in raw])
+            filename = f"c{i:03d}.npy"
+            np.save(os.path.join(scratch, filename), array)
+            schema.append({'name': name, 'file': filename, 'dtype': array.dtype.str,
+                           'nulls': int(np.isnan(array).sum()) if array.dtype.kind == 'f'
+                           else int((array < 0).sum()) if column_schema['kind'] == 'category' else 0,
+                           **column_schema})
+        stat = os.stat(source_path)
+        manifest = {
+            'format': FORMAT_VERSION,
+            'source': os.path.abspath(source_path),
+            'sha256': sha256,
+            'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'rows': len(rows),
+            'columns': schema,
+            'built_at': time.time(),
+        }
+        with open(os.path.join(scratch, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        target = os.path.join(cache_root, f"{_cache_stem(source_path)}-{sha256[:16]}")
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.rename(scratch, target)
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    _remove_stale(cache_root, source_path, keep=target)
+    return target
+
+def _remove_stale(cache_root, source_path, keep):
+    prefix = _cache_stem(source_path) + '-'
+    for entry in os.listdir(cache_root):
+        path = os.path.join(cache_root, entry)
+        if entry.startswith(prefix) and path != keep and len(entry) == len(prefix) + 16:
+            shutil.rmtree(path, ignore_errors=True)
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format') == FORMAT_VERSION else None
+
+def ensure_cache(source_path, cache_root=None):
+    """Return the manifest of an up-to-date cache for source_path, building it if needed"""
+    cache_root = cache_root or get_cache_root()
+    prefix = _cache_stem(source_path) + '-'
+    stat = os.stat(source_path)
+
+    # Fast path: an existing cache whose recorded size and mtime still match skips hashing
+    existing = [os.path.join(cache_root, e) for e in os.listdir(cache_root)
+                if e.startswith(prefix)] if os.path.isdir(cache_root) else []
+    for cache_dir in existing:
+        manifest = _read_manifest(cache_dir)
+        if manifest and manifest['source_size'] == stat.st_size and manifest['source_mtime_ns'] == stat.st_mtime_ns:
+            return dict(manifest, path=cache_dir)
+
+    sha256 = file_sha256(source_path)
+    cache_dir = os.path.join(cache_root, prefix + sha256[:16])
+    manifest = _read_manifest(cache_dir)
+    if manifest is None or manifest['sha256'] != sha256:
+        start = time.perf_counter()
+        cache_dir = build_cache(source_path, cache_root, sha256)
+        manifest = _read_manifest(cache_dir)
+        logger.info(f"Cached {source_path} ({manifest['rows']} rows) in {time.perf_counter() - start:.2f}s")
+    elif manifest['source_mtime_ns'] != stat.st_mtime_ns:
+        # Touched but unchanged: record the new mtime so the next call takes the fast path
+        manifest.update(source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+        with open(os.path.join(cache_dir, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    return dict(manifest, path=cache_dir)
+
+def load_columns(source_path, columns=None, mmap=True, cache_root=None):
+    """Load the named columns (default: all) as arrays, memory-mapped unless mmap=False.
+
+    Returns (arrays by name, manifest); category columns come back as codes,
+    with their labels in manifest['columns'][i]['categories'].
+    """
+    manifest = ensure_cache(source_path, cache_root)
+    by_name = {c['name']: c for c in manifest['columns']}
+    missing = [name for name in (columns or []) if name not in by_name]
+    if missing:
+        raise KeyError(f"Columns not in {source_path}: {missing}")
+    arrays = {}
+    for name in columns or list(by_name):
+        path = os.path.join(manifest['path'], by_name[name]['file'])
+        arrays[name] = np.load(path, mmap_mode='r' if mmap else None)
+    return arrays, manifest
+
+def decode_category(codes, column_schema, mapping, default=np.nan, dtype=np.float32):
+    """Turn category codes into values via a label -> value mapping; unmapped labels and blanks get default"""
+    lookup = np.array([mapping.get(label, default) for label in column_schema['categories']] + [default],
+                      dtype=dtype)
+    return lookup[codes]  # Code -1 (blank) indexes the trailing default
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build and inspect the columnar dataset cache")
+    parser.add_argument('sources', nargs='*', default=DEFAULT_SOURCES, help="CSV files (default: the bundled datasets)")
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild even if the cache is current")
+    parser.add_argument('--schema', action='store_true', help="Print every column's type")
+    args = parser.parse_args(argv)
+
+    for source in args.sources:
+        if args.rebuild:
+            build_cache(source)
+        start = time.perf_counter()
+        manifest = ensure_cache(source)
+        ensured = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(source, newline='', encoding='utf-8') as f:
+            csv_rows = sum(1 for _ in csv.reader(f)) - 1
+        csv_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        arrays, _ = load_columns(source)
+        load_seconds = time.perf_counter() - start
+
+        cached_bytes = sum(a.nbytes for a in arrays.values())
+        print(f"{source}\n  -> {manifest['path']}")
+        print(f"  {manifest['rows']} rows x {len(manifest['columns'])} columns, {cached_bytes / 1024:.0f}KB of arrays "
+              f"(source {manifest['source_size'] / 1024:.0f}KB); ensure {ensured * 1000:.1f}ms, "
+              f"load all {load_seconds * 1000:.1f}ms, csv scan only {csv_seconds * 1000:.1f}ms ({csv_rows} rows)")
+        if args.schema:
+            for column in manifest['columns']:
+                extra = f" {column['categories']}" if column['kind'] == 'category' else ''
+                print(f"    {column['name']:<12} {column['kind']:<8} {column['dtype']:<5} nulls={column['nulls']}{extra}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,90 +1,92 @@
+import atexit
+import functools
 import logging
-from datetime import datetime, timedelta
-import pytz
-from supabase import create_client
-import bcrypt
-from config import SUPABASE_URL, SUPABASE_KEY
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from config import WRITE_BEHIND_ENABLED
+from .metrics import histogram
+from .tracing import span
+from .password_utils import get_password_hasher
+from .storage import get_storage
+from .write_behind import WriteBehindBuffer
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Columns the login path needs; the rest of the row is never read there
+LOGIN_COLUMNS = ('id', 'email', 'password_hash', 'email_verified')
 
+AUTH_SECONDS = histogram('ovarian_auth_seconds', "Auth operation time; outcome 'fail' covers rejections and errors",
+                         ['operation', 'outcome'])
+
+def _timed(operation):
+    """Record the call's duration in AUTH_SECONDS; a falsy result counts as a failure"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            with span(operation) as current:
+                result = fn(*args, **kwargs)
+                current.set('ok', bool(result))
+            AUTH_SECONDS.labels(operation, 'ok' if result else 'fail').observe(time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
+
+_user_writes = None
+_user_writes_lock = threading.Lock()
+
+def get_user_writes():
+    """Process-wide write-behind buffer for non-critical user updates, flushed at exit"""
+    global _user_writes
+    if _user_writes is None:
+        with _user_writes_lock:
+            if _user_writes is None:
+                buffer = WriteBehindBuffer(lambda updates: get_storage().update_users(updates), name='user-writes')
+                atexit.register(buffer.stop)
+                _user_writes = buffer
+    return _user_writes
+
+@_timed('create_user')
 def create_user(email, password, full_name):
     try:
-        # Hash password
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # Hash password (on the bounded bcrypt pool)
+        password_hash = get_password_hasher().hash(password)
         
         # Insert user
-        user = supabase.table('users').insert({
-            'email': email,
-            'password_hash': password_hash,
-            'full_name': full_name,
-        }).execute()
-        
-        if user.data:
-            return user.data[0]
-        return None
+        with span('storage.insert_user'):
+            return get_storage().insert_user(email, password_hash, full_name)
     except Exception as e:
         print(f"Error creating user: {str(e)}")
         return None
 
+@_timed('create_verification_token')
 def create_verification_token(user_id):
     try:
         from utils.email_utils import generate_verification_code
         token = generate_verification_code()
-        expires_at = datetime.utcnow() + timedelta(minutes=10)
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
         
-        result = supabase.table('email_verification').insert({
-            'user_id': user_id,
-            'token': token,
-            'expires_at': expires_at.isoformat()
-        }).execute()
-        
-        return token if result.data else None
+        with span('storage.insert_verification_token'):
+            inserted = get_storage().insert_verification_token(user_id, token, expires_at)
+        return token if inserted else None
     except Exception as e:
         print(f"Error creating verification token: {str(e)}")
         return None
 
+@_timed('verify_user')
 def verify_user(user_id, token):
     try:
         logger.info(f"Verifying token {token} for user {user_id}")
         
-        # Check token with specific user_id and not used
-        result = supabase.table('email_verification').select('*')\
-            .eq('user_id', user_id)\
-            .eq('token', token)\
-            .eq('used', False)\
-            .execute()
-        
-        logger.info(f"Verification query result: {result.data}")
-        
-        if not result.data:
+        # Claim the token and mark the email verified (one transaction where the backend allows)
+        with span('storage.consume_verification_token'):
+            consumed = get_storage().consume_verification_token(user_id, token, datetime.now(timezone.utc))
+        if not consumed:
             logger.error(f"No valid token found for user {user_id}")
             return False
         
-        verification = result.data[0]
-        
-        # Convert expiry time to UTC timezone-aware datetime
-        expires_at = datetime.fromisoformat(verification['expires_at'].replace('Z', '+00:00'))
-        current_time = datetime.now(pytz.UTC)
-        
-        if current_time > expires_at:
-            logger.error("Token expired")
-            return False
-            
-        # Update user and token
-        supabase.table('users')\
-            .update({'email_verified': True})\
-            .eq('id', user_id)\
-            .execute()
-            
-        supabase.table('email_verification')\
-            .update({'used': True})\
-            .eq('id', verification['id'])\
-            .execute()
-        
         logger.info(f"Successfully verified user {user_id}")
         return True
         
@@ -92,18 +94,28 @@ def verify_user(user_id, token):
         logger.error(f"Error verifying user: {str(e)}")
         return False
 
+@_timed('verify_login')
 def verify_login(email, password):
     try:
-        result = supabase.table('users').select('*').eq('email', email).execute()
-        if not result.data:
+        with span('storage.get_user_by_email'):
+            user = get_storage().get_user_by_email(email, LOGIN_COLUMNS)
+        if not user:
             return None
             
-        user = result.data[0]
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        hasher = get_password_hasher()
+        if not hasher.check(password, user['password_hash']):
             return None
             
-        # Update last login
-        supabase.table('users').update({'last_login': datetime.utcnow().isoformat()}).eq('id', user['id']).execute()
+        # Update last login, upgrading the stored hash if it was made at another cost.
+        # Neither is read on the request path, so both go through the write-behind buffer.
+        update = {'last_login': datetime.now(timezone.utc)}
+        if hasher.needs_rehash(user['password_hash']):
+            update['password_hash'] = hasher.hash(password)
+        if WRITE_BEHIND_ENABLED:
+            get_user_writes().update(user['id'], update)
+        else:
+            with span('storage.update_user'):
+                get_storage().update_user(user['id'], update)
         
         return user
     except Exception as e:
@@ -0,0 +1,211 @@
+import atexit
+import logging
+import queue
+import random
+import smtplib
+import threading
+import time
+import uuid
+
+from config import (SMTP_HOST, SMTP_PORT, SMTP_STARTTLS, EMAIL_ADDRESS, EMAIL_PASSWORD,
+                    EMAIL_QUEUE_SIZE, EMAIL_MAX_RETRIES, EMAIL_BACKOFF_BASE,
+                    EMAIL_IDLE_TIMEOUT, EMAIL_STATUS_TTL)
+from .email_utils import EMAIL_MESSAGES, EMAIL_SEND_SECONDS
+from .metrics import counter, get_metrics, histogram
+from .tracing import current_trace_id, span, trace
+
+logger = logging.getLogger(__name__)
+
+EMAIL_QUEUE_WAIT_SECONDS = histogram('ovarian_email_queue_wait_seconds', "Time from enqueue to the first delivery attempt")
+EMAIL_RETRIES = counter('ovarian_email_retries_total', "Delivery attempts retried after an SMTP or network error")
+
+_STOP = object()  # Queued by stop() behind any pending messages
+
+class EmailDispatcher:
+    """Background sender with a bounded queue and one reusable SMTP session.
+
+    enqueue() returns immediately with a message id; status(id) reports
+    'queued', 'sending', 'sent' or 'failed'. The session is opened on demand,
+    reused across messages, re-established after a disconnect and closed after
+    EMAIL_IDLE_TIMEOUT seconds without traffic.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS,
+                 username=EMAIL_ADDRESS, password=EMAIL_PASSWORD, queue_size=EMAIL_QUEUE_SIZE,
+                 max_retries=EMAIL_MAX_RETRIES, backoff_base=EMAIL_BACKOFF_BASE,
+                 idle_timeout=EMAIL_IDLE_TIMEOUT, status_ttl=EMAIL_STATUS_TTL):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.idle_timeout = idle_timeout
+        self.status_ttl = status_ttl
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._statuses = {}
+        self._status_lock = threading.Lock()
+        self._smtp = None
+        self._thread = threading.Thread(target=self._worker, name='email-dispatcher', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, to_email, message):
+        """Queue a MIME message for delivery; returns its id, or None if the queue is full"""
+        message_id = uuid.uuid4().hex
+        self._set_status(message_id, 'queued', attempts=0, queued_at=time.time())
+        try:
+            # Delivery is traced, linked to the enqueuing request, when that request was
+            self._queue.put_nowait((message_id, to_email, message, current_trace_id()))
+        except queue.Full:
+            logger.error("Email queue is full")
+            EMAIL_MESSAGES.labels('queued', 'queue_full').inc()
+            with self._status_lock:
+                self._statuses.pop(message_id, None)
+            return None
+        return message_id
+
+    def status(self, message_id):
+        with self._status_lock:
+            status = self._statuses.get(message_id)
+            return dict(status) if status else None
+
+    def stop(self, timeout=10.0):
+        """Deliver what is already queued (up to timeout seconds), then close the session"""
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _set_status(self, message_id, state, **fields):
+        with self._status_lock:
+            status = self._statuses.setdefault(message_id, {})
+            status.update(fields, state=state, updated_at=time.time())
+
+    def _prune_statuses(self):
+        cutoff = time.time() - self.status_ttl
+        with self._status_lock:
+            for message_id in [k for k, v in self._statuses.items()
+                               if v['state'] in ('sent', 'failed') and v['updated_at'] < cutoff]:
+                del self._statuses[message_id]
+
+    def _worker(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()  # Servers drop quiet sessions anyway; reconnect on the next message
+                continue
+            try:
+                if item is _STOP:
+                    self._disconnect()
+                    return
+                self._deliver(*item)
+            except Exception as e:
+                logger.error(f"Email dispatcher error: {str(e)}")
+                self._set_status(item[0], 'failed', error=str(e))
+                EMAIL_MESSAGES.labels('queued', 'failed').inc()
+            finally:
+                self._queue.task_done()
+            self._prune_statuses()
+
+    def _deliver(self, message_id, to_email, message, trace_link=None):
+        with trace('email.deliver', sampled=trace_link is not None, link=trace_link, message_id=message_id) as root:
+            outcome = self._deliver_attempts(message_id, to_email, message)
+            root.set('outcome', outcome)
+
+    def _deliver_attempts(self, message_id, to_email, message):
+        """Send with retries; returns 'sent', 'rejected' or 'failed'"""
+        queued_at = (self.status(message_id) or {}).get('queued_at')
+        if queued_at is not None:
+            EMAIL_QUEUE_WAIT_SECONDS.observe(max(0.0, time.time() - queued_at))
+        text = message.as_string()
+        for attempt in range(1, self.max_retries + 2):
+            self._set_status(message_id, 'sending', attempts=attempt)
+            start = time.perf_counter()
+            try:
+                try:
+                    with span('smtp.send', mode='queued', attempt=attempt, reconnect=self._smtp is None):
+                        self._connect().sendmail(message['From'] or self.username, to_email, text)
+                finally:
+                    EMAIL_SEND_SECONDS.labels('queued').observe(time.perf_counter() - start)
+                self._set_status(message_id, 'sent', error=None)
+                EMAIL_MESSAGES.labels('queued', 'sent').inc()
+                return 'sent'
+            except smtplib.SMTPRecipientsRefused as e:
+                # Permanent for this address; retrying will not help
+                self._set_status(message_id, 'failed', error=str(e))
+                EMAIL_MESSAGES.labels('queued', 'rejected').inc()
+                logger.error(f"Email {message_id} rejected: {str(e)}")
+                return 'rejected'
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    # Permanent (550 mailbox unavailable, 553 bad address, 535 auth...); sending again gets the same answer
+                    self._set_status(message_id, 'failed', error=str(e))
+                    EMAIL_MESSAGES.labels('queued', 'rejected').inc()
+                    logger.error(f"Email {message_id} rejected with {e.smtp_code}: {str(e)}")
+                    return 'rejected'
+                # Transient (421/451/452); sendmail has already reset the session
+                error = e
+                if e.smtp_code == 421:
+                    self._disconnect()
+            except OSError as e:
+                # Dropped or refused connection (SMTPServerDisconnected, timeouts, resets)
+                self._disconnect()
+                error = e
+
+            if attempt <= self.max_retries:
+                EMAIL_RETRIES.inc()
+                delay = random.uniform(0, self.backoff_base * (2 ** (attempt - 1)))
+                logger.warning(f"Email {message_id} attempt {attempt} failed ({str(error)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+        self._set_status(message_id, 'failed', error=str(error))
+        EMAIL_MESSAGES.labels('queued', 'failed').inc()
+        logger.error(f"Email {message_id} failed after {self.max_retries + 1} attempts: {str(error)}")
+        return 'failed'
+
+    def _connect(self):
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+            try:
+                if self.starttls:
+                    smtp.starttls()
+                if self.password:
+                    smtp.login(self.username, self.password)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_email_dispatcher():
+    """Process-wide dispatcher, started on first use and drained at exit"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                dispatcher = EmailDispatcher()
+                atexit.register(dispatcher.stop)
+                _dispatcher = dispatcher
+    return _dispatcher
+
+def _collect_metrics():
+    dispatcher = _dispatcher
+    depth = dispatcher._queue.qsize() if dispatcher is not None else 0
+    return [('ovarian_email_queue_depth', 'gauge', "Emails waiting for the dispatcher", [({}, depth)])]
+
+get_metrics().add_collector(_collect_metrics)
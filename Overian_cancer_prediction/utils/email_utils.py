@@ -1,38 +1,77 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from config import EMAIL_ADDRESS, EMAIL_PASSWORD, EMAIL_TEMPLATES
+import logging
+import time
+from config import EMAIL_ADDRESS, EMAIL_PASSWORD, EMAIL_TEMPLATES, SMTP_HOST, SMTP_PORT, SMTP_STARTTLS
+from .metrics import counter, histogram
+from .tracing import span
+
+# smtplib, the email package and the dispatcher are imported on first send, not at app import
+
+logger = logging.getLogger(__name__)
+
+EMAIL_SEND_SECONDS = histogram('ovarian_email_send_seconds', "Time per SMTP delivery attempt", ['mode'])
+EMAIL_MESSAGES = counter('ovarian_email_messages_total', "Verification emails by final outcome", ['mode', 'outcome'])
+
+def build_verification_message(to_email, name, verification_code):
+    """Build the verification email as a MIME message"""
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    # Create message
+    msg = MIMEMultipart()
+    msg['From'] = EMAIL_ADDRESS
+    msg['To'] = to_email
+    msg['Subject'] = EMAIL_TEMPLATES['verification']['subject']
+
+    # Create body
+    body = EMAIL_TEMPLATES['verification']['body'].format(
+        name=name,
+        code=verification_code
+    )
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
 
 def send_verification_email(to_email, name, verification_code):
+    import smtplib
     try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = to_email
-        msg['Subject'] = EMAIL_TEMPLATES['verification']['subject']
-
-        # Create body
-        body = EMAIL_TEMPLATES['verification']['body'].format(
-            name=name,
-            code=verification_code
-        )
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Setup server
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-
-        # Send email
-        text = msg.as_string()
-        server.sendmail(EMAIL_ADDRESS, to_email, text)
-        server.quit()
+        msg = build_verification_message(to_email, name, verification_code)
+        start = time.perf_counter()
+
+        with span('smtp.send', mode='direct'):
+            # Setup server
+            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+            if SMTP_STARTTLS:
+                server.starttls()
+            if EMAIL_PASSWORD:
+                server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+
+            # Send email
+            text = msg.as_string()
+            server.sendmail(EMAIL_ADDRESS, to_email, text)
+            server.quit()
+        EMAIL_SEND_SECONDS.labels('direct').observe(time.perf_counter() - start)
+        EMAIL_MESSAGES.labels('direct', 'sent').inc()
         return True
 
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        logger.error(f"Error sending email: {str(e)}")
+        EMAIL_MESSAGES.labels('direct', 'failed').inc()
         return False
 
+def queue_verification_email(to_email, name, verification_code):
+    """Hand the verification email to the background dispatcher; returns a message id or None"""
+    from .email_queue import get_email_dispatcher
+    try:
+        msg = build_verification_message(to_email, name, verification_code)
+        return get_email_dispatcher().enqueue(to_email, msg)
+    except Exception as e:
+        logger.error(f"Error queueing email: {str(e)}")
+        return None
+
+def get_email_status(message_id):
+    """Delivery status of a queued email, or None if it is unknown"""
+    from .email_queue import get_email_dispatcher
+    return get_email_dispatcher().status(message_id)
+
 def generate_verification_code():
     """Generate a 6-digit verification code"""
     from random import randint
@@ -0,0 +1,120 @@
+import json
+import logging
+import random
+import threading
+import time
+
+from config import (TOGETHER_API_URL, TOGETHER_API_KEY, TOGETHER_MODEL, LLM_POOL_SIZE,
+                    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_RETRIES,
+                    LLM_BACKOFF_BASE, LLM_BACKOFF_MAX)
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class LLMClient:
+    """Shared keep-alive client for an OpenAI-compatible chat-completions endpoint"""
+
+    def __init__(self, api_url=TOGETHER_API_URL, api_key=TOGETHER_API_KEY, model=TOGETHER_MODEL,
+                 pool_size=LLM_POOL_SIZE, connect_timeout=LLM_CONNECT_TIMEOUT,
+                 read_timeout=LLM_READ_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX):
+        if not api_key:
+            raise ValueError("TOGETHER_API_KEY is not set")
+        self.api_url = api_url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # requests (with urllib3 and certifi) is imported here, on first use, not at app import
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # One pool per host; the connections are reused across threads and requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def chat_completion(self, messages, **params):
+        """POST a chat-completions request and return the decoded JSON body"""
+        payload = {"model": self.model, "messages": messages}
+        payload.update(params)
+        response = self.post(payload)
+        return response.json()
+
+    def stream_chat_completion(self, messages, **params):
+        """POST with stream=True and yield content deltas from the server-sent events"""
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        payload.update(params)
+        response = self.post(payload, stream=True)
+        with response:
+            for line in response.iter_lines():
+                # SSE frames look like b'data: {...}'; blank lines and comments separate them
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    break
+                chunk = json.loads(data)
+                for choice in chunk.get('choices') or []:
+                    content = (choice.get('delta') or {}).get('content')
+                    if content:
+                        yield content
+
+    def post(self, payload, stream=False):
+        """POST with bounded, jittered retries on connection errors, 429 and 5xx"""
+        import requests
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=self.timeout, stream=stream)
+            except requests.exceptions.ConnectionError as e:
+                # Includes connect timeouts; nothing was processed upstream, so retrying is safe
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"LLM connection failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._retry_after(response) or self._backoff(attempt)
+                logger.warning(f"LLM returned {response.status_code}, retrying in {delay:.2f}s")
+                response.close()  # Hand the connection back to the pool
+                time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def close(self):
+        self.session.close()
+
+    def _backoff(self, attempt):
+        # Full jitter: spread retries from many workers instead of retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        try:
+            return min(self.backoff_max, float(response.headers.get('Retry-After', '')))
+        except ValueError:
+            return None
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Process-wide LLM client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
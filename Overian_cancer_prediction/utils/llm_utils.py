@@ -1,73 +1,146 @@
 import logging
-import requests
+import time
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+from config import LLM_STREAM, TOGETHER_API_KEY
+from .llm_client import get_llm_client
+from .metrics import counter, histogram
+from .tracing import current_span, span
+from .risk_utils import get_risk_level
+from .advice_cache import (AGE_BAND_WIDTH, MARKER_UNITS, MARKER_UPPER_LIMITS, advice_bucket, advice_cache_key,
+                           describe_marker_band, get_advice_cache)
 
 logger = logging.getLogger(__name__)
 
-TOGETHER_API_KEY = "tgp_v1_MD6iZEhrnGDjnka_olEfwlDYNaxh67Tl-2yMVFUxqU8"
-TOGETHER_API_URL = "https://api.together.xyz/v1/chat/completions"
-TOGETHER_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo"  # Updated to new model
+ADVICE_STAGE_SECONDS = histogram('ovarian_advice_stage_seconds', "LLM advice time by stage: llm call, parse_response",
+                                 ['stage'])
+ADVICE_FALLBACKS = counter('ovarian_advice_fallbacks_total', "Default advice served instead of the LLM's, by reason",
+                           ['reason'])
 
-def generate_health_advice(input_data, prediction_result):
-    """Generate personalized health advice using Together AI LLM API"""
+# Sampling parameters for the advice completion
+ADVICE_COMPLETION_PARAMS = {
+    "temperature": 0.4,
+    "top_p": 0.9,
+    "max_tokens": 1500,
+    "frequency_penalty": 0.3,
+    "presence_penalty": 0.3
+}
+
+# Age thresholds (years) behind every age-dependent branch of the default advice.
+# Keep all comparisons on these so FALLBACK_ADVICE_TABLE stays exact.
+AGE_HIGHER_RISK = 50  # Above this: closer follow-up, bone/heart considerations
+AGE_SENIOR = 60  # Above this: gentler exercise, highest-risk age group
+
+# Advice sections in response order: (key, start marker, end marker)
+ADVICE_SECTIONS = [
+    ('risk_factors', "Risk Factors:", "Dietary Recommendations:"),
+    ('diet', "Dietary Recommendations:", "Exercise Guidelines:"),
+    ('exercise', "Exercise Guidelines:", "Important Signs"),
+    ('warning_signs', "Important Signs", "Daily Wellness"),
+    ('wellness_tips', "Daily Wellness", None)
+]
+
+def generate_health_advice(input_data, prediction_result, on_section=None):
+    """Generate personalized health advice using Together AI LLM API.
+
+    on_section(key, html) is called for each section as soon as it has streamed in.
+    """
+    return generate_health_advice_with_reason(input_data, prediction_result, on_section)[0]
+
+def generate_health_advice_with_reason(input_data, prediction_result, on_section=None):
+    """generate_health_advice that also says where the advice came from.
+
+    Returns (advice, fallback_reason): the reason is None when the LLM wrote
+    the advice, otherwise 'unconfigured', 'incomplete', 'llm_error' or 'error'.
+    """
     try:
-        risk_level = "high" if prediction_result['probability'] > 0.7 else "medium" if prediction_result['probability'] > 0.3 else "low"
+        risk_level = get_risk_level(prediction_result['probability'])
+
+        if not TOGETHER_API_KEY:
+            # No key configured: skip the call instead of failing it on every request
+            return _fallback(input_data, prediction_result, 'unconfigured'), 'unconfigured'
         
         # Try to get advice from LLM first
         try:
-            llm_advice = generate_llm_advice(input_data, prediction_result, risk_level)
+            llm_advice = get_cached_llm_advice(input_data, prediction_result, risk_level, on_section)
             
             # If any sections are missing, use personalized defaults
-            if any(not v or v == "Information not available" for v in llm_advice.values()):
+            if not is_complete_advice(llm_advice):
                 logger.warning("Some sections were missing in LLM response. Using personalized defaults.")
-                return get_personalized_default_advice(
-                    risk_level=risk_level,
-                    age=input_data.get('Age', 45),
-                    is_postmenopausal=bool(input_data.get('Menopause', 0)),
-                    marker_levels={
-                        'CA125': input_data.get('CA125', 35.0),
-                        'HE4': input_data.get('HE4', 40.0),
-                        'CA19_9': input_data.get('CA19-9', 15.0)
-                    }
-                )
-            return llm_advice
+                return _fallback(input_data, prediction_result, 'incomplete'), 'incomplete'
+            return llm_advice, None
             
         except Exception as llm_error:
             logger.error(f"Error getting LLM advice: {str(llm_error)}")
             # Fall back to personalized default advice
-            return get_personalized_default_advice(
-                risk_level=risk_level,
-                age=input_data.get('Age', 45),
-                is_postmenopausal=bool(input_data.get('Menopause', 0)),
-                marker_levels={
-                    'CA125': input_data.get('CA125', 35.0),
-                    'HE4': input_data.get('HE4', 40.0),
-                    'CA19_9': input_data.get('CA19-9', 15.0)
-                }
-            )
+            return _fallback(input_data, prediction_result, 'llm_error'), 'llm_error'
     except Exception as e:
         logger.error(f"Error generating health advice: {str(e)}")
+        ADVICE_FALLBACKS.labels('error').inc()
+        current_span().set('fallback', 'error')
+        return get_default_advice(), 'error'
+
+def _fallback(input_data, prediction_result, reason):
+    ADVICE_FALLBACKS.labels(reason).inc()
+    current_span().set('fallback', reason)
+    return get_fallback_advice(input_data, prediction_result)
+
+def get_fallback_advice(input_data, prediction_result):
+    """Personalized default advice for a patient when the LLM cannot be used"""
+    try:
         return get_personalized_default_advice(
-            risk_level="medium",  # Default to medium if we can't determine
-            age=45,  # Default age
-            is_postmenopausal=False,
-            marker_levels={}
+            risk_level=get_risk_level(prediction_result['probability']),
+            age=input_data.get('Age', 45),
+            is_postmenopausal=bool(input_data.get('Menopause', 0)),
+            marker_levels={
+                'CA125': input_data.get('CA125', 35.0),
+                'HE4': input_data.get('HE4', 40.0),
+                'CA19_9': input_data.get('CA19-9', 15.0)
+            }
         )
+    except Exception as e:
+        logger.error(f"Error generating fallback advice: {str(e)}")
+        return get_default_advice()
+
+def is_complete_advice(advice):
+    """True when every advice section has content"""
+    return not any(not v or v == "Information not available" for v in advice.values())
+
+def get_cached_llm_advice(input_data, prediction_result, risk_level, on_section=None):
+    """generate_llm_advice for the patient's advice bucket, cached and coalesced per bucket"""
+    bucket = advice_bucket(input_data, risk_level)
+    cache = get_advice_cache()
+    if cache is None:
+        return generate_llm_advice(bucket, on_section)
+    return cache.get_or_compute(
+        advice_cache_key(bucket),
+        lambda: generate_llm_advice(bucket, on_section),
+        cacheable=is_complete_advice
+    )
+
+def generate_llm_advice(bucket, on_section=None):
+    """Generate advice for an AdviceBucket using LLM, streaming sections to on_section when LLM_STREAM is set"""
+    with span('generate_llm_advice', risk_level=bucket.risk_level, stream=LLM_STREAM):
+        return _generate_llm_advice(build_advice_prompt(bucket), on_section)
 
-def generate_llm_advice(input_data, prediction_result, risk_level):
-    """Generate advice using LLM"""
-    prompt = f"""You are a medical expert providing health recommendations for a patient with ovarian cancer risk assessment. Please provide gentle but informative advice based on the following patient data:
+def build_advice_prompt(bucket):
+    """The advice prompt for an AdviceBucket.
+
+    Only the bucket goes in: no exact age, lab value or risk score, so cached
+    advice never describes a different patient in the same bucket.
+    """
+    lab_lines = '\n'.join(
+        f"- {name}: {describe_marker_band(band)} (Normal Range: 0-{MARKER_UPPER_LIMITS[name]:g} {MARKER_UNITS[name]})"
+        for name, band in zip(MARKER_UPPER_LIMITS, bucket.marker_bands))
+    return f"""You are a medical expert providing health recommendations for a patient with ovarian cancer risk assessment. Please provide gentle but informative advice based on the following patient data:
 
 Risk Assessment Results:
-- Risk Level: {risk_level.upper()} (Risk Score: {prediction_result['probability']:.1%})
-- Age: {input_data['Age']} years
-- Menopausal Status: {'Post-menopausal' if input_data['Menopause'] else 'Pre-menopausal'}
+- Risk Level: {bucket.risk_level.upper()}
+- Age Group: {bucket.age_band}-{bucket.age_band + AGE_BAND_WIDTH - 1} years
+- Menopausal Status: {'Post-menopausal' if bucket.postmenopausal else 'Pre-menopausal'}
 
 Lab Values:
-- CA125: {input_data['CA125']} U/mL (Normal Range: 0-35 U/mL)
-- HE4: {input_data['HE4']} pmol/L (Normal Range: 0-140 pmol/L)
-- CA19-9: {input_data['CA19-9']} U/mL (Normal Range: 0-37 U/mL)
-- CEA: {input_data['CEA']} ng/mL
-- AFP: {input_data['AFP']} ng/mL
+{lab_lines}
 
 Please provide compassionate and detailed recommendations in these categories. Format each section with bullet points:
 
@@ -101,39 +174,45 @@ Please provide compassionate and detailed recommendations in these categories. F
 - Sleep recommendations
 - Support resources
 
-Please ensure recommendations are specific to the patient's risk level, age, and biomarker values."""
-
-    payload = {
-        "model": TOGETHER_MODEL,
-        "messages": [
-            {
-                "role": "system",
-                "content": "You are a compassionate medical expert specializing in women's health. Provide evidence-based advice while maintaining a supportive tone."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "temperature": 0.4,
-        "top_p": 0.9,
-        "max_tokens": 1500,
-        "frequency_penalty": 0.3,
-        "presence_penalty": 0.3
-    }
+Please ensure recommendations are specific to the patient's risk level, age group, and biomarker levels."""
 
-    headers = {
-        "Authorization": f"Bearer {TOGETHER_API_KEY}",
-        "Content-Type": "application/json"
-    }
+def _generate_llm_advice(prompt, on_section):
+    messages = [
+        {
+            "role": "system",
+            "content": "You are a compassionate medical expert specializing in women's health. Provide evidence-based advice while maintaining a supportive tone."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+    client = get_llm_client()
+    start = time.perf_counter()
+    if LLM_STREAM:
+        parser = SectionStreamParser()
+        with span('llm.completion') as completion:
+            for delta in client.stream_chat_completion(messages, **ADVICE_COMPLETION_PARAMS):
+                for key, value in parser.feed(delta):
+                    if on_section is not None:
+                        on_section(key, value)
+            completion.set('chars', parser.length)
+        ADVICE_STAGE_SECONDS.labels('llm').observe(time.perf_counter() - start)
+        advice_text = parser.text.strip()
+        if not advice_text:
+            raise Exception("Empty streamed API response")
+        with ADVICE_STAGE_SECONDS.labels('parse').time(), span('parse_response'):
+            return parse_response(advice_text)
 
-    response = requests.post(TOGETHER_API_URL, headers=headers, json=payload, timeout=45)
-    response.raise_for_status()
+    with span('llm.completion'):
+        data = client.chat_completion(messages, **ADVICE_COMPLETION_PARAMS)
+    ADVICE_STAGE_SECONDS.labels('llm').observe(time.perf_counter() - start)
     
-    data = response.json()
     if "choices" in data and data["choices"]:
         advice_text = data["choices"][0]["message"]["content"].strip()
-        return parse_response(advice_text)
+        with ADVICE_STAGE_SECONDS.labels('parse').time(), span('parse_response'):
+            return parse_response(advice_text)
     else:
         raise Exception("Unexpected API response format")
 
@@ -173,7 +252,7 @@ def generate_personalized_dietary_advice(risk_level, age, is_postmenopausal):
         ])
     
     # Age and menopausal status considerations
-    if age > 50 or is_postmenopausal:
+    if age > AGE_HIGHER_RISK or is_postmenopausal:
         recs.extend([
             "Ensure adequate calcium intake (1200mg daily)",
             "Include vitamin D rich foods or consider supplements",
@@ -187,7 +266,7 @@ def generate_personalized_exercise_advice(risk_level, age):
     recs = []
     
     # Base recommendations
-    if age > 60:
+    if age > AGE_SENIOR:
         base_activity = "30 minutes of gentle activity"
         intensity = "low to moderate"
     else:
@@ -204,7 +283,7 @@ def generate_personalized_exercise_advice(risk_level, age):
             "Consider working with a certified fitness trainer",
             "Focus on low-impact activities like swimming or stationary cycling"
         ])
-    elif age > 60:
+    elif age > AGE_SENIOR:
         recs.extend([
             "Try gentle yoga or tai chi for balance and flexibility",
             "Include daily walking, starting with 10-15 minutes",
@@ -250,7 +329,7 @@ def generate_warning_signs(risk_level, age, is_postmenopausal):
             "Monitor any pelvic or lower back pain",
             "Track changes in urinary habits",
             "Note any irregular bleeding",
-            f"Get check-ups every {3 if age > 50 else 6} months"
+            f"Get check-ups every {3 if age > AGE_HIGHER_RISK else 6} months"
         ])
     elif risk_level == "medium":
         signs.extend([
@@ -267,7 +346,7 @@ def generate_warning_signs(risk_level, age, is_postmenopausal):
         ])
     
     # Age and menopausal status considerations
-    if age > 50 or is_postmenopausal:
+    if age > AGE_HIGHER_RISK or is_postmenopausal:
         signs.extend([
             "Monitor bone health and any unusual joint pain",
             "Track changes in sleep patterns",
@@ -293,14 +372,11 @@ def parse_response(text):
             else:
                 sections = text
         else:
-            # Parse text response into sections
-            sections = {
-                'risk_factors': extract_section(text, "Risk Factors:", "Dietary Recommendations:"),
-                'diet': extract_section(text, "Dietary Recommendations:", "Exercise Guidelines:"),
-                'exercise': extract_section(text, "Exercise Guidelines:", "Important Signs"),
-                'warning_signs': extract_section(text, "Important Signs", "Daily Wellness"),
-                'wellness_tips': extract_wellness_tips(extract_section(text, "Daily Wellness", None))
-            }
+            # Parse text response into sections in a single scan
+            sections = split_sections(text)
+            formatted = {k: format_text_section(v) for k, v in sections.items() if k != 'wellness_tips'}
+            formatted['wellness_tips'] = format_section(clean_wellness_tips(sections['wellness_tips']))
+            return formatted
         
         # Clean up and format sections
         sections = {k: format_section(v) for k, v in sections.items()}
@@ -309,6 +385,164 @@ def parse_response(text):
         logger.error(f"Error parsing response: {str(e)}")
         return get_default_advice()
 
+# Lowercased section headings, looked up once per response
+_SECTION_MARKERS = tuple(dict.fromkeys(
+    marker.lower() for _, start, end in ADVICE_SECTIONS for marker in (start, end) if marker
+))
+_MAX_MARKER_LENGTH = max(len(marker) for marker in _SECTION_MARKERS)
+_BULLET_PREFIX_CHARS = '0123456789.- *'
+
+def split_sections(text):
+    """Raw content of every advice section from a single lowercase pass.
+
+    Equivalent to calling extract_section for each entry of ADVICE_SECTIONS,
+    which lowercases the whole response twice per section.
+    """
+    lower = text.lower()
+    first_seen = {marker: lower.find(marker) for marker in _SECTION_MARKERS}
+
+    sections = {}
+    for key, start_marker, end_marker in ADVICE_SECTIONS:
+        start_idx = first_seen[start_marker.lower()]
+        if start_idx == -1:
+            sections[key] = "Information not available"
+            continue
+
+        # Content starts on the line after the heading
+        content_start = text.find('\n', start_idx)
+        content_start = start_idx + len(start_marker) if content_start == -1 else content_start + 1
+
+        # Section ends at the first end heading after the content start
+        end_idx = len(text)
+        if end_marker:
+            end_lower = end_marker.lower()
+            end_idx = first_seen[end_lower]
+            if end_idx < content_start:
+                end_idx = lower.find(end_lower, content_start)
+            if end_idx == -1:
+                end_idx = len(text)
+
+        sections[key] = text[content_start:end_idx].strip() or "Information not available"
+    return sections
+
+def format_text_section(text):
+    """format_section for string content, cleaning each line in a single pass"""
+    if not text or text == "Information not available":
+        return "Information not available"
+
+    formatted_lines = []
+    has_list_items = False
+    for line in text.split('\n'):
+        # Removing every '*' is what the chained '***'/'**'/'*' replaces amount to
+        line = line.strip().lstrip(_BULLET_PREFIX_CHARS).replace('*', '')
+        if not line or line.startswith('•'):
+            continue  # format_section drops bullet-glyph lines too
+        if line.startswith('<'):
+            has_list_items = has_list_items or line.startswith('<li>')
+            formatted_lines.append(line)
+        else:
+            formatted_lines.append(f"<p>{line}</p>")
+
+    if has_list_items:
+        return f"<ul class='list-disc pl-5 space-y-2'>{''.join(formatted_lines)}</ul>"
+    return ''.join(formatted_lines)
+
+def clean_wellness_tips(wellness_text):
+    """extract_wellness_tips for string content, cleaning each line in a single pass"""
+    if not wellness_text or wellness_text == "Information not available":
+        return get_default_advice()['wellness_tips']
+
+    tips = []
+    for line in wellness_text.split('\n'):
+        line = line.strip('•- *').replace('***', '').replace('**', '').lstrip('0123456789.- ').strip()
+        if len(line) > 10:  # Filter out empty/short lines
+            tips.append(line)
+            if len(tips) == 3:
+                return tips
+
+    # Pad with defaults if needed
+    defaults = [
+        "Maintain regular health check-ups",
+        "Practice stress management through meditation or deep breathing",
+        "Ensure adequate sleep and rest"
+    ]
+    return (tips + defaults)[:3]
+
+class SectionStreamParser:
+    """Incrementally splits a streamed completion into advice sections.
+
+    feed() returns (key, html) for every section whose end marker has arrived,
+    split by the rules of split_sections and formatted by format_text_section,
+    so each matches what parse_response makes of the full text. The last
+    section has no end marker and is only known once the stream ends, so
+    callers take the final result from parse_response(parser.text).
+
+    Each delta is lowercased and searched once: markers are looked for in the
+    new text plus a tail long enough to catch one split across deltas, and
+    only a finished section is sliced out of the received chunks.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offsets = []  # Start of each chunk in the full text
+        self.length = 0
+        self._tail = ''
+        self._first_seen = dict.fromkeys(_SECTION_MARKERS, -1)
+        self._content_start = {}  # Section key -> index just past its heading line
+        self._end = {}  # Section key -> index of its end marker
+        self._next = 0  # Index into ADVICE_SECTIONS of the next section to complete
+
+    @property
+    def text(self):
+        return ''.join(self._chunks)
+
+    def feed(self, delta):
+        base = self.length - len(self._tail)
+        window = self._tail + delta.lower()
+        self._chunks.append(delta)
+        self._offsets.append(self.length)
+        self.length += len(delta)
+        self._tail = window[max(0, len(window) - _MAX_MARKER_LENGTH + 1):]
+
+        for marker, idx in self._first_seen.items():
+            if idx == -1:
+                found = window.find(marker)
+                if found != -1:
+                    self._first_seen[marker] = base + found
+
+        for key, start_marker, end_marker in ADVICE_SECTIONS[self._next:]:
+            if end_marker is None or key in self._end:
+                continue
+            start_idx = self._first_seen[start_marker.lower()]
+            if start_idx == -1:
+                continue
+            content_start = self._content_start.get(key)
+            if content_start is None:
+                # Wait for the heading's line break so the content start matches split_sections
+                line_end = window.find('\n', max(0, start_idx - base))
+                if line_end == -1:
+                    continue
+                content_start = self._content_start[key] = base + line_end + 1
+            end_idx = window.find(end_marker.lower(), max(0, content_start - base))
+            if end_idx != -1:
+                self._end[key] = base + end_idx
+
+        completed = []
+        while self._next < len(ADVICE_SECTIONS):
+            key = ADVICE_SECTIONS[self._next][0]
+            if key not in self._end:
+                break
+            content = self._slice(self._content_start[key], self._end[key]).strip()
+            completed.append((key, format_text_section(content or "Information not available")))
+            self._next += 1
+        return completed
+
+    def _slice(self, start, end):
+        first = bisect_right(self._offsets, start) - 1
+        last = bisect_left(self._offsets, end)
+        joined = ''.join(self._chunks[first:last])
+        return joined[start - self._offsets[first]:end - self._offsets[first]]
+
 def format_section(text):
     """Format a section's content into clean HTML with bullet points"""
     if not text or text == "Information not available":
@@ -350,6 +584,16 @@ def format_section(text):
 
 def get_personalized_default_advice(risk_level, age, is_postmenopausal, marker_levels):
     """Generate personalized default advice based on risk factors"""
+    entry = FALLBACK_ADVICE_TABLE.get((risk_level, age_bracket(age), bool(is_postmenopausal)))
+    if entry is None:
+        return render_default_advice(risk_level, age, is_postmenopausal)
+    # Fresh containers so callers can never mutate the shared table
+    advice = dict(entry)
+    advice['wellness_tips'] = list(entry['wellness_tips'])
+    return advice
+
+def render_default_advice(risk_level, age, is_postmenopausal):
+    """Build the default advice sections from scratch"""
     # Get personalized recommendations for each section
     diet_recs = generate_personalized_dietary_advice(risk_level, age, is_postmenopausal)
     exercise_recs = generate_personalized_exercise_advice(risk_level, age)
@@ -361,7 +605,7 @@ def get_personalized_default_advice(risk_level, age, is_postmenopausal, marker_l
     # Generate wellness tips based on risk level and age
     if risk_level == "high":
         wellness_tips = [
-            f"Schedule regular check-ups every {3 if age > 50 else 6} months and maintain a symptom diary",
+            f"Schedule regular check-ups every {3 if age > AGE_HIGHER_RISK else 6} months and maintain a symptom diary",
             "Practice daily stress reduction through meditation, counseling, or relaxation techniques",
             "Build a strong support network and consider joining a support group"
         ]
@@ -395,6 +639,26 @@ def get_personalized_default_advice(risk_level, age, is_postmenopausal, marker_l
         </ul>"""
     }
 
+def age_bracket(age):
+    """Index of the age range the default advice distinguishes: <=50, 51-60, >60"""
+    if age > AGE_SENIOR:
+        return 2
+    if age > AGE_HIGHER_RISK:
+        return 1
+    return 0
+
+def _build_fallback_advice_table():
+    # One representative age per bracket that takes the same branches as every age in it
+    bracket_ages = (AGE_HIGHER_RISK, AGE_SENIOR, AGE_SENIOR + 1)
+    table = {}
+    for risk_level in ("high", "medium", "low"):
+        for bracket, age in enumerate(bracket_ages):
+            for is_postmenopausal in (False, True):
+                advice = render_default_advice(risk_level, age, is_postmenopausal)
+                advice['wellness_tips'] = tuple(advice['wellness_tips'])
+                table[(risk_level, bracket, is_postmenopausal)] = MappingProxyType(advice)
+    return MappingProxyType(table)
+
 def get_default_advice():
     """Provide basic default advice when personalization fails"""
     return get_personalized_default_advice("medium", 45, False, {})
@@ -404,10 +668,10 @@ def get_risk_factor_list(risk_level, age, is_postmenopausal):
     factors = []
     
     # Age-related factors
-    if age > 60:
+    if age > AGE_SENIOR:
         factors.append("Age is a significant risk factor (risk increases with age)")
         factors.append("Post-60 age group requires more frequent monitoring")
-    elif age > 50:
+    elif age > AGE_HIGHER_RISK:
         factors.append("Age is approaching higher risk category (increased vigilance recommended)")
         factors.append("Consider more frequent screenings")
     
@@ -515,3 +779,7 @@ def extract_wellness_tips(wellness_text):
     except Exception as e:
         logger.error(f"Error extracting wellness tips: {str(e)}")
         return get_default_advice()['wellness_tips']
+
+# Every rendered fallback, keyed by (risk level, age bracket, post-menopausal).
+# The fallback is served most when the LLM is slow or down, so it is built once at import.
+FALLBACK_ADVICE_TABLE = _build_fallback_advice_table()
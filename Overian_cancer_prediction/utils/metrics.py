@@ -0,0 +1,269 @@
+"""In-process counters and histograms, exported in the Prometheus text format.
+
+Modules declare their metrics at import time:
+    PREDICT_STAGE_SECONDS = histogram('ovarian_predict_stage_seconds', "...", ['stage'])
+    PREDICT_STAGE_SECONDS.labels('predict').observe(elapsed)
+Recording is a dict lookup, a bisect and a few additions under a per-metric
+lock, cheap enough to leave on for every request. Values owned elsewhere
+(cache statistics, queue depths) are read at scrape time by collectors.
+Each process keeps its own numbers; with several workers every worker is
+scraped, or summed, separately.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from config import METRICS_ENABLED
+
+# Seconds; spans a sub-millisecond prediction up to a slow LLM completion
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """The series for these label values, created on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        if METRICS_ENABLED:
+            with self._lock:
+                self.value += amount
+
+class Counter(_Metric):
+    """Monotonic count; by convention the name ends in _total"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot: above the highest bound
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager that observes the seconds spent in its block"""
+        return _Timer(self)
+
+class Histogram(_Metric):
+    """Distribution over fixed buckets; rendered cumulatively as Prometheus expects"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self._lock)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, values, child):
+        with self._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Stopwatch:
+    """Observes consecutive stages of one operation into a histogram labelled by stage.
+
+    stages = Stopwatch(PREDICT_STAGE_SECONDS)
+    ...; stages.lap('parse_form')   # time since the stopwatch started
+    ...; stages.lap('predict')      # time since the previous lap
+    """
+    __slots__ = ('histogram', 'last')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.histogram.labels(stage).observe(now - self.last)
+        self.last = now
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = [self._collect_caches]
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, or return the one already registered under its name"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def register_cache(self, name, stats):
+        """Expose a cache's stats() dict (hits, misses, entries, ...) as ovarian_cache_* series"""
+        with self._lock:
+            self._caches[name] = stats
+
+    def add_collector(self, collect):
+        """collect() returns [(name, kind, help, [(labels dict, value), ...]), ...] at scrape time"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collect in list(self._collectors):
+            try:
+                families = collect()
+            except Exception as e:  # A broken collector must not take the endpoint down
+                lines.append(f"# collector {getattr(collect, '__qualname__', collect)} failed: {_escape(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels, labels.values())} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _collect_caches(self):
+        stats = {}
+        for name, get_stats in list(self._caches.items()):
+            cache_stats = get_stats()
+            if cache_stats is not None:
+                stats[name] = cache_stats
+        families = []
+        for key, kind, documentation in CACHE_FAMILIES:
+            samples = [({'cache': name}, s[key]) for name, s in sorted(stats.items()) if key in s]
+            if samples:
+                suffix = '_total' if kind == 'counter' else ''
+                families.append((f"ovarian_cache_{key}{suffix}", kind, documentation, samples))
+        return families
+
+# stats() keys exported for every registered cache
+CACHE_FAMILIES = [
+    ('hits', 'counter', "Cache lookups answered from the cache"),
+    ('misses', 'counter', "Cache lookups that had to compute the value"),
+    ('coalesced', 'counter', "Misses that waited on an identical in-flight computation"),
+    ('evictions', 'counter', "Entries evicted to stay within the size limits"),
+    ('expirations', 'counter', "Entries dropped after their TTL"),
+    ('invalidations', 'counter', "Times the cache was emptied because its source changed"),
+    ('entries', 'gauge', "Entries currently cached"),
+    ('bytes', 'gauge', "Approximate bytes currently cached"),
+    ('hit_ratio', 'gauge', "hits / (hits + misses) since the process started"),
+]
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_metrics():
+    """Process-wide metrics registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = MetricsRegistry()
+                registry.add_collector(_process_collector)
+                _registry = registry
+    return _registry
+
+def counter(name, documentation, labelnames=()):
+    return get_metrics().register(Counter(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return get_metrics().register(Histogram(name, documentation, labelnames, buckets))
+
+_START_TIME = time.time()
+
+def _process_collector():
+    return [('ovarian_process_start_time_seconds', 'gauge', "Unix time the process started",
+             [({}, _START_TIME)])]
@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from config import MODEL_CHECK_INTERVAL, MODEL_SHA256
+from .metrics import counter, histogram
+from .tracing import span
+from .model_utils import REQUIRED_FEATURES, find_model_path, load_model_file, load_model_metadata
+
+logger = logging.getLogger(__name__)
+
+MODEL_LOAD_SECONDS = histogram('ovarian_model_load_seconds', "Time to hash and deserialize a model artifact")
+MODEL_LOADS = counter('ovarian_model_loads_total', "Artifact loads by outcome: loaded, swapped or failed", ['outcome'])
+
+# Immutable handle for one loaded artifact. Requests grab a handle once and keep
+# using it, so a reload never changes the model underneath an in-flight request.
+ModelVersion = namedtuple('ModelVersion', [
+    'version', 'model', 'columns', 'path', 'sha256', 'loaded_at', 'metadata'
+])
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the hex SHA-256 digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def expected_sha256(path):
+    """MODEL_SHA256 if set, else the digest the artifact's metadata records, else None"""
+    if MODEL_SHA256:
+        return MODEL_SHA256.lower()
+    metadata = load_model_metadata(path)
+    return (metadata or {}).get('artifacts', {}).get(os.path.basename(path))
+
+def _check_sha256(path, sha256):
+    expected = expected_sha256(path)
+    if expected and sha256 != expected:
+        raise ValueError(f"{path} has sha256 {sha256}, expected {expected}")
+
+def _stat_key(path):
+    """Cheap change signature: path, modification time and size"""
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+class ModelRegistry:
+    """Keeps the active model in memory and swaps it when the artifact changes"""
+
+    def __init__(self, models_dir=None, check_interval=MODEL_CHECK_INTERVAL):
+        self.models_dir = models_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._active = None
+        self._stat = None
+        self._last_check = 0.0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(handle) after every swap to a new version (not on the first load)"""
+        self._listeners.append(callback)
+
+    def current(self):
+        """Return the active ModelVersion, picking up a changed artifact first if due"""
+        active = self._active
+        if active is None:
+            return self.refresh()
+
+        if time.monotonic() - self._last_check >= self.check_interval:
+            # Only one thread checks; everyone else keeps serving the active version
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._refresh_locked(force=False)
+                finally:
+                    self._lock.release()
+        return self._active
+
+    def refresh(self, force=False):
+        """Check the artifact and reload it if it changed (or unconditionally with force)"""
+        with self._lock:
+            return self._refresh_locked(force)
+
+    def verify(self):
+        """Check the artifact that would be served without loading it; returns its sha256 or raises.
+
+        Finds the file, rejects an empty one and compares its digest with
+        expected_sha256(), so a lazily loaded model still fails at startup
+        when it is missing, truncated or not the artifact that was deployed.
+        """
+        path = find_model_path(self.models_dir)
+        if os.path.getsize(path) == 0:
+            raise ValueError(f"{path} is empty")
+        sha256 = file_sha256(path)
+        _check_sha256(path, sha256)
+        return sha256
+
+    def _refresh_locked(self, force):
+        self._last_check = time.monotonic()
+        try:
+            path = find_model_path(self.models_dir)
+            stat = _stat_key(path)
+            active = self._active
+
+            if not force and active is not None and stat == self._stat:
+                return active
+
+            # mtime/size moved: only reload when the content actually differs
+            load_start = time.perf_counter()
+            sha256 = file_sha256(path)
+            if not force and active is not None and sha256 == active.sha256:
+                self._stat = stat
+                return active
+
+            _check_sha256(path, sha256)
+            with span('model.load', path=os.path.basename(path), sha256=sha256[:12]):
+                model = load_model_file(path)
+            # Versioned artifacts record the feature order they were trained with
+            metadata = load_model_metadata(path)
+            handle = ModelVersion(
+                version=sha256[:12],
+                model=model,
+                columns=list(metadata['features']) if metadata else list(REQUIRED_FEATURES),
+                path=path,
+                sha256=sha256,
+                loaded_at=datetime.now(timezone.utc),
+                metadata=metadata
+            )
+            self._active = handle  # Atomic reference swap
+            self._stat = stat
+            MODEL_LOAD_SECONDS.observe(time.perf_counter() - load_start)
+            MODEL_LOADS.labels('loaded' if active is None else 'swapped').inc()
+            if active is None:
+                logger.info(f"Loaded model version {handle.version} from {path}")
+            else:
+                logger.info(f"Swapped model version {active.version} -> {handle.version}")
+                self._notify(handle)
+            return handle
+        except Exception as e:
+            MODEL_LOADS.labels('failed').inc()
+            if self._active is not None:
+                logger.error(f"Model reload failed, keeping version {self._active.version}: {str(e)}")
+            else:
+                logger.error(f"Error loading model: {str(e)}")
+            return self._active
+
+    def _notify(self, handle):
+        for callback in self._listeners:
+            try:
+                callback(handle)
+            except Exception as e:
+                # The swap already happened; a broken listener must not undo it
+                logger.error(f"Model swap listener failed: {str(e)}")
+
+    def describe(self):
+        """Summary of the active version for admin endpoints and logs"""
+        active = self._active
+        if active is None:
+            return {'loaded': False}
+        return {
+            'loaded': True,
+            'version': active.version,
+            'path': active.path,
+            'sha256': active.sha256,
+            'loaded_at': active.loaded_at.isoformat(),
+            'features': active.columns,
+            'training': _training_summary(active.metadata)
+        }
+
+def _training_summary(metadata):
+    if not metadata:
+        return None
+    return {
+        'artifact_version': metadata['version'],
+        'trained_at': metadata['trained_at'],
+        'params': metadata['params'],
+        'cv_roc_auc': metadata['cv']['metrics']['roc_auc']['mean'],
+        'data_sha256': metadata['data']['sha256']
+    }
+
+def main(argv=None):
+    """Print the artifact that would be served, or ask a running app to reload it.
+
+    Usage:
+        python -m utils.model_registry
+        python -m utils.model_registry --reload http://127.0.0.1:5000
+    """
+    import argparse
+    from config import ADMIN_TOKEN
+
+    parser = argparse.ArgumentParser(description="Inspect or hot-reload the served model")
+    parser.add_argument('--reload', metavar='APP_URL',
+                        help="Base URL of a running app whose registry should reload")
+    parser.add_argument('--force', action='store_true',
+                        help="Reload even if the artifact is unchanged")
+    args = parser.parse_args(argv)
+
+    if args.reload:
+        import requests
+        response = requests.post(
+            args.reload.rstrip('/') + '/admin/reload-model',
+            headers={'X-Admin-Token': ADMIN_TOKEN or ''},
+            params={'force': '1'} if args.force else None,
+            timeout=30
+        )
+        print(response.text)
+        return 0 if response.ok else 1
+
+    path = find_model_path()
+    print(f"path:   {path}")
+    print(f"sha256: {file_sha256(path)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
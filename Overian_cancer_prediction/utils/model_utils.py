@@ -1,7 +1,9 @@
+import json
 import os
-import joblib
-import pandas as pd
+import threading
+import numpy as np
 import logging
+from config import MODEL_DIR, MODEL_BACKEND
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +12,25 @@ REQUIRED_FEATURES = [
     'ALP', 'CA19-9', 'HE4', 'CEA', 'CA125', 'Ca'
 ]
 
+# Map form fields to model features
+FORM_TO_MODEL = {
+    'age': 'Age',
+    'menopause': 'Menopause',
+    'ggt': 'GGT',
+    'hgb': 'HGB',
+    'afp': 'AFP',
+    'ca72_4': 'CA72-4',
+    'alp': 'ALP',
+    'ca19_9': 'CA19-9',
+    'he4': 'HE4',
+    'cea': 'CEA',
+    'ca125': 'CA125',
+    'ca': 'Ca'
+}
+
+# Per-thread preallocated row buffers for the single-row fast path
+_row_buffers = threading.local()
+
 def get_default_input():
     """Return only required features with default values"""
     all_defaults = {
@@ -19,23 +40,68 @@ def get_default_input():
     }
     return all_defaults
 
-def load_models():
-    try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        models_dir = os.path.join(base_dir, 'models')
+def get_models_dir():
+    """Return the directory that holds the serialized model artifacts"""
+    if MODEL_DIR:
+        return os.path.abspath(MODEL_DIR)
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_dir, 'models')
+
+# Artifact extension served by each MODEL_BACKEND
+BACKEND_EXTENSIONS = {
+    'xgboost': '.pkl',
+    'numpy': '.npz'  # Compiled by utils.tree_compiler; no xgboost import at serve time
+}
+
+# Versioned artifacts written by utils.training: <prefix>-v<UTC timestamp>.<ext> plus a .json sidecar
+ARTIFACT_PREFIX = 'xgboost_model'
+
+def metadata_path(model_path):
+    """Path of the metadata sidecar for a model artifact"""
+    return os.path.splitext(model_path)[0] + '.json'
+
+def load_model_metadata(model_path):
+    """Training metadata for an artifact, or None for unversioned artifacts"""
+    path = metadata_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def find_model_path(models_dir=None, backend=None):
+    """Locate the model artifact to serve from the models directory"""
+    models_dir = models_dir or get_models_dir()
+    extension = BACKEND_EXTENSIONS[backend or MODEL_BACKEND]
+
+    # Check if the model file exists
+    if not os.path.exists(models_dir):
+        raise FileNotFoundError(f"Models directory not found at {models_dir}")
         
-        # Check if the model file exists
-        if not os.path.exists(models_dir):
-            raise FileNotFoundError(f"Models directory not found at {models_dir}")
-            
-        model_files = [f for f in os.listdir(models_dir) if f.endswith('.pkl')]
-        if not model_files:
-            raise FileNotFoundError(f"No .pkl model files found in {models_dir}")
-            
-        model_path = os.path.join(models_dir, model_files[0])  # Take the first .pkl file found
-        logger.info(f"Loading model from {model_path}")
+    model_files = sorted(f for f in os.listdir(models_dir) if f.endswith(extension))
+    if not model_files:
+        raise FileNotFoundError(f"No {extension} model files found in {models_dir}")
+
+    # Prefer the newest versioned artifact; timestamped names sort chronologically
+    versioned = [f for f in model_files
+                 if f.startswith(ARTIFACT_PREFIX + '-v')
+                 and os.path.exists(metadata_path(os.path.join(models_dir, f)))]
+    if versioned:
+        return os.path.join(models_dir, versioned[-1])
         
-        model = joblib.load(model_path)
+    return os.path.join(models_dir, model_files[0])  # Take the first matching file found
+
+def load_model_file(model_path):
+    """Load a single model artifact: pickled estimator or compiled tree arrays"""
+    logger.info(f"Loading model from {model_path}")
+    if model_path.endswith('.npz'):
+        from .tree_compiler import load_compiled
+        return load_compiled(model_path)
+    import joblib  # Imported on first load; unpickling also pulls in xgboost and sklearn
+    return joblib.load(model_path)
+
+def load_models():
+    try:
+        model = load_model_file(find_model_path())
         columns = REQUIRED_FEATURES  # Use only required features
         logger.info("Model loaded successfully")
         return model, columns
@@ -44,6 +110,7 @@ def load_models():
         return None, None
 
 def predict_tabular(model, columns, input_data):
+    import pandas as pd  # Only this reference path needs pandas; the serving paths use numpy
     try:
         # Validate inputs
         if model is None:
@@ -82,3 +149,99 @@ def predict_tabular(model, columns, input_data):
         logger.error(f"Input data keys: {list(input_data.keys())}")
         logger.error(f"Expected columns: {columns}")
         return None
+
+def _row_buffer(n_features):
+    buf = getattr(_row_buffers, 'buf', None)
+    if buf is None or buf.shape[1] != n_features:
+        buf = np.empty((1, n_features), dtype=np.float32)
+        _row_buffers.buf = buf
+    return buf
+
+def predict_proba_rows(model, matrix):
+    """Positive-class probabilities for a float32 matrix with one booster call"""
+    get_booster = getattr(model, 'get_booster', None)
+    if get_booster is None:
+        return model.predict_proba(matrix)[:, 1]
+
+    # Honour early stopping the same way XGBClassifier.predict_proba does
+    best_iteration = getattr(model, 'best_iteration', None)
+    iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+    return get_booster().inplace_predict(matrix, iteration_range=iteration_range)
+
+def predict_tabular_fast(model, columns, input_data):
+    """Low-latency single-row prediction without pandas.
+
+    Writes the features straight into a preallocated float32 row in column
+    order, runs the booster once and derives the class from the probability.
+    Returns the same dict as predict_tabular, or None on error.
+    """
+    try:
+        if model is None:
+            raise ValueError("Model is not loaded")
+        if not columns:
+            raise ValueError("No feature columns provided")
+        if not isinstance(input_data, dict):
+            raise ValueError("Input data must be a dictionary")
+
+        defaults = get_default_input()
+        row = _row_buffer(len(columns))
+        values = row[0]
+        for j, column in enumerate(columns):
+            values[j] = input_data.get(column, defaults[column])
+
+        probability = float(predict_proba_rows(model, row)[0])
+        return {
+            'prediction': int(probability > 0.5),
+            'probability': probability
+        }
+    except Exception as e:
+        logger.error(f"Prediction error: {str(e)}")
+        logger.error(f"Input data keys: {list(input_data.keys()) if isinstance(input_data, dict) else None}")
+        logger.error(f"Expected columns: {columns}")
+        return None
+
+def _to_float(value, default):
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+def build_feature_matrix(columns, records):
+    """Build a contiguous float32 matrix in column order, filling gaps with defaults"""
+    defaults = get_default_input()
+    matrix = np.empty((len(records), len(columns)), dtype=np.float32)
+    for j, column in enumerate(columns):
+        default = defaults[column]
+        matrix[:, j] = [_to_float(record.get(column), default) for record in records]
+    return matrix
+
+def predict_tabular_batch(model, columns, records):
+    """Score many panels with a single booster call.
+
+    records is a sequence of dicts keyed by model feature name. Returns a dict
+    of 'prediction' and 'probability' arrays in input order, or None on error.
+    """
+    try:
+        if model is None:
+            raise ValueError("Model is not loaded")
+        if not columns:
+            raise ValueError("No feature columns provided")
+        if any(not isinstance(record, dict) for record in records):
+            raise ValueError("Each record must be a dictionary")
+
+        matrix = build_feature_matrix(columns, records)
+        logger.info(f"Batch feature shape: {matrix.shape}, Expected features: {len(columns)}")
+
+        if len(records) == 0:
+            probability = np.empty(0, dtype=np.float64)
+        else:
+            probability = np.asarray(predict_proba_rows(model, matrix), dtype=np.float64)
+        return {
+            'prediction': (probability > 0.5).astype(np.int8),
+            'probability': probability
+        }
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        return None
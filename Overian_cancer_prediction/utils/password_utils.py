@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from config import BCRYPT_ROUNDS, BCRYPT_WORKERS, BCRYPT_EXECUTOR, BCRYPT_MAX_PENDING, BCRYPT_TIMEOUT
+from .metrics import counter, histogram
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_SECONDS = histogram('ovarian_password_hash_seconds',
+                                  "bcrypt hash/check time including the wait for a pool slot", ['operation'])
+PASSWORD_HASHER_BUSY = counter('ovarian_password_hasher_busy_total', "Hashes refused because the queue was full")
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many hashes are already queued"""
+
+# bcrypt is imported inside the workers, so importing this module stays cheap
+def _hashpw(password, rounds):
+    import bcrypt
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _checkpw(password, password_hash):
+    import bcrypt
+    return bcrypt.checkpw(password, password_hash)
+
+def hash_rounds(password_hash):
+    """Work factor of a stored bcrypt hash ('$2b$12$...' -> 12), or None if unparseable"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt on a size-limited pool so login bursts cannot occupy every request worker.
+
+    At most `workers` hashes run at once; up to `max_pending` more wait their
+    turn, and beyond that callers get PasswordHasherBusy instead of queueing
+    without bound.
+    """
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=BCRYPT_WORKERS, executor=BCRYPT_EXECUTOR,
+                 max_pending=BCRYPT_MAX_PENDING, timeout=BCRYPT_TIMEOUT):
+        self.rounds = rounds
+        self.timeout = timeout
+        if executor == 'process':
+            from concurrent.futures import ProcessPoolExecutor  # Pulls in multiprocessing; only when asked for
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def hash(self, password):
+        """Hash a password at the configured cost"""
+        return self._run('hash', _hashpw, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def check(self, password, password_hash):
+        """Check a password against a stored hash"""
+        return self._run('check', _checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made at a different cost than the current policy"""
+        return hash_rounds(password_hash) != self.rounds
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASHER_BUSY.inc()
+            raise PasswordHasherBusy("Password hashing queue is full")
+        start = time.perf_counter()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the hash itself finishes, not until the caller stops
+        # waiting, so hashes abandoned on timeout still count against the bound
+        future.add_done_callback(lambda done: self._release(operation, start, done))
+        with span(f'bcrypt.{operation}', rounds=self.rounds):
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()  # Only succeeds while it is still queued; a running hash finishes
+                raise
+
+    def _release(self, operation, start, future):
+        self._slots.release()
+        if not future.cancelled():
+            PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+def get_password_hasher():
+    """Process-wide password hasher, created on first use"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
@@ -0,0 +1,142 @@
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import PREDICTION_CACHE_ENABLED, PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_MAX_BYTES
+from .metrics import get_metrics
+from .model_utils import get_default_input
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-entry cost beyond the key bytes: OrderedDict slot, tuples, floats
+ENTRY_OVERHEAD = 200
+
+def prediction_cache_key(columns, input_data, version):
+    """The model version plus the exact float32 row the booster would score.
+
+    Missing fields are filled from get_default_input() as predict_tabular_fast
+    does, so a defaults-only panel and one that types in the same defaults
+    share an entry. -0.0 and every NaN payload are folded to one spelling.
+    """
+    defaults = get_default_input()
+    row = np.array([input_data.get(column, defaults[column]) for column in columns], dtype=np.float32)
+    row += np.float32(0.0)  # -0.0 + 0.0 == +0.0
+    row[np.isnan(row)] = np.nan
+    return version, row.tobytes()
+
+class PredictionCache:
+    """Bounded LRU of model outputs for the active model version, emptied when it is replaced"""
+
+    def __init__(self, max_entries=PREDICTION_CACHE_MAX_ENTRIES, max_bytes=PREDICTION_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (size, prediction, probability)
+        self._bytes = 0
+        self._version = None
+        self._retired = set()  # Versions replaced by a reload; small, one per swap
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """The cached {'prediction', 'probability'} for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return {'prediction': entry[1], 'probability': entry[2]}
+
+    def set(self, key, result):
+        size = sys.getsizeof(key[1]) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key[0] in self._retired:
+                return  # A request still pinned to a replaced model; its result is of no use
+            if key[0] != self._version:
+                self._invalidate_locked(key[0])
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[0]
+            self._entries[key] = (size, result['prediction'], result['probability'])
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][0]
+                self.evictions += 1
+
+    def invalidate(self, version):
+        """Drop every entry as version becomes the active model; the registry calls this on swap"""
+        with self._lock:
+            if version != self._version:
+                self._invalidate_locked(version)
+
+    def _invalidate_locked(self, version):
+        if self._version is not None:
+            self._retired.add(self._version)
+        self._retired.discard(version)  # Rolled back to an earlier artifact
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+        self._version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+_prediction_cache = None
+_prediction_cache_lock = threading.Lock()
+
+def get_prediction_cache():
+    """Process-wide prediction cache, or None when caching is disabled"""
+    global _prediction_cache
+    if not PREDICTION_CACHE_ENABLED:
+        return None
+    if _prediction_cache is None:
+        with _prediction_cache_lock:
+            if _prediction_cache is None:
+                _prediction_cache = PredictionCache()
+    return _prediction_cache
+
+def predict_with_cache(model_version, input_data, predict):
+    """predict(model, columns, input_data) behind the cache for the pinned model version"""
+    cache = get_prediction_cache()
+    if cache is None:
+        return predict(model_version.model, model_version.columns, input_data)
+    try:
+        key = prediction_cache_key(model_version.columns, input_data, model_version.version)
+    except (KeyError, TypeError, ValueError):
+        key = None  # Unexpected input: let predict() report it
+    result = cache.get(key) if key is not None else None
+    current_span().set('cache', 'hit' if result is not None else 'miss')
+    if result is not None:
+        return result
+    result = predict(model_version.model, model_version.columns, input_data)
+    if result is not None and key is not None:
+        cache.set(key, result)
+    return result
+
+# Scraped only once the cache exists; a disabled cache reports nothing
+get_metrics().register_cache('prediction', lambda: _prediction_cache.stats() if _prediction_cache is not None else None)
@@ -0,0 +1,291 @@
+"""On-demand statistical profiling of live requests, written as collapsed stacks.
+
+A request is profiled when it sends `PROFILE_HEADER: <PROFILE_TOKEN>` (the
+admin token when no profile token is set) or, at random, for a
+PROFILE_SAMPLE_RATE share of traffic. While it runs, one sampler thread
+reads the request thread's stack every PROFILE_INTERVAL_MS and counts each
+distinct stack. Nothing is traced or hooked in between samples, so the
+profiled request runs at full speed apart from the sampler taking the GIL.
+CPU-bound Python code only hands over the GIL every sys.getswitchinterval()
+(5ms by default), so intervals shorter than that gain little.
+
+Overhead is bounded three ways: the sampler sleeps long enough that its own
+CPU time stays under PROFILE_MAX_OVERHEAD of wall time, at most
+PROFILE_MAX_CONCURRENT requests are profiled at once, and sampling of a
+request stops after PROFILE_MAX_SAMPLES.
+
+Each profile is written to PROFILE_DIR as <time>-<route>-<trace id>.folded in
+the collapsed format read by flamegraph.pl and speedscope:
+    POST /predict_lab;dispatch_request (flask/app.py:865);predict_lab (app.py:117);... 12
+The first line is a `#` comment with the route, trace id, duration and
+sampler overhead. Only the newest PROFILE_MAX_FILES files are kept.
+
+Usage (from the application directory):
+    python -m utils.profiling list                          recent profiles
+    python -m utils.profiling top [--route R] [--limit 25]   hottest functions across profiles
+    python -m utils.profiling merge [--route R] > out.folded one file for flamegraph.pl
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import (ADMIN_TOKEN, PROFILING_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_TOKEN, PROFILE_INTERVAL_MS,
+                    PROFILE_MAX_OVERHEAD, PROFILE_MAX_CONCURRENT, PROFILE_MAX_SAMPLES, PROFILE_DIR, PROFILE_MAX_FILES)
+from .metrics import counter
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_DEPTH = 128  # Deeper stacks keep their innermost frames
+PROFILES = counter('ovarian_profiles_total', "Request profiles by outcome: written, busy (concurrency cap) or error",
+                   ['outcome'])
+
+def should_profile(header_value):
+    """True for a valid profile token in the header, otherwise a PROFILE_SAMPLE_RATE coin flip"""
+    if not PROFILING_ENABLED:
+        return False
+    token = PROFILE_TOKEN or ADMIN_TOKEN
+    if header_value and token and hmac.compare_digest(header_value.encode(), token.encode()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+class Profile:
+    """Stack counts for one thread between start() and finish()"""
+
+    def __init__(self, thread_id, route, trace_id):
+        self.thread_id = thread_id
+        self.route = route
+        self.trace_id = trace_id
+        self.stacks = Counter()
+        self.samples = 0
+        self.truncated = False
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration = None
+
+    def to_folded(self, sampler_cpu, interval):
+        meta = {
+            'route': self.route,
+            'trace_id': self.trace_id,
+            'started_at': round(self.started_at, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+            'samples': self.samples,
+            'interval_ms': round(interval * 1000, 3),
+            'sampler_cpu_ms': round(sampler_cpu * 1000, 3),
+            'truncated': self.truncated,
+        }
+        lines = [f"# {json.dumps(meta)}"]
+        lines.extend(f"{self.route};{stack} {count}" for stack, count in self.stacks.most_common())
+        return '\n'.join(lines) + '\n'
+
+class SamplingProfiler:
+    """One sampler thread shared by all profiled requests; it only runs while some are active"""
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000, max_overhead=PROFILE_MAX_OVERHEAD,
+                 max_concurrent=PROFILE_MAX_CONCURRENT, max_samples=PROFILE_MAX_SAMPLES,
+                 directory=None, max_files=PROFILE_MAX_FILES):
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.max_concurrent = max_concurrent
+        self.max_samples = max_samples
+        self.directory = directory or default_profile_dir()
+        self.max_files = max_files
+        self.effective_interval = interval  # Widened when sampling would exceed max_overhead
+        self._active = {}
+        self._cpu = {}  # Sampler CPU seconds charged to each active profile
+        self._labels = {}  # Code object -> frame label
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self, route, trace_id=None):
+        """Begin sampling the calling thread; returns a Profile, or None at the concurrency cap"""
+        thread_id = threading.get_ident()
+        with self._cond:
+            if len(self._active) >= self.max_concurrent or thread_id in self._active:
+                PROFILES.labels('busy').inc()
+                return None
+            profile = Profile(thread_id, route, trace_id)
+            self._active[thread_id] = profile
+            self._cpu[thread_id] = 0.0
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sampler, name='request-profiler', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return profile
+
+    def finish(self, profile):
+        """Stop sampling and write the profile; returns the file path or None"""
+        with self._cond:
+            self._active.pop(profile.thread_id, None)
+            sampler_cpu = self._cpu.pop(profile.thread_id, 0.0)
+        profile.duration = time.perf_counter() - profile.started
+        try:
+            path = self._write(profile, sampler_cpu)
+        except Exception as e:
+            PROFILES.labels('error').inc()
+            logger.error(f"Profile write error: {str(e)}")
+            return None
+        PROFILES.labels('written').inc()
+        return path
+
+    def _sampler(self):
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+                active = list(self._active.values())
+            cpu_start = time.thread_time()
+            frames = sys._current_frames()
+            for profile in active:
+                frame = frames.get(profile.thread_id)
+                if frame is None:
+                    continue
+                if profile.samples >= self.max_samples:
+                    profile.truncated = True
+                    continue
+                profile.stacks[self._collapse(frame)] += 1
+                profile.samples += 1
+            del frames
+            work = time.thread_time() - cpu_start
+            with self._cond:
+                for profile in active:
+                    if self._active.get(profile.thread_id) is profile:
+                        self._cpu[profile.thread_id] += work / len(active)
+            # Sleep long enough that sampling stays under max_overhead of wall time
+            interval = max(self.interval, work * (1 - self.max_overhead) / self.max_overhead)
+            self.effective_interval = interval
+            time.sleep(interval)
+
+    def _collapse(self, frame):
+        labels = []
+        while frame is not None and len(labels) < MAX_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels.setdefault(code, f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+            labels.append(label)
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def _write(self, profile, sampler_cpu):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(profile.started_at))
+        name = f"{stamp}{int(profile.started_at * 1000) % 1000:03d}-{_slug(profile.route)}-{profile.trace_id or 'untraced'}.folded"
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profile.to_folded(sampler_cpu, self.effective_interval))
+        self._prune()
+        return path
+
+    def _prune(self):
+        # Names start with the timestamp, so sorting puts the oldest first
+        files = sorted(f for f in os.listdir(self.directory) if f.endswith('.folded'))
+        for name in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+def _short_path(filename):
+    """Paths relative to the app, or to site-packages for libraries"""
+    if filename.startswith(APP_DIR):
+        return os.path.relpath(filename, APP_DIR)
+    marker = filename.rfind('-packages' + os.sep)
+    if marker != -1:
+        return filename[marker + len('-packages' + os.sep):]
+    return os.path.basename(filename)
+
+def _slug(route):
+    return re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+
+def default_profile_dir():
+    return os.path.abspath(PROFILE_DIR) if PROFILE_DIR else os.path.join(APP_DIR, 'logs', 'profiles')
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+def get_profiler():
+    """Process-wide sampling profiler"""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SamplingProfiler()
+    return _profiler
+
+def read_profiles(directory=None, route=None):
+    """Yield (meta, stacks Counter) for each profile file, oldest first"""
+    directory = directory or default_profile_dir()
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.folded'):
+            continue
+        meta, stacks = {'file': name}, Counter()
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('#'):
+                    meta.update(json.loads(line[1:]))
+                elif line.strip():
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    stacks[stack] += int(count)
+        if route is None or meta.get('route') == route:
+            yield meta, stacks
+
+def hottest(stacks, limit):
+    """(self samples, total samples, frame) for the frames with the most self samples"""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [(count, total[frame], frame) for frame, count in own.most_common(limit)]
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect request profiles")
+    parser.add_argument('--dir', help="Profile directory (default: PROFILE_DIR)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="Recent profiles")
+    top = commands.add_parser('top', help="Hottest functions across profiles")
+    top.add_argument('--route', help="Only this route, e.g. 'POST /predict_lab'")
+    top.add_argument('--limit', type=int, default=25)
+    merge = commands.add_parser('merge', help="Concatenate profiles into one collapsed-stack file")
+    merge.add_argument('--route')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        print(f"{'file':<72} {'ms':>9} {'samples':>8} {'sampler ms':>11}")
+        for meta, _ in read_profiles(args.dir):
+            print(f"{meta['file']:<72} {meta.get('duration_ms', 0):>9.1f} {meta.get('samples', 0):>8} "
+                  f"{meta.get('sampler_cpu_ms', 0):>11.2f}{'  truncated' if meta.get('truncated') else ''}")
+        return 0
+
+    merged, profiles = Counter(), 0
+    for _, stacks in read_profiles(args.dir, getattr(args, 'route', None)):
+        merged.update(stacks)
+        profiles += 1
+    if args.command == 'merge':
+        for stack, count in merged.most_common():
+            print(f"{stack} {count}")
+        return 0
+
+    samples = sum(merged.values())
+    print(f"{profiles} profiles, {samples} samples")
+    if samples:
+        print(f"{'self %':>7} {'total %':>8}  function")
+        for own, total, frame in hottest(merged, args.limit):
+            print(f"{own * 100 / samples:>7.1f} {total * 100 / samples:>8.1f}  {frame}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
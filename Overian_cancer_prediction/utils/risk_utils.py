@@ -0,0 +1,108 @@
+import numpy as np
+
+# Probability cut-offs shared by the result page and the batch API
+HIGH_RISK_THRESHOLD = 0.7
+MEDIUM_RISK_THRESHOLD = 0.3
+MAX_PROBABILITY = 0.95
+
+def calculate_risk_adjustment(family_history, smoking_status, alcohol_consumption):
+    """Calculate additional risk percentage based on lifestyle and history factors with scientific evidence"""
+    additional_risk = 0.0
+    risk_details = []
+
+    # Family history risk (10-15% of ovarian cancers are hereditary)
+    if family_history == 1:  # First-degree relative
+        additional_risk += 0.10  # Reduced from 0.15 to 0.10 for more balanced assessment
+        risk_details.append({
+            'factor': 'Family History (First-degree relative)',
+            'increase': '10%',
+            'details': 'Having a first-degree relative with ovarian cancer increases risk.'
+        })
+    elif family_history == 2:  # Multiple relatives
+        additional_risk += 0.15  # Reduced from 0.25 to 0.15 for more balanced assessment
+        risk_details.append({
+            'factor': 'Family History (Multiple relatives)',
+            'increase': '15%',
+            'details': 'Multiple family members with ovarian cancer indicates increased risk.'
+        })
+
+    # Smoking risk (1.2-1.8x higher for mucinous type)
+    if smoking_status == 2:  # Current smoker
+        additional_risk += 0.05  # Reduced from 0.08 to 0.05
+        risk_details.append({
+            'factor': 'Current Smoker',
+            'increase': '5%',
+            'details': 'Smoking may increase risk, particularly for mucinous ovarian cancer.'
+        })
+    elif smoking_status == 1:  # Former smoker
+        additional_risk += 0.02  # Reduced from 0.04 to 0.02
+        risk_details.append({
+            'factor': 'Former Smoker',
+            'increase': '2%',
+            'details': 'Former smoking status carries a slightly increased risk.'
+        })
+
+    # Alcohol consumption (minimal evidence for increased risk)
+    if alcohol_consumption >= 3:  # Heavy drinking
+        additional_risk += 0.02  # Reduced from 0.03 to 0.02
+        risk_details.append({
+            'factor': 'Heavy Alcohol Consumption',
+            'increase': '2%',
+            'details': 'Heavy alcohol consumption may slightly increase risk.'
+        })
+
+    return additional_risk, risk_details
+
+def get_risk_level(probability):
+    """Map a probability to the low/medium/high bands used across the app"""
+    return "high" if probability > HIGH_RISK_THRESHOLD else "medium" if probability > MEDIUM_RISK_THRESHOLD else "low"
+
+def adjust_probability(probability, additional_risk):
+    """Scale lifestyle risk by the base probability and cap the result"""
+    return min(MAX_PROBABILITY, probability + additional_risk * probability)
+
+def calculate_risk_adjustment_batch(family_history, smoking_status, alcohol_consumption):
+    """Vectorized calculate_risk_adjustment over equal-length integer arrays.
+
+    Returns an array of additional risk and a list of risk_details per row. The
+    detail lists are built once per distinct factor combination and shared
+    between rows, so treat them as read-only.
+    """
+    family_history = np.asarray(family_history, dtype=np.int64)
+    smoking_status = np.asarray(smoking_status, dtype=np.int64)
+    alcohol_consumption = np.asarray(alcohol_consumption, dtype=np.int64)
+
+    # Collapse to the levels calculate_risk_adjustment actually distinguishes
+    family_code = np.where((family_history == 1) | (family_history == 2), family_history, 0)
+    smoking_code = np.where((smoking_status == 1) | (smoking_status == 2), smoking_status, 0)
+    alcohol_code = np.where(alcohol_consumption >= 3, 3, 0)
+
+    combos = family_code * 100 + smoking_code * 10 + alcohol_code // 3
+    unique_combos, inverse = np.unique(combos, return_inverse=True)
+
+    additional = np.empty(len(unique_combos), dtype=np.float64)
+    details = []
+    for i, combo in enumerate(unique_combos.tolist()):
+        additional[i], combo_details = calculate_risk_adjustment(
+            combo // 100, (combo // 10) % 10, (combo % 10) * 3
+        )
+        details.append(combo_details)
+
+    inverse = inverse.reshape(-1)
+    return additional[inverse], [details[i] for i in inverse.tolist()]
+
+def apply_risk_adjustment_batch(probabilities, family_history, smoking_status, alcohol_consumption):
+    """Adjust an array of base probabilities for lifestyle factors.
+
+    Returns (final_probabilities, risk_levels, risk_details).
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    additional, risk_details = calculate_risk_adjustment_batch(
+        family_history, smoking_status, alcohol_consumption
+    )
+    final = np.minimum(MAX_PROBABILITY, probabilities + additional * probabilities)
+    risk_levels = np.where(
+        final > HIGH_RISK_THRESHOLD, "high",
+        np.where(final > MEDIUM_RISK_THRESHOLD, "medium", "low")
+    )
+    return final, risk_levels.tolist(), risk_details
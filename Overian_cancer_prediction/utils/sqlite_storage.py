@@ -0,0 +1,151 @@
+import logging
+import os
+import queue
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from config import SQLITE_PATH, STORAGE_POOL_SIZE
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'database', 'create_users_table_sqlite.sql')
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(SCHEMA_PATH), 'local.sqlite3')
+
+# Columns stored as 0/1 that callers expect as booleans
+BOOLEAN_COLUMNS = ('email_verified', 'terms_accepted', 'active', 'used')
+
+def to_timestamp(value):
+    """ISO-8601 UTC text with a fixed width, so stored timestamps compare correctly as strings"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec='microseconds')
+
+def _row_dict(row):
+    if row is None:
+        return None
+    data = dict(row)
+    for column in BOOLEAN_COLUMNS:
+        if column in data and data[column] is not None:
+            data[column] = bool(data[column])
+    return data
+
+class SQLiteStorage(Storage):
+    """Local storage on SQLite with a fixed pool of connections.
+
+    Connections are opened once in WAL mode, so readers do not block the
+    writer, and are handed out one per call. The schema in
+    database/create_users_table_sqlite.sql is applied on startup.
+    """
+
+    def __init__(self, path=SQLITE_PATH, pool_size=STORAGE_POOL_SIZE):
+        self.path = path or DEFAULT_DB_PATH
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._open())
+        with open(SCHEMA_PATH, encoding='utf-8') as f:
+            schema = f.read()
+        with self._connection() as conn:
+            conn.executescript(schema)
+
+    def _open(self):
+        # isolation_level=None: transactions are explicit BEGIN/COMMIT in _transaction()
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def insert_user(self, email, password_hash, full_name):
+        with self._transaction() as conn:
+            row = conn.execute(
+                'INSERT INTO users (id, email, password_hash, full_name) VALUES (?, ?, ?, ?) RETURNING *',
+                (str(uuid.uuid4()), email, password_hash, full_name)
+            ).fetchone()
+        return _row_dict(row)
+
+    def get_user_by_email(self, email, columns=None):
+        projection = ', '.join(columns) if columns else '*'
+        with self._connection() as conn:
+            row = conn.execute(f'SELECT {projection} FROM users WHERE email = ?', (email,)).fetchone()
+        return _row_dict(row)
+
+    def update_user(self, user_id, fields):
+        self.update_users({user_id: fields})
+
+    def update_users(self, updates):
+        # Group rows by the columns they set so each group is one executemany, all in one transaction
+        groups = {}
+        for user_id, fields in updates.items():
+            values = [to_timestamp(v) if isinstance(v, datetime) else v for v in fields.values()]
+            groups.setdefault(tuple(fields), []).append((*values, user_id))
+        with self._transaction() as conn:
+            for columns, rows in groups.items():
+                assignments = ', '.join(f'{column} = ?' for column in columns)
+                conn.executemany(f'UPDATE users SET {assignments} WHERE id = ?', rows)
+
+    def insert_verification_token(self, user_id, token, expires_at):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO email_verification (id, user_id, token, expires_at) VALUES (?, ?, ?, ?)',
+                (str(uuid.uuid4()), user_id, token, to_timestamp(expires_at))
+            )
+        return True
+
+    def consume_verification_token(self, user_id, token, now):
+        # One transaction: claim the code (expiry checked in SQL), then activate the user
+        with self._transaction() as conn:
+            claimed = conn.execute(
+                '''UPDATE email_verification SET used = 1
+                   WHERE id = (SELECT id FROM email_verification
+                               WHERE user_id = ? AND token = ? AND used = 0 AND expires_at > ?
+                               LIMIT 1)''',
+                (user_id, token, to_timestamp(now))
+            ).rowcount
+            if not claimed:
+                return False
+            conn.execute('UPDATE users SET email_verified = 1 WHERE id = ?', (user_id,))
+        return True
+
+    def prune_verification_tokens(self, now, batch_size):
+        # Two index-driven deletes rather than one OR, which SQLite would answer with a table scan
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                '''DELETE FROM email_verification
+                   WHERE rowid IN (SELECT rowid FROM email_verification WHERE expires_at <= ? LIMIT ?)''',
+                (to_timestamp(now), batch_size)
+            ).rowcount
+            if deleted < batch_size:
+                deleted += conn.execute(
+                    '''DELETE FROM email_verification
+                       WHERE rowid IN (SELECT rowid FROM email_verification WHERE used = 1 LIMIT ?)''',
+                    (batch_size - deleted,)
+                ).rowcount
+        return deleted
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
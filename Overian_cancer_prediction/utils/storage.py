@@ -0,0 +1,67 @@
+import threading
+
+from config import STORAGE_BACKEND
+
+class Storage:
+    """Data access used by utils.db; one adapter per backend.
+
+    Timestamps are passed in as timezone-aware UTC datetimes; rows come back
+    as plain dicts with the columns of database/create_users_table.sql.
+    """
+
+    def insert_user(self, email, password_hash, full_name):
+        """Insert a user and return the new row, or None"""
+        raise NotImplementedError
+
+    def get_user_by_email(self, email, columns=None):
+        """Return the user row for an email address (only `columns` if given), or None"""
+        raise NotImplementedError
+
+    def update_user(self, user_id, fields):
+        """Set the given columns on one user"""
+        raise NotImplementedError
+
+    def update_users(self, updates):
+        """Apply {user_id: fields} for many users; backends may batch this"""
+        for user_id, fields in updates.items():
+            self.update_user(user_id, fields)
+
+    def insert_verification_token(self, user_id, token, expires_at):
+        """Store a verification code; returns True on success"""
+        raise NotImplementedError
+
+    def consume_verification_token(self, user_id, token, now):
+        """Mark a matching, unused, unexpired code as used and verify the user's email.
+
+        Returns True if a code was consumed.
+        """
+        raise NotImplementedError
+
+    def prune_verification_tokens(self, now, batch_size):
+        """Delete up to batch_size used or expired codes; returns how many were deleted"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def create_storage(backend=STORAGE_BACKEND):
+    """Instantiate the adapter for a backend name ('supabase' or 'sqlite')"""
+    if backend == 'sqlite':
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage()
+    if backend == 'supabase':
+        from .supabase_storage import SupabaseStorage
+        return SupabaseStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Process-wide storage adapter for STORAGE_BACKEND, created on first use"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
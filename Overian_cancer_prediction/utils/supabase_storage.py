@@ -0,0 +1,93 @@
+import logging
+from datetime import datetime
+
+from postgrest.exceptions import APIError
+from supabase import create_client
+
+from config import SUPABASE_URL, SUPABASE_KEY
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# PostgREST's "function not found in the schema cache", and Postgres' undefined_function
+MISSING_FUNCTION_CODES = ('PGRST202', '42883')
+
+class SupabaseStorage(Storage):
+    """Storage on the hosted Supabase tables, through the PostgREST client"""
+
+    def __init__(self, url=SUPABASE_URL, key=SUPABASE_KEY):
+        self.client = create_client(url, key)
+        self._has_prune_rpc = True  # Cleared the first time the server says the function is missing
+
+    def insert_user(self, email, password_hash, full_name):
+        user = self.client.table('users').insert({
+            'email': email,
+            'password_hash': password_hash,
+            'full_name': full_name,
+        }).execute()
+        return user.data[0] if user.data else None
+
+    def get_user_by_email(self, email, columns=None):
+        projection = ','.join(columns) if columns else '*'
+        result = self.client.table('users').select(projection).eq('email', email).execute()
+        return result.data[0] if result.data else None
+
+    def update_user(self, user_id, fields):
+        fields = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in fields.items()}
+        self.client.table('users').update(fields).eq('id', user_id).execute()
+
+    def insert_verification_token(self, user_id, token, expires_at):
+        result = self.client.table('email_verification').insert({
+            'user_id': user_id,
+            'token': token,
+            'expires_at': expires_at.isoformat()
+        }).execute()
+        return bool(result.data)
+
+    def consume_verification_token(self, user_id, token, now):
+        # PostgREST has no multi-statement transactions: select, then two updates.
+        # Expiry is filtered in the query, served by idx_verification_lookup.
+        result = self.client.table('email_verification').select('id')\
+            .eq('user_id', user_id)\
+            .eq('token', token)\
+            .eq('used', False)\
+            .gt('expires_at', now.isoformat())\
+            .limit(1)\
+            .execute()
+
+        logger.info(f"Verification query result: {result.data}")
+
+        if not result.data:
+            return False
+
+        verification = result.data[0]
+
+        # Update user and token
+        self.client.table('users')\
+            .update({'email_verified': True})\
+            .eq('id', user_id)\
+            .execute()
+
+        self.client.table('email_verification')\
+            .update({'used': True})\
+            .eq('id', verification['id'])\
+            .execute()
+        return True
+
+    def prune_verification_tokens(self, now, batch_size):
+        # Runs server-side (see prune_email_verification in create_users_table.sql), which uses the database clock
+        if self._has_prune_rpc:
+            try:
+                result = self.client.rpc('prune_email_verification', {'batch_size': batch_size}).execute()
+                return result.data or 0
+            except APIError as e:
+                if e.code not in MISSING_FUNCTION_CODES:
+                    raise
+                self._has_prune_rpc = False
+                logger.warning("prune_email_verification is not installed; re-run database/create_users_table.sql "
+                               "(or just its CREATE FUNCTION) to prune in batches. Using plain deletes until then.")
+
+        # Without the function PostgREST cannot limit a delete, so each call clears the whole backlog
+        used = self.client.table('email_verification').delete().eq('used', True).execute()
+        expired = self.client.table('email_verification').delete().lte('expires_at', now.isoformat()).execute()
+        return len(used.data or []) + len(expired.data or [])
@@ -0,0 +1,82 @@
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import TOKEN_REAPER_INTERVAL, TOKEN_REAPER_BATCH_SIZE, TOKEN_REAPER_PAUSE
+from .storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+class TokenReaper:
+    """Deletes used and expired verification codes in bounded batches.
+
+    Each batch is its own short transaction, with a pause between batches,
+    so a large backlog never holds the write lock for long. Every app worker
+    starts one; on Supabase the prune function takes an advisory lock, so
+    only one of them prunes at a time and the rest skip the round. SQLite
+    serializes writers, so there a second reaper finds nothing left to do.
+    """
+
+    def __init__(self, storage=None, interval=TOKEN_REAPER_INTERVAL,
+                 batch_size=TOKEN_REAPER_BATCH_SIZE, pause=TOKEN_REAPER_PAUSE):
+        self.storage = storage
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.total_deleted = 0
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Prune until a batch comes back short; returns the number of rows deleted"""
+        storage = self.storage or get_storage()
+        deleted = 0
+        while not self._stopping.is_set():
+            count = storage.prune_verification_tokens(datetime.now(timezone.utc), self.batch_size)
+            deleted += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause)
+        self.total_deleted += deleted
+        return deleted
+
+    def start(self):
+        self._thread = threading.Thread(target=self._worker, name='token-reaper', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _worker(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                deleted = self.run_once()
+                if deleted:
+                    logger.info(f"Token reaper deleted {deleted} used or expired verification codes")
+            except Exception as e:
+                logger.error(f"Token reaper error: {str(e)}")
+
+def main(argv=None):
+    """Prune used and expired verification codes once, e.g. from cron.
+
+    Usage:
+        python -m utils.token_reaper [--batch-size 1000]
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Delete used and expired verification codes")
+    parser.add_argument('--batch-size', type=int, default=TOKEN_REAPER_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    deleted = TokenReaper(batch_size=args.batch_size).run_once()
+    print(f"deleted {deleted} codes in {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""Lightweight request tracing: span trees written to a rotating JSONL file.
+
+A trace is begun per request (sampled at TRACE_SAMPLE_RATE, or always when
+the request carries `TRACE_HEADER: 1`) and nested spans are opened with
+    with span('predict_tabular', features=12) as s:
+        ...; s.set('fallback_reason', 'timeout')
+Outside a sampled trace span() returns a shared no-op, so instrumented code
+costs a context-variable lookup. Background work started by a traced
+request (advice jobs, email delivery) gets its own trace whose `link` is
+the request's trace id.
+
+Finished traces are queued to one writer thread and appended, one JSON
+object per line, to TRACE_PATH, rotated at TRACE_MAX_BYTES. If the queue is
+full the trace is dropped and counted rather than slowing the request.
+
+Usage (from the application directory):
+    python -m utils.tracing summary [--top 10]      slowest traces, critical paths, per-span stats
+    python -m utils.tracing show <trace id>         one trace as an indented tree
+"""
+import atexit
+import contextlib
+import contextvars
+import glob
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+from config import (TRACING_ENABLED, TRACE_SAMPLE_RATE, TRACE_PATH, TRACE_MAX_BYTES, TRACE_BACKUPS,
+                    TRACE_QUEUE_SIZE, TRACE_MAX_SPANS)
+from .metrics import counter
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACES_EXPORTED = counter('ovarian_traces_total', "Sampled traces by export outcome: written or dropped", ['outcome'])
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced"""
+    __slots__ = ()
+    trace_id = None
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'end', 'attributes', 'error', '_token')
+
+    def __init__(self, trace, parent_id, name, attributes):
+        self.trace = trace
+        self.span_id = len(trace.spans)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = None
+        self.end = None
+        self.attributes = attributes
+        self.error = None
+        self._token = None
+        trace.spans.append(self)
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        return False
+
+    def to_dict(self, origin):
+        end = self.end if self.end is not None else time.perf_counter()
+        data = {
+            'id': self.span_id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round((end - self.start) * 1000, 3),
+        }
+        if self.attributes:
+            data['attributes'] = self.attributes
+        if self.error:
+            data['error'] = self.error
+        if self.end is None:
+            data['unfinished'] = True  # Still open when the trace ended, e.g. handed to another thread
+        return data
+
+class Trace:
+    __slots__ = ('trace_id', 'link', 'started_at', 'spans', 'dropped_spans')
+
+    def __init__(self, link=None):
+        self.trace_id = uuid.uuid4().hex
+        self.link = link
+        self.started_at = time.time()
+        self.spans = []
+        self.dropped_spans = 0
+
+    def to_dict(self):
+        root = self.spans[0]
+        record = {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'started_at': self.started_at,
+            'duration_ms': round(((root.end or time.perf_counter()) - root.start) * 1000, 3),
+            'spans': [s.to_dict(root.start) for s in self.spans if s.start is not None],
+        }
+        if self.link:
+            record['link'] = self.link
+        if root.error:
+            record['error'] = root.error
+        if self.dropped_spans:
+            record['dropped_spans'] = self.dropped_spans
+        return record
+
+def span(name, **attributes):
+    """A child of the current span, or a no-op when the current request is not traced"""
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    trace = parent.trace
+    if len(trace.spans) >= TRACE_MAX_SPANS:
+        trace.dropped_spans += 1
+        return NOOP_SPAN
+    return Span(trace, parent.span_id, name, attributes)
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+def current_trace_id():
+    current = _current.get()
+    return current.trace.trace_id if current is not None else None
+
+def begin_trace(name, sampled=None, link=None, **attributes):
+    """Start a trace and make its root span current; returns the root span, or None if not sampled.
+
+    sampled=None samples at TRACE_SAMPLE_RATE; True or False decide explicitly.
+    """
+    if not TRACING_ENABLED:
+        return None
+    if sampled is None:
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    if not sampled:
+        return None
+    root = Span(Trace(link), None, name, attributes)
+    return root.__enter__()
+
+def end_trace(root, error=None):
+    """Close a root span from begin_trace and hand the trace to the exporter"""
+    if root is None:
+        return
+    if error is not None and root.error is None:
+        root.error = f"{type(error).__name__}: {error}"
+    root.__exit__(None, None, None)
+    get_trace_exporter().export(root.trace)
+
+@contextlib.contextmanager
+def trace(name, sampled=None, link=None, **attributes):
+    """begin_trace/end_trace around a block, for work outside a request; yields the root or a no-op"""
+    root = begin_trace(name, sampled, link, **attributes)
+    try:
+        yield root or NOOP_SPAN
+    except BaseException as e:
+        end_trace(root, e)
+        raise
+    end_trace(root)
+
+class TraceExporter:
+    """Appends finished traces to a size-rotated JSONL file from a background thread"""
+
+    def __init__(self, path=None, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS, queue_size=TRACE_QUEUE_SIZE):
+        self.path = path or default_trace_path()
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name='trace-exporter', daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+            TRACES_EXPORTED.labels('dropped').inc()
+
+    def stop(self, timeout=5.0):
+        """Write what is queued, then stop the writer"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _worker(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is waiting so a burst costs one write and one flush
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            try:
+                lines = ''.join(json.dumps(t.to_dict(), default=str) + '\n' for t in batch if t is not None)
+                self._write(lines)
+                TRACES_EXPORTED.labels('written').inc(len(batch) - stop)
+            except Exception as e:
+                logger.error(f"Trace export error: {str(e)}")
+            if stop:
+                return
+
+    def _write(self, lines):
+        if not lines:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(lines) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def _rotate(self):
+        # traces.jsonl -> traces.jsonl.1 -> ... -> traces.jsonl.<backups>, oldest dropped
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+def default_trace_path():
+    return os.path.abspath(TRACE_PATH) if TRACE_PATH else os.path.join(APP_DIR, 'logs', 'traces.jsonl')
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def get_trace_exporter():
+    """Process-wide exporter; its writer thread starts with the first trace"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                exporter = TraceExporter()
+                atexit.register(exporter.stop)
+                _exporter = exporter
+    return _exporter
+
+def read_traces(path=None):
+    """Yield traces from the file and its rotated backups, oldest file first"""
+    path = path or default_trace_path()
+    files = sorted(glob.glob(path + '.*'), key=lambda p: -int(p.rsplit('.', 1)[1]) if p.rsplit('.', 1)[1].isdigit() else 0)
+    for filename in files + [path]:
+        if not os.path.exists(filename):
+            continue
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # A torn last line from a crash
+
+def critical_path(record):
+    """Spans that bound the trace's duration: from the root, repeatedly the child that ends last"""
+    children = {}
+    for s in record['spans']:
+        children.setdefault(s['parent'], []).append(s)
+    path = []
+    node = next((s for s in record['spans'] if s['parent'] is None), None)
+    while node is not None:
+        kids = children.get(node['id'], [])
+        child_time = sum(k['duration_ms'] for k in kids)
+        path.append((node, max(0.0, node['duration_ms'] - child_time)))
+        node = max(kids, key=lambda k: k['start_ms'] + k['duration_ms']) if kids else None
+    return path
+
+def format_tree(record):
+    children = {}
+    for s in record['spans']:
+        children.setdefault(s['parent'], []).append(s)
+    lines = []
+
+    def walk(parent, depth):
+        for s in children.get(parent, []):
+            attrs = ' '.join(f"{k}={v}" for k, v in s.get('attributes', {}).items())
+            error = f" ERROR {s['error']}" if s.get('error') else ''
+            lines.append(f"{s['start_ms']:>10.1f} {s['duration_ms']:>10.1f}  {'  ' * depth}{s['name']} {attrs}{error}")
+            walk(s['id'], depth + 1)
+    walk(None, 0)
+    return lines
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+def summarize(records, top):
+    records = list(records)
+    if not records:
+        print("no traces")
+        return
+    print(f"{len(records)} traces, {sum(1 for r in records if r.get('error'))} with errors\n")
+
+    print(f"slowest {min(top, len(records))}:")
+    for record in sorted(records, key=lambda r: -r['duration_ms'])[:top]:
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['started_at']))
+        link = f" (from {record['link']})" if record.get('link') else ''
+        print(f"  {record['duration_ms']:>9.1f}ms  {record['name']:<32} {record['trace_id']}  {started}{link}")
+        chain = ' > '.join(f"{s['name']} {s['duration_ms']:.1f}ms (self {self_ms:.1f})"
+                           for s, self_ms in critical_path(record))
+        print(f"             critical path: {chain}")
+
+    by_name = {}
+    for record in records:
+        for s in record['spans']:
+            by_name.setdefault(s['name'], []).append(s['duration_ms'])
+    print(f"\n{'span':<40}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, durations in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<40}{len(durations):>7}{_percentile(durations, 50):>10.1f}"
+              f"{_percentile(durations, 95):>10.1f}{max(durations):>10.1f}")
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize exported request traces")
+    parser.add_argument('--path', help="Trace file (default: TRACE_PATH or logs/traces.jsonl)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary = commands.add_parser('summary', help="Slowest traces with critical paths, and per-span percentiles")
+    summary.add_argument('--top', type=int, default=10)
+    summary.add_argument('--name', help="Only traces whose root name contains this")
+    show = commands.add_parser('show', help="Print one trace as a tree")
+    show.add_argument('trace_id')
+    args = parser.parse_args(argv)
+
+    records = read_traces(args.path)
+    if args.command == 'summary':
+        summarize((r for r in records if not args.name or args.name in r['name']), args.top)
+        return 0
+
+    for record in records:
+        if record['trace_id'].startswith(args.trace_id):
+            print(f"{record['name']} {record['trace_id']} {record['duration_ms']:.1f}ms"
+                  + (f" link {record['link']}" if record.get('link') else ''))
+            print(f"{'start ms':>10} {'dur ms':>10}  span")
+            print('\n'.join(format_tree(record)))
+            return 0
+    print(f"trace {args.trace_id} not found")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""Train the XGBoost classifier served by the app and write a versioned artifact.
+
+Usage (from the application directory):
+    python -m utils.training [--data database/merged_ovarian_data.csv] [--folds 5] [--jobs N]
+
+Runs a stratified k-fold grid search with one process per core, refits the
+best parameters on all rows and writes, into models/:
+    xgboost_model-v<UTC timestamp>.pkl   the fitted XGBClassifier (joblib)
+    xgboost_model-v<UTC timestamp>.json  metadata: feature order, parameters,
+                                         CV metrics, data hash, timings
+    xgboost_model-v<UTC timestamp>.npz   compiled arrays, with --compile
+The registry serves the newest versioned artifact, so a running app picks
+the new model up on its next artifact check.
+"""
+import itertools
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .dataset_cache import decode_category, load_columns
+from .model_registry import file_sha256
+from .model_utils import REQUIRED_FEATURES, ARTIFACT_PREFIX, get_default_input, get_models_dir, metadata_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'database', 'merged_ovarian_data.csv')
+TARGET_COLUMN = 'has_cancer'
+
+# The merged CSV mixes encodings: 0/1 and No/Yes. 'Unknown' gets the same default
+# the serving path uses for a missing value.
+MENOPAUSE_VALUES = {'0': 0, '1': 1, 'No': 0, 'Yes': 1}
+TARGET_VALUES = {'0': 0, '1': 1, 'No': 0, 'Yes': 1}
+
+PARAM_GRID = {
+    'max_depth': [2, 3, 4, 5],
+    'learning_rate': [0.05, 0.1, 0.2],
+    'n_estimators': [100, 200, 400],
+    'subsample': [0.8, 1.0],
+}
+QUICK_PARAM_GRID = {
+    'max_depth': [3, 4],
+    'learning_rate': [0.1],
+    'n_estimators': [100, 200],
+    'subsample': [1.0],
+}
+
+def load_training_data(path=DEFAULT_DATA_PATH):
+    """Load the clinical CSV into (X float32 in REQUIRED_FEATURES order, y int8) via the column cache"""
+    arrays, manifest = load_columns(path, REQUIRED_FEATURES + [TARGET_COLUMN])
+    schema = {column['name']: column for column in manifest['columns']}
+    defaults = get_default_input()
+
+    # Same values and defaults as build_feature_matrix on the raw text, so training sees what serving sends
+    X = np.empty((manifest['rows'], len(REQUIRED_FEATURES)), dtype=np.float32)
+    for j, feature in enumerate(REQUIRED_FEATURES):
+        column = arrays[feature]
+        if schema[feature]['kind'] == 'category':
+            mapping = MENOPAUSE_VALUES if feature == 'Menopause' else {}
+            column = decode_category(column, schema[feature], mapping)
+        X[:, j] = column
+        X[np.isnan(X[:, j]), j] = defaults[feature]
+
+    target = arrays[TARGET_COLUMN]
+    if schema[TARGET_COLUMN]['kind'] == 'category':
+        target = decode_category(target, schema[TARGET_COLUMN], TARGET_VALUES, default=-1, dtype=np.int8)
+        if (target < 0).any():
+            raise ValueError(f"{path}: unrecognised or missing {TARGET_COLUMN} values")
+    y = np.asarray(target, dtype=np.int8)
+    return X, y, manifest
+
+def param_grid(grid):
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def make_model(params, y_train, seed, n_jobs=1):
+    import xgboost as xgb
+
+    # Same class weighting as the original notebook: negatives / positives
+    scale_pos_weight = float((y_train == 0).sum()) / max(1, int((y_train == 1).sum()))
+    return xgb.XGBClassifier(
+        objective='binary:logistic',
+        eval_metric='logloss',
+        scale_pos_weight=scale_pos_weight,
+        random_state=seed,
+        n_jobs=n_jobs,
+        **params
+    )
+
+def score(y_true, probability):
+    from sklearn.metrics import accuracy_score, log_loss, recall_score, roc_auc_score
+
+    prediction = (probability > 0.5).astype(np.int8)
+    return {
+        'roc_auc': float(roc_auc_score(y_true, probability)),
+        'log_loss': float(log_loss(y_true, probability, labels=[0, 1])),
+        'accuracy': float(accuracy_score(y_true, prediction)),
+        'recall': float(recall_score(y_true, prediction, zero_division=0)),
+    }
+
+# Worker state: the dataset is sent once per process, not once per task
+_worker_data = None
+
+def _init_worker(X, y):
+    global _worker_data
+    _worker_data = (X, y)
+
+def _evaluate(task):
+    """Fit one (parameters, fold) pair in a worker process and score the held-out fold"""
+    params_index, params, fold, train_index, test_index, seed = task
+    X, y = _worker_data
+    model = make_model(params, y[train_index], seed)
+    model.fit(X[train_index], y[train_index])
+    return params_index, fold, score(y[test_index], model.predict_proba(X[test_index])[:, 1])
+
+def cross_validate(X, y, grid, folds, seed, jobs):
+    """Grid search over stratified folds on a process pool; returns per-candidate mean/std metrics"""
+    from sklearn.model_selection import StratifiedKFold
+
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+    candidates = param_grid(grid)
+    tasks = [(i, params, fold, train_index, test_index, seed)
+             for i, params in enumerate(candidates)
+             for fold, (train_index, test_index) in enumerate(splits)]
+
+    fold_scores = [[] for _ in candidates]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(X, y)) as executor:
+        # Larger chunks amortise IPC; each task is a small fit
+        for params_index, fold, metrics in executor.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (jobs * 8))):
+            fold_scores[params_index].append(metrics)
+
+    results = []
+    for params, scores in zip(candidates, fold_scores):
+        summary = {}
+        for metric in scores[0]:
+            values = [s[metric] for s in scores]
+            summary[metric] = {'mean': float(np.mean(values)), 'std': float(np.std(values))}
+        results.append({'params': params, 'metrics': summary})
+    results.sort(key=lambda r: (-r['metrics']['roc_auc']['mean'], r['metrics']['log_loss']['mean']))
+    return results, len(tasks)
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its largest (finished) child, in MB"""
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+def train(data_path=DEFAULT_DATA_PATH, output_dir=None, folds=5, jobs=None, seed=42,
+          grid=PARAM_GRID, compile_numpy=False):
+    """Run the search, refit the best candidate and write the artifact; returns the metadata dict"""
+    import joblib
+    import xgboost as xgb
+
+    started = time.perf_counter()
+    started_at = datetime.now(timezone.utc)
+    jobs = jobs or os.cpu_count() or 1
+    output_dir = output_dir or get_models_dir()
+
+    load_start = time.perf_counter()
+    X, y, manifest = load_training_data(data_path)
+    load_seconds = time.perf_counter() - load_start
+    logger.info(f"Loaded {len(y)} rows ({int(y.sum())} positive) in {load_seconds:.2f}s")
+
+    search_start = time.perf_counter()
+    results, fits = cross_validate(X, y, grid, folds, seed, jobs)
+    search_seconds = time.perf_counter() - search_start
+    best = results[0]
+    logger.info(f"{fits} fits on {jobs} processes in {search_seconds:.1f}s; best {best['params']} "
+                f"AUC {best['metrics']['roc_auc']['mean']:.4f}")
+
+    refit_start = time.perf_counter()
+    model = make_model(best['params'], y, seed, n_jobs=jobs)
+    model.fit(X, y)
+    refit_seconds = time.perf_counter() - refit_start
+
+    version = 'v' + started_at.strftime('%Y%m%dT%H%M%SZ')
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, f"{ARTIFACT_PREFIX}-{version}.pkl")
+    joblib.dump(model, model_path)
+    artifacts = [model_path]
+    if compile_numpy:
+        from .tree_compiler import export_booster, save_compiled
+        compiled_path = os.path.splitext(model_path)[0] + '.npz'
+        save_compiled(compiled_path, export_booster(model))
+        artifacts.append(compiled_path)
+
+    peak_own, peak_worker = peak_rss_mb()
+    metadata = {
+        'version': version,
+        'model_file': os.path.basename(model_path),
+        # Checked by ModelRegistry before serving, so a truncated or swapped file fails the deploy
+        'artifacts': {os.path.basename(path): file_sha256(path) for path in artifacts},
+        'trained_at': started_at.isoformat(),
+        'features': list(REQUIRED_FEATURES),
+        'target': TARGET_COLUMN,
+        'threshold': 0.5,
+        'params': best['params'],
+        'cv': {
+            'folds': folds,
+            'seed': seed,
+            'candidates': len(results),
+            'metrics': best['metrics'],
+            'leaderboard': results[:10],
+        },
+        'data': {
+            'path': os.path.relpath(data_path, os.path.dirname(output_dir)),
+            'sha256': manifest['sha256'],
+            'rows': int(len(y)),
+            'positives': int(y.sum()),
+        },
+        'training': {
+            'wall_seconds': round(time.perf_counter() - started, 3),
+            'load_seconds': round(load_seconds, 3),
+            'search_seconds': round(search_seconds, 3),
+            'refit_seconds': round(refit_seconds, 3),
+            'fits': fits,
+            'processes': jobs,
+            'peak_rss_mb': round(peak_own, 1),
+            'peak_worker_rss_mb': round(peak_worker, 1),
+            'xgboost_version': xgb.__version__,
+            'python_version': sys.version.split()[0],
+        },
+    }
+    # Metadata last: the registry only treats an artifact as versioned once this file exists
+    with open(metadata_path(model_path), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train and version the ovarian cancer risk model")
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH, help="Training CSV")
+    parser.add_argument('--output-dir', help="Where to write the artifact (default: models/)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, help="Worker processes (default: all cores)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quick', action='store_true', help="Small grid, for smoke runs")
+    parser.add_argument('--compile', action='store_true', help="Also write the compiled .npz for MODEL_BACKEND=numpy")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    metadata = train(args.data, args.output_dir, args.folds, args.jobs, args.seed,
+                     QUICK_PARAM_GRID if args.quick else PARAM_GRID, args.compile)
+
+    training = metadata['training']
+    metrics = metadata['cv']['metrics']
+    print(f"version:   {metadata['version']} -> {metadata['model_file']}")
+    print(f"params:    {metadata['params']}")
+    print(f"cv:        AUC {metrics['roc_auc']['mean']:.4f} ± {metrics['roc_auc']['std']:.4f}, "
+          f"log loss {metrics['log_loss']['mean']:.4f}, recall {metrics['recall']['mean']:.3f}")
+    print(f"wall time: {training['wall_seconds']:.1f}s ({training['fits']} fits on {training['processes']} processes)")
+    print(f"peak RSS:  {training['peak_rss_mb']:.0f}MB main, {training['peak_worker_rss_mb']:.0f}MB largest worker")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
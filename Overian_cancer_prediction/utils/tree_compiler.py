@@ -0,0 +1,213 @@
+"""Flatten an XGBoost tree ensemble into parallel NumPy arrays and score it without xgboost.
+
+Export (needs xgboost to unpickle the source artifact):
+    python -m utils.tree_compiler models/xgboost_model.pkl -o models/xgboost_model.npz --verify
+
+Serving only needs NumPy: set MODEL_BACKEND=numpy and the registry loads the .npz.
+"""
+import json
+import logging
+import math
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+def _parse_base_score(value):
+    # Stored as '5E-1' by older releases and '[5E-1]' by xgboost >= 2
+    return float(str(value).strip('[]').split(',')[0])
+
+def export_booster(model):
+    """Flatten a fitted XGBClassifier (or Booster) into a dict of arrays"""
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    config = json.loads(booster.save_raw('json').decode('utf-8'))
+    learner = config['learner']
+
+    objective = learner['objective']['name']
+    if objective not in SUPPORTED_OBJECTIVES:
+        raise ValueError(f"Unsupported objective {objective}")
+    if int(learner['learner_model_param'].get('num_class', '0')) > 1:
+        raise ValueError("Multi-class models are not supported")
+
+    trees = learner['gradient_booster']['model']['trees']
+
+    # Match XGBClassifier's default of scoring only up to the best iteration
+    best_iteration = getattr(model, 'best_iteration', None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+
+    feature, threshold, left, right, default_left, value, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for tree in trees:
+        if any(int(t) != 0 for t in tree.get('split_type', [])):
+            raise ValueError("Categorical splits are not supported")
+
+        tree_left = tree['left_children']
+        tree_right = tree['right_children']
+        n_nodes = len(tree_left)
+        roots.append(offset)
+
+        depth = [0] * n_nodes
+        for node in range(n_nodes):
+            is_leaf = tree_left[node] == -1
+            if is_leaf:
+                # Leaves point at themselves so every row can take the same number of steps
+                feature.append(0)
+                threshold.append(0.0)
+                left.append(offset + node)
+                right.append(offset + node)
+                default_left.append(True)
+                value.append(tree['split_conditions'][node])
+            else:
+                feature.append(tree['split_indices'][node])
+                threshold.append(tree['split_conditions'][node])
+                left.append(offset + tree_left[node])
+                right.append(offset + tree_right[node])
+                default_left.append(bool(tree['default_left'][node]))
+                value.append(0.0)
+                depth[tree_left[node]] = depth[node] + 1
+                depth[tree_right[node]] = depth[node] + 1
+        max_depth = max(max_depth, max(depth))
+        offset += n_nodes
+
+    base_score = _parse_base_score(learner['learner_model_param']['base_score'])
+    return {
+        'feature': np.asarray(feature, dtype=np.int32),
+        'threshold': np.asarray(threshold, dtype=np.float32),
+        'left': np.asarray(left, dtype=np.int32),
+        'right': np.asarray(right, dtype=np.int32),
+        'default_left': np.asarray(default_left, dtype=bool),
+        'value': np.asarray(value, dtype=np.float32),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': max_depth,
+        'num_feature': int(learner['learner_model_param']['num_feature']),
+        'base_margin': math.log(base_score / (1.0 - base_score)),
+        'objective': objective
+    }
+
+class CompiledTreeEnsemble:
+    """Array-backed evaluator with the predict/predict_proba surface of XGBClassifier"""
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots,
+                 max_depth, num_feature, base_margin, objective='binary:logistic'):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.num_feature = int(num_feature)
+        self.base_margin = float(base_margin)
+        self.objective = objective
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict_margin(self, X):
+        """Raw margins for a 2-D float matrix, evaluated one tree level at a time"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.num_feature:
+            raise ValueError(f"Expected shape (n, {self.num_feature}), got {X.shape}")
+
+        # One cursor per (row, tree); every step moves all cursors down one level
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        rows = np.arange(X.shape[0])[:, None]
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(x), self.default_left[nodes], x < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def predict_proba(self, X):
+        margin = self.predict_margin(X)
+        positive = 1.0 / (1.0 + np.exp(-margin))
+        return np.column_stack((1.0 - positive, positive))
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
+
+def compile_model(model):
+    """Build a CompiledTreeEnsemble straight from a fitted model"""
+    return CompiledTreeEnsemble(**export_booster(model))
+
+def save_compiled(path, arrays):
+    """Write exported arrays to an .npz file"""
+    meta = {k: arrays[k] for k in ('max_depth', 'num_feature', 'base_margin', 'objective')}
+    np.savez(
+        path,
+        meta=np.asarray(json.dumps(meta)),
+        **{k: v for k, v in arrays.items() if k not in meta}
+    )
+
+def load_compiled(path):
+    """Load an .npz produced by save_compiled"""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        arrays = {k: data[k] for k in data.files if k != 'meta'}
+    return CompiledTreeEnsemble(**arrays, **meta)
+
+def verify_against_booster(model, compiled, X):
+    """Largest absolute margin difference between xgboost and the compiled evaluator"""
+    import xgboost as xgb
+
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    best_iteration = getattr(model, 'best_iteration', None)
+    iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+    expected = booster.predict(xgb.DMatrix(X, missing=np.nan), output_margin=True,
+                               iteration_range=iteration_range)
+    return float(np.max(np.abs(expected - compiled.predict_margin(X)))) if len(X) else 0.0
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def main(argv=None):
+    import argparse
+    import os
+
+    import joblib
+
+    from .model_utils import REQUIRED_FEATURES, build_feature_matrix
+
+    parser = argparse.ArgumentParser(description="Compile an XGBoost artifact into NumPy arrays")
+    parser.add_argument('model_path', help="Pickled XGBClassifier, e.g. models/xgboost_model.pkl")
+    parser.add_argument('-o', '--output', help="Output .npz (defaults next to the model)")
+    parser.add_argument('--verify', nargs='?', const='database/merged_ovarian_data.csv', metavar='CSV',
+                        help="Compare margins with xgboost on a CSV of panels")
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    args = parser.parse_args(argv)
+
+    model = joblib.load(args.model_path)
+    arrays = export_booster(model)
+    output = args.output or os.path.splitext(args.model_path)[0] + '.npz'
+    save_compiled(output, arrays)
+    compiled = load_compiled(output)
+    print(f"wrote {output}: {compiled.n_trees} trees, {len(compiled.feature)} nodes, depth {compiled.max_depth}")
+
+    if args.verify:
+        import csv
+        with open(args.verify, newline='') as f:
+            records = list(csv.DictReader(f))
+        # Keep blanks as NaN so the missing-value branches are exercised too
+        X = np.array([[_float_or_nan(r.get(c)) for c in REQUIRED_FEATURES] for r in records],
+                     dtype=np.float32)
+        X_defaults = build_feature_matrix(REQUIRED_FEATURES, records)
+        worst = max(verify_against_booster(model, compiled, X),
+                    verify_against_booster(model, compiled, X_defaults))
+        print(f"verified {len(records)} rows, max |margin diff| = {worst:.3g}")
+        if worst > args.tolerance:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import logging
+import threading
+
+from config import WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_PENDING, WRITE_BEHIND_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer:
+    """Collects non-critical row updates in memory and writes them in bulk.
+
+    update(key, fields) merges into any pending update for the same key, so
+    ten logins by one user become one write carrying the latest values. A
+    background thread calls flush_fn({key: fields}) every `interval` seconds,
+    as soon as `max_pending` keys are waiting, and once more at shutdown.
+    When a batch fails, its rows are written one at a time so a row the
+    backend rejects cannot hold back the others; a row that fails
+    `max_attempts` flushes in a row is dropped with an error log.
+    Updates still pending when the process dies are lost, so only use this
+    for values that are safe to drop (timestamps, counters, lazy upgrades).
+    """
+
+    def __init__(self, flush_fn, interval=WRITE_BEHIND_INTERVAL, max_pending=WRITE_BEHIND_MAX_PENDING,
+                 max_attempts=WRITE_BEHIND_MAX_ATTEMPTS, name='write-behind'):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.flushed = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.dropped = 0
+        self._pending = {}
+        self._attempts = {}  # Key -> consecutive failed writes; only touched under _flush_lock
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One flush at a time, in submission order
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def update(self, key, fields):
+        """Queue an update; later fields for the same key overwrite earlier ones"""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = dict(fields)
+            else:
+                pending.update(fields)
+                self.coalesced += 1
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything pending now; returns the number of keys written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self.flush_fn(batch)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Write-behind flush of {len(batch)} updates failed, retrying one at a time: {str(e)}")
+                return self._flush_each(batch)
+            for key in batch:
+                self._attempts.pop(key, None)
+            self.flushed += len(batch)
+            return len(batch)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stop(self, timeout=10.0):
+        """Stop the background thread after a final flush"""
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    def _flush_each(self, batch):
+        written = 0
+        for key, fields in batch.items():
+            try:
+                self.flush_fn({key: fields})
+            except Exception as e:
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(key, None)
+                    self.dropped += 1
+                    logger.error(f"Dropping write-behind update for {key} after {attempts} failed writes: {str(e)}")
+                else:
+                    self._attempts[key] = attempts
+                    self._requeue(key, fields)
+                continue
+            self._attempts.pop(key, None)
+            written += 1
+        self.flushed += written
+        return written
+
+    def _requeue(self, key, fields):
+        # Newer updates that arrived during the failed flush take precedence
+        with self._lock:
+            merged = dict(fields)
+            merged.update(self._pending.get(key, {}))
+            self._pending[key] = merged
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()